@@ -10,6 +10,11 @@ from app.routes.progress import progress_bp
 from app.routes.speech import speech_bp
 from app.routes.stories import stories_bp
 from app.routes.images import images_bp
+from app.routes.jobs import jobs_bp
+from app.services.job_queue import job_queue
+from app.services.progress_buffer import progress_buffer
+from app.services.env import env_int
+from app.services.schema_migrations import database_is_empty, upgrade_on_start
 
 # Load environment variables
 load_dotenv()
@@ -51,6 +56,8 @@ def create_app():
     from app.db import db
 
     db.init_app(app)
+    job_queue.init_app(app)
+    progress_buffer.init_app(app)
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix="/api")
@@ -59,11 +66,15 @@ def create_app():
     app.register_blueprint(speech_bp, url_prefix="/api/speech")
     app.register_blueprint(stories_bp, url_prefix="/api/stories")
     app.register_blueprint(images_bp, url_prefix="/api/images")
+    app.register_blueprint(jobs_bp, url_prefix="/api/jobs")
 
     # Create database tables
     with app.app_context():
+        created = database_is_empty()
         db.create_all()
         print("Database tables recreated successfully!")
+        upgrade_on_start(created, bool(env_int("SCHEMA_UPGRADE_ON_START", 0)))
+        job_queue.recover()
 
         # Initialize learning levels
         from app.models.user import LearningLevel, Lesson
@@ -11,9 +11,14 @@ from .routes.progress import progress_bp
 from .routes.speech import speech_bp
 from .routes.stories import stories_bp
 from .routes.images import images_bp
+from .routes.jobs import jobs_bp
+from .services.job_queue import job_queue
+from .services.progress_buffer import progress_buffer
+from .services.env import env_int
+from .services.schema_migrations import database_is_empty, upgrade_on_start
 
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__, instance_relative_config=True)
 
     # Load configuration
@@ -23,7 +28,18 @@ def create_app():
         SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(app.instance_path, 'app.sqlite')}",
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
         UPLOAD_FOLDER=os.path.join(app.instance_path, "uploads"),
+        STORY_CACHE_PATH=os.path.join(app.instance_path, "story_cache.sqlite"),
+        BLOB_STORE_PATH=os.path.join(app.instance_path, "blobs"),
+        PROGRESS_CACHE_PATH=os.path.join(app.instance_path, "progress_cache.sqlite"),
+        TARGET_WORDS_CACHE_PATH=os.path.join(
+            app.instance_path, "target_words_cache.sqlite"
+        ),
+        # Apply pending schema migrations (and their backfills) at startup
+        SCHEMA_UPGRADE_ON_START=bool(env_int("SCHEMA_UPGRADE_ON_START", 0)),
     )
+    if test_config is not None:
+        # قاعدة بيانات ومسارات مستقلة للاختبارات
+        app.config.from_mapping(test_config)
 
     # Ensure the instance folder exists
     try:
@@ -38,13 +54,28 @@ def create_app():
     # Initialize database
     db.init_app(app)
 
+    # Background worker pool for generation jobs
+    job_queue.init_app(app)
+    progress_buffer.init_app(app)
+
     with app.app_context():
         # Import models
         from .models.user import User, LearningLevel, Lesson, LearningProgress
+        from .models.jobs import GenerationJob
 
         # Create tables if they don't exist
+        created = database_is_empty()
         db.create_all()
 
+        # A new database is recorded as migrated; an existing one is upgraded
+        # here only with SCHEMA_UPGRADE_ON_START (see schema_migrations.py)
+        app.extensions["schema_migrations"] = upgrade_on_start(
+            created, app.config["SCHEMA_UPGRADE_ON_START"]
+        )
+
+        # Resume jobs left unfinished by a previous process
+        job_queue.recover()
+
         # Initialize learning levels if they don't exist
         if LearningLevel.query.count() == 0:
             initial_levels = [
@@ -158,9 +189,28 @@ def create_app():
     app.register_blueprint(speech_bp, url_prefix="/api/speech")
     app.register_blueprint(stories_bp, url_prefix="/api/stories")
     app.register_blueprint(images_bp, url_prefix="/api/images")
+    app.register_blueprint(jobs_bp, url_prefix="/api/jobs")
 
     @app.route("/api/health")
     def health_check():
         return {"status": "healthy"}, 200
 
+    @app.route("/api/metrics")
+    def metrics():
+        from .services.highlighter import cache_stats as get_highlighter_stats
+        from .services.openai_client import get_pool_stats
+        from .services.progress_cache import get_progress_cache_stats
+        from .services.response_cache import get_story_cache_stats
+        from .services.target_words import get_candidate_cache_stats
+
+        return {
+            "openai_pool": get_pool_stats(),
+            "story_cache": get_story_cache_stats(),
+            "progress_cache": get_progress_cache_stats(),
+            "jobs": job_queue.stats(),
+            "progress_buffer": progress_buffer.stats(),
+            "highlighter": get_highlighter_stats(),
+            "target_words": get_candidate_cache_stats(),
+        }, 200
+
     return app
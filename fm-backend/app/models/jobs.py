@@ -0,0 +1,46 @@
+import json
+from datetime import datetime
+
+from app.db import db
+
+
+class GenerationJob(db.Model):
+    """نموذج لتخزين مهام التوليد غير المتزامنة وحالتها ونتيجتها"""
+
+    __tablename__ = "generation_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    job_type = db.Column(db.String(50), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    status = db.Column(
+        db.String(20), nullable=False, default="queued", index=True
+    )  # queued, running, succeeded, failed
+    payload = db.Column(db.Text, nullable=True)  # Stored as JSON
+    result = db.Column(db.Text, nullable=True)  # Stored as JSON
+    status_code = db.Column(db.Integer, nullable=True)  # HTTP status of the result
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    # العملية التي حجزت المهمة وآخر تجديد لحجزها أثناء التنفيذ
+    worker = db.Column(db.String(100), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self, include_result=True):
+        """Convert the model to a dictionary"""
+        data = {
+            "id": self.id,
+            "job_type": self.job_type,
+            "user_id": self.user_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+        if include_result and self.result:
+            data["status_code"] = self.status_code
+            data["result"] = json.loads(self.result)
+
+        return data
@@ -3,7 +3,11 @@ import json
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from app.db import db
-from sqlalchemy import func
+from app.services.arabic_text import normalize_word
+from app.services.phonetic_errors import classify_pair
+from app.services.speech_alignment import levenshtein_ratio
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import column_property
 
 
 class User(db.Model):
@@ -67,6 +71,9 @@ class LearningLevel(db.Model):
         db.String(50), nullable=False
     )  # Store icon name from frontend
     color_class = db.Column(db.String(50), nullable=False)  # Store Tailwind color class
+    lesson_count = db.Column(
+        db.Integer, default=0
+    )  # Denormalized number of lessons in the level (kept by Lesson events)
 
     # Relationships
     progress = db.relationship(
@@ -92,8 +99,10 @@ class Lesson(db.Model):
     description = db.Column(db.String(500), nullable=False)
     content = db.Column(db.Text, nullable=False)  # Lesson content in markdown/HTML
     order = db.Column(db.Integer, nullable=False)  # For ordering lessons within a level
-    level_id = db.Column(
-        db.Integer, db.ForeignKey("learning_levels.id"), nullable=False
+    # active_history: أحداث العدادات تحتاج المستوى السابق حتى لو انتهت صلاحية الكائن
+    level_id = column_property(
+        db.Column(db.Integer, db.ForeignKey("learning_levels.id"), nullable=False),
+        active_history=True,
     )
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
@@ -153,6 +162,21 @@ class Lesson(db.Model):
 
 class LearningProgress(db.Model):
     __tablename__ = "learning_progress"
+    __table_args__ = (
+        # مفتاح التقدم: سجل واحد لكل (مستخدم، مستوى، درس)، وهو أيضًا فهرس البحث
+        db.UniqueConstraint(
+            "user_id", "level_id", "lesson_id", name="uq_learning_progress_key"
+        ),
+        # NULL لا يتكرر في UNIQUE، لذلك سجل المستوى (lesson_id IS NULL) له فهرس جزئي
+        db.Index(
+            "uq_learning_progress_level",
+            "user_id",
+            "level_id",
+            unique=True,
+            sqlite_where=db.text("lesson_id IS NULL"),
+            postgresql_where=db.text("lesson_id IS NULL"),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -171,12 +195,16 @@ class LearningProgress(db.Model):
     )  # JSON string to store position data
     current_step = db.Column(db.Integer, default=0)  # Current step in the lesson
     total_steps = db.Column(db.Integer, default=0)  # Total steps in the lesson
-    is_completed = db.Column(
-        db.Boolean, default=False
+    # active_history: أحداث العدادات تحتاج القيمة السابقة حتى لو انتهت صلاحية الكائن
+    is_completed = column_property(
+        db.Column(db.Boolean, default=False), active_history=True
     )  # Whether the lesson is completed
     learned_items = db.Column(
         db.Text, nullable=True
     )  # JSON string to store learned letters/items
+    completed_lessons = db.Column(
+        db.Integer, default=0
+    )  # Level rows only: denormalized count of the user's completed lessons
 
     # Relationships
     user = db.relationship("User", back_populates="progress")
@@ -221,6 +249,9 @@ class LearningProgress(db.Model):
 
 class SpeechActivity(db.Model):
     __tablename__ = "speech_activities"
+    __table_args__ = (
+        db.Index("ix_speech_activities_user_created", "user_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -256,8 +287,25 @@ class SpeechActivity(db.Model):
         }
 
 
+def _normalized_original_word(context):
+    return normalize_word(context.get_current_parameters().get("original_word"))[:100]
+
+
+def _words_similarity(context):
+    parameters = context.get_current_parameters()
+    return levenshtein_ratio(
+        parameters.get("original_word") or "", parameters.get("spoken_word") or ""
+    )
+
+
 class SpeechErrorRecord(db.Model):
     __tablename__ = "speech_error_records"
+    __table_args__ = (
+        db.Index("ix_speech_error_records_user_word", "user_id", "original_word"),
+        db.Index(
+            "ix_speech_error_records_user_normalized", "user_id", "normalized_word"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -265,48 +313,21 @@ class SpeechErrorRecord(db.Model):
         db.Integer, db.ForeignKey("speech_activities.id"), nullable=False
     )
     original_word = db.Column(db.String(100), nullable=False)
+    normalized_word = db.Column(
+        db.String(100), default=_normalized_original_word
+    )  # Aggregation key: original_word without diacritics / letter variants
     spoken_word = db.Column(db.String(100), nullable=False)
     error_type = db.Column(db.String(20), nullable=False)  # 'minor' or 'severe'
     error_category = db.Column(db.String(50))  # phonetic category
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    # Calculate phonetic similarity
-    @property
-    def similarity_score(self):
-        """Calculate similarity between original and spoken words."""
-        # Basic implementation - improve with Arabic-specific phonetic algorithms
-        from difflib import SequenceMatcher
-
-        return SequenceMatcher(None, self.original_word, self.spoken_word).ratio() * 100
+    similarity_score = db.Column(
+        db.Float, default=_words_similarity
+    )  # Levenshtein ratio (0-100) of original and spoken words, set at insert
 
     # Classify error phonetically
     def classify_error(self):
         """Analyze and classify the specific type of pronunciation error."""
-        # This would contain Arabic-specific phonetic analysis
-        # e.g., consonant substitution, vowel lengthening, etc.
-
-        # Check for common substitution patterns in Arabic
-        common_substitutions = {
-            "ث": ["س", "ت"],
-            "ذ": ["د", "ز"],
-            "ظ": ["ض", "ز"],
-            "ط": ["ت"],
-            "ض": ["د"],
-            "ص": ["س"],
-            "ق": ["ك", "ء"],
-        }
-
-        for correct, substitutes in common_substitutions.items():
-            if correct in self.original_word:
-                for sub in substitutes:
-                    if sub in self.spoken_word and correct not in self.spoken_word:
-                        return f"substitution_{correct}_{sub}"
-
-        # Check length differences
-        if len(self.original_word) != len(self.spoken_word):
-            return "length_mismatch"
-
-        return "general_pronunciation"
+        return classify_pair(self.original_word or "", self.spoken_word or "")
 
     def to_dict(self):
         return {
@@ -322,10 +343,82 @@ class SpeechErrorRecord(db.Model):
         }
 
 
+class SpeechStatsRollup(db.Model):
+    """ملخص تراكمي لإحصائيات القراءة لكل (مستخدم، قصة) يحدث مع كل نشاط جديد"""
+
+    __tablename__ = "speech_stats_rollup"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    story_id = db.Column(db.String(100), primary_key=True)
+    activity_count = db.Column(db.Integer, default=0)
+    accuracy_sum = db.Column(db.Float, default=0.0)
+    highest_accuracy = db.Column(db.Float, default=0.0)
+    first_accuracies = db.Column(
+        db.Text, nullable=True
+    )  # JSON [[created_at, activity_id, accuracy], ...] for the 5 oldest activities
+    recent_accuracies = db.Column(
+        db.Text, nullable=True
+    )  # JSON list in the same format for the 5 newest activities, newest first
+
+
+class SpeechDailyRollup(db.Model):
+    """مجاميع دقة القراءة اليومية لكل (مستخدم، يوم، قصة) لرسم اتجاه التقدم"""
+
+    __tablename__ = "speech_daily_rollup"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    story_id = db.Column(db.String(100), primary_key=True)
+    activity_count = db.Column(db.Integer, default=0)
+    accuracy_sum = db.Column(db.Float, default=0.0)
+    min_accuracy = db.Column(db.Float, nullable=True)
+    max_accuracy = db.Column(db.Float, nullable=True)
+
+
+class UserWordErrorStats(db.Model):
+    """عداد أخطاء النطق لكل (مستخدم، كلمة مطبعة) يحدث مع كل خطأ جديد"""
+
+    __tablename__ = "user_word_error_stats"
+    __table_args__ = (
+        # Top-K words of a user ordered by error count
+        db.Index(
+            "ix_user_word_error_stats_user_count",
+            "user_id",
+            "error_count",
+            "normalized_word",
+        ),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    normalized_word = db.Column(db.String(100), primary_key=True)
+    original_word = db.Column(
+        db.String(100), nullable=False
+    )  # Representative form: min(original_word) over the user's errors
+    error_count = db.Column(db.Integer, default=0)
+    minor_count = db.Column(db.Integer, default=0)
+    severe_count = db.Column(db.Integer, default=0)
+    similarity_sum = db.Column(db.Float, default=0.0)
+    categories = db.Column(db.Text, nullable=True)  # JSON {error_category: count}
+    last_spoken_word = db.Column(db.String(100))
+    last_seen = db.Column(db.DateTime)
+
+
+# القصة الأقصر من هذا العدد من الكلمات قصيرة (short)، وما عداها متوسطة (medium)
+SHORT_STORY_MAX_WORDS = 200
+
+
+def _story_word_count(context):
+    return len((context.get_current_parameters().get("content") or "").split())
+
+
 class AIGeneratedStory(db.Model):
     """نموذج لتخزين القصص المولدة بواسطة الذكاء الاصطناعي"""
 
     __tablename__ = "ai_generated_stories"
+    __table_args__ = (
+        # Keyset pagination of a user's stories on (created_at, id)
+        db.Index("ix_ai_generated_stories_user_created", "user_id", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -342,6 +435,9 @@ class AIGeneratedStory(db.Model):
     images_generated = db.Column(
         db.Boolean, default=False
     )  # Flag to track if images are generated
+    word_count = db.Column(
+        db.Integer, default=_story_word_count
+    )  # Words in content, set at insert (stories are matched by length on reuse)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationship to User
@@ -350,6 +446,18 @@ class AIGeneratedStory(db.Model):
     images = db.relationship(
         "StoryImage", backref="story", lazy=True, cascade="all, delete-orphan"
     )
+    # Relationship to the word index used to reuse stories
+    word_index = db.relationship(
+        "StoryWordIndex", lazy="dynamic", cascade="all, delete-orphan"
+    )
+
+    @property
+    def length(self):
+        """طول القصة (short أو medium) كما يطلب عند التوليد"""
+        word_count = self.word_count
+        if word_count is None:
+            word_count = len(self.content.split())
+        return "short" if word_count < SHORT_STORY_MAX_WORDS else "medium"
 
     def to_dict(self):
         """Convert the model to a dictionary"""
@@ -390,7 +498,7 @@ class AIGeneratedStory(db.Model):
                 "metadata": {
                     "age_group": self.age_group,
                     "difficulty": self.difficulty,
-                    "length": "short" if len(self.content.split()) < 200 else "medium",
+                    "length": self.length,
                 },
             },
             "vocabulary": json.loads(self.vocabulary),
@@ -406,6 +514,20 @@ class AIGeneratedStory(db.Model):
         }
 
 
+class StoryWordIndex(db.Model):
+    """فهرس معكوس من الكلمات (بعد التطبيع) إلى القصص التي تحتويها"""
+
+    __tablename__ = "story_word_index"
+
+    word = db.Column(db.String(100), primary_key=True)
+    story_id = db.Column(
+        db.Integer, db.ForeignKey("ai_generated_stories.id"), primary_key=True
+    )
+    is_target = db.Column(
+        db.Boolean, default=False
+    )  # Whether the word was one of the story's target words
+
+
 class StoryImage(db.Model):
     """نموذج لتخزين الصور المرتبطة بالقصص"""
 
@@ -415,7 +537,12 @@ class StoryImage(db.Model):
     story_id = db.Column(
         db.Integer, db.ForeignKey("ai_generated_stories.id"), nullable=False
     )
-    image_data = db.Column(db.Text, nullable=False)  # Base64 encoded image
+    image_data = db.Column(
+        db.Text, nullable=False, default=""
+    )  # Base64 encoded image (legacy rows, empty once moved to the blob store)
+    blob_hash = db.Column(
+        db.String(64), nullable=True, index=True
+    )  # SHA-256 of the image file in the blob store
     scene_text = db.Column(db.Text, nullable=True)  # Text description of the scene
     position = db.Column(
         db.Integer, default=0
@@ -430,7 +557,10 @@ class StoryImage(db.Model):
         return {
             "id": self.id,
             "story_id": self.story_id,
-            "image_data": self.image_data,
+            "image_url": (
+                f"/api/images/blob/{self.blob_hash}" if self.blob_hash else None
+            ),
+            "image_data": self.image_data or None,
             "scene_text": self.scene_text,
             "position": self.position,
             "style": self.style,
@@ -480,3 +610,127 @@ class CustomSentenceCategory(db.Model):
                 "sentences": [],
                 "created_at": self.created_at.isoformat() if self.created_at else None,
             }
+
+
+# عدادات المستويات تحدث داخل نفس المعاملة عند تغير الدروس أو اكتمالها،
+# بدلاً من COUNT على lessons و learning_progress عند كل تحديث للتقدم
+
+
+def _adjust_lesson_count(connection, level_id, delta):
+    if level_id is None:
+        return
+    levels = LearningLevel.__table__
+    connection.execute(
+        update(levels)
+        .where(levels.c.id == level_id)
+        .values(lesson_count=func.coalesce(levels.c.lesson_count, 0) + delta)
+    )
+
+
+def _adjust_completed_lessons(connection, user_id, level_id, delta):
+    progress = LearningProgress.__table__
+    connection.execute(
+        update(progress)
+        .where(
+            progress.c.user_id == user_id,
+            progress.c.level_id == level_id,
+            progress.c.lesson_id.is_(None),
+        )
+        .values(
+            completed_lessons=func.coalesce(progress.c.completed_lessons, 0) + delta
+        )
+    )
+
+
+@event.listens_for(Lesson, "after_insert")
+def _lesson_inserted(mapper, connection, target):
+    _adjust_lesson_count(connection, target.level_id, 1)
+
+
+@event.listens_for(Lesson, "after_delete")
+def _lesson_deleted(mapper, connection, target):
+    _adjust_lesson_count(connection, target.level_id, -1)
+
+
+def _move_lesson_progress(connection, lesson_id, old_level_id, new_level_id):
+    """
+    نقل سجلات تقدم درس انتقل إلى مستوى آخر مع دروسه المكتملة: عداد المستوى
+    القديم ينقص وعداد الجديد يزيد لكل مستخدم أكمل الدرس
+    """
+    progress = LearningProgress.__table__
+    completed_by = select(progress.c.user_id).where(
+        progress.c.lesson_id == lesson_id, progress.c.is_completed == True
+    )
+    for level_id, delta in ((old_level_id, -1), (new_level_id, 1)):
+        connection.execute(
+            update(progress)
+            .where(
+                progress.c.level_id == level_id,
+                progress.c.lesson_id.is_(None),
+                progress.c.user_id.in_(completed_by),
+            )
+            .values(
+                completed_lessons=func.coalesce(progress.c.completed_lessons, 0) + delta
+            )
+        )
+    connection.execute(
+        update(progress)
+        .where(progress.c.lesson_id == lesson_id)
+        .values(level_id=new_level_id)
+    )
+
+
+@event.listens_for(Lesson, "after_update")
+def _lesson_updated(mapper, connection, target):
+    history = inspect(target).attrs.level_id.history
+    if history.deleted and history.added:
+        _adjust_lesson_count(connection, history.deleted[0], -1)
+        _adjust_lesson_count(connection, history.added[0], 1)
+        _move_lesson_progress(
+            connection, target.id, history.deleted[0], history.added[0]
+        )
+
+
+@event.listens_for(LearningProgress, "before_insert")
+def _progress_inserting(mapper, connection, target):
+    # سجل المستوى الجديد يبدأ بعدد دروسه المكتملة الموجودة فعلاً: الدروس التي
+    # اكتملت قبل إنشائه لم تجد سجلاً تزيد عداده. الدروس المدرجة في نفس الدفعة
+    # تزيده بعد إدراجه في after_insert
+    if target.lesson_id is not None:
+        return
+    progress = LearningProgress.__table__
+    target.completed_lessons = connection.execute(
+        select(func.count())
+        .select_from(progress)
+        .where(
+            progress.c.user_id == target.user_id,
+            progress.c.level_id == target.level_id,
+            progress.c.lesson_id.isnot(None),
+            progress.c.is_completed == True,
+        )
+    ).scalar()
+
+
+@event.listens_for(LearningProgress, "after_insert")
+def _progress_inserted(mapper, connection, target):
+    if target.lesson_id is not None and target.is_completed:
+        _adjust_completed_lessons(connection, target.user_id, target.level_id, 1)
+
+
+@event.listens_for(LearningProgress, "after_delete")
+def _progress_deleted(mapper, connection, target):
+    if target.lesson_id is not None and target.is_completed:
+        _adjust_completed_lessons(connection, target.user_id, target.level_id, -1)
+
+
+@event.listens_for(LearningProgress, "after_update")
+def _progress_updated(mapper, connection, target):
+    if target.lesson_id is None:
+        return
+    history = inspect(target).attrs.is_completed.history
+    if not history.has_changes():
+        return
+    was_completed = bool(history.deleted[0]) if history.deleted else False
+    delta = int(bool(target.is_completed)) - int(was_completed)
+    if delta:
+        _adjust_completed_lessons(connection, target.user_id, target.level_id, delta)
@@ -1,5 +1,6 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from app.services.ai_service import AIService
+from app.services.blob_store import get_blob_store, is_valid_hash
 import base64
 import logging
 import traceback
@@ -118,6 +119,32 @@ def generate_image():
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+@images_bp.route("/blob/<blob_hash>", methods=["GET"])
+def get_image_blob(blob_hash):
+    """
+    إرجاع ملف صورة من مخزن الملفات حسب بصمة محتواه
+    المحتوى لا يتغير لنفس البصمة، لذلك يخزن في المتصفح كملف ثابت (immutable)
+    مع دعم الطلبات الشرطية (ETag) وطلبات النطاق (Range)
+    """
+    if not is_valid_hash(blob_hash):
+        return jsonify({"success": False, "message": "معرف الصورة غير صالح"}), 400
+
+    store = get_blob_store()
+    if not store.exists(blob_hash):
+        return jsonify({"success": False, "message": "الصورة غير موجودة"}), 404
+
+    response = send_file(
+        store.path_for(blob_hash),
+        mimetype=store.mimetype(blob_hash),
+        conditional=True,
+        etag=blob_hash,
+        max_age=365 * 24 * 3600,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @images_bp.route("/<entity_type>/<entity_id>", methods=["GET"])
 def get_entity_images(entity_type, entity_id):
     """
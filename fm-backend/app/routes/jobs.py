@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify
+from app.models.jobs import GenerationJob
+import logging
+import traceback
+
+logger = logging.getLogger(__name__)
+jobs_bp = Blueprint("jobs", __name__)
+
+
+@jobs_bp.route("/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """الحصول على حالة مهمة توليد ونتيجتها عند انتهائها"""
+    try:
+        job = GenerationJob.query.get(job_id)
+        if not job:
+            return jsonify({"success": False, "message": "المهمة غير موجودة"}), 404
+
+        return jsonify({"success": True, "job": job.to_dict()})
+
+    except Exception as e:
+        logger.error(f"Error retrieving job: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"success": False, "message": str(e)}), 500
@@ -11,6 +11,8 @@ from datetime import datetime
 import logging
 import json
 from app.services.ai_service import AIService
+from app.services.job_queue import job_queue, wants_async, enqueue_response
+from app.services.progress_cache import invalidate_progress_snapshot
 
 learning_bp = Blueprint("learning", __name__)
 
@@ -108,6 +110,7 @@ def update_progress(level_id):
                     next_progress.is_locked = False
 
         db.session.commit()
+        invalidate_progress_snapshot(user_id)
         return jsonify(
             {"message": "تم تحديث التقدم بنجاح", "progress": progress.to_dict()}
         )
@@ -143,6 +146,7 @@ def initialize_user_progress(user_id):
                 db.session.add(progress)
 
         db.session.commit()
+        invalidate_progress_snapshot(user_id)
         return jsonify({"message": "تم تهيئة تقدم المستخدم بنجاح"})
     except Exception as e:
         print(f"Error in initialize_user_progress: {e}")
@@ -277,35 +281,16 @@ def generate_section_exercises():
         return jsonify({"success": False, "message": str(e)}), 500
 
 
-@learning_bp.route("/generate-sentence-category", methods=["POST"])
-def generate_sentence_category():
-    """إنشاء فئة جديدة من الجمل باستخدام نماذج اللغة الكبيرة (LLM)"""
+def build_sentence_category(user_id, data):
+    """
+    إنشاء فئة جديدة من الجمل باستخدام نماذج اللغة الكبيرة (LLM) وحفظها للمستخدم
+    تعيد (البيانات، رمز الحالة) لاستخدامها من المسار أو من طابور المهام
+    """
     try:
-        data = request.json
-
-        if not data:
-            return jsonify({"success": False, "message": "البيانات مفقودة"}), 400
-
         # استخراج البيانات من الطلب
         category_name = data.get("category_name")  # اختياري
         difficulty_level = data.get("difficulty_level", "beginner")
         num_sentences = data.get("num_sentences", 5)
-        user_id = data.get("user_id")
-
-        if not user_id:
-            return (
-                jsonify({"success": False, "message": "يجب تحديد هوية المستخدم"}),
-                400,
-            )
-
-        # التحقق من صحة البيانات
-        if num_sentences < 3 or num_sentences > 10:
-            return (
-                jsonify(
-                    {"success": False, "message": "عدد الجمل يجب أن يكون بين 3 و 10"}
-                ),
-                400,
-            )
 
         # إنشاء خدمة الذكاء الاصطناعي
         ai_service = AIService()
@@ -319,12 +304,10 @@ def generate_sentence_category():
 
         if not result["success"]:
             return (
-                jsonify(
-                    {
-                        "success": False,
-                        "message": result.get("error", "حدث خطأ أثناء إنشاء فئة الجمل"),
-                    }
-                ),
+                {
+                    "success": False,
+                    "message": result.get("error", "حدث خطأ أثناء إنشاء فئة الجمل"),
+                },
                 500,
             )
 
@@ -357,17 +340,54 @@ def generate_sentence_category():
         db.session.commit()
 
         # إعادة البيانات للمستخدم
-        return jsonify(result), 200
+        return result, 200
 
     except Exception as e:
         print(f"Error in generate_sentence_category: {str(e)}")
         db.session.rollback()
         return (
-            jsonify({"success": False, "message": f"حدث خطأ في الخادم: {str(e)}"}),
+            {"success": False, "message": f"حدث خطأ في الخادم: {str(e)}"},
             500,
         )
 
 
+@learning_bp.route("/generate-sentence-category", methods=["POST"])
+def generate_sentence_category():
+    """
+    إنشاء فئة جديدة من الجمل باستخدام نماذج اللغة الكبيرة (LLM)
+    مع async=true يتم إرجاع معرف مهمة فورًا ومتابعتها عبر /api/jobs/<id>
+    """
+    data = request.json
+
+    if not data:
+        return jsonify({"success": False, "message": "البيانات مفقودة"}), 400
+
+    user_id = data.get("user_id")
+    num_sentences = data.get("num_sentences", 5)
+
+    if not user_id:
+        return (
+            jsonify({"success": False, "message": "يجب تحديد هوية المستخدم"}),
+            400,
+        )
+
+    # التحقق من صحة البيانات
+    if num_sentences < 3 or num_sentences > 10:
+        return (
+            jsonify({"success": False, "message": "عدد الجمل يجب أن يكون بين 3 و 10"}),
+            400,
+        )
+
+    if wants_async(data):
+        return enqueue_response("sentence_category", user_id, data)
+
+    result, status_code = build_sentence_category(user_id, data)
+    return jsonify(result), status_code
+
+
+job_queue.register("sentence_category", build_sentence_category)
+
+
 @learning_bp.route("/custom-sentence-categories/<int:user_id>", methods=["GET"])
 def get_custom_sentence_categories(user_id):
     """الحصول على فئات الجمل المخصصة للمستخدم"""
@@ -3,6 +3,14 @@ from datetime import datetime
 import json
 from app.models.user import User, LearningLevel, Lesson, LearningProgress
 from app.db import db
+from app.services.progress_cache import (
+    get_progress_snapshot,
+    invalidate_progress_snapshot,
+    progress_generation,
+    store_progress_snapshot,
+)
+from app.services.progress_buffer import progress_buffer
+from sqlalchemy import insert
 import traceback
 import logging
 
@@ -10,148 +18,176 @@ logger = logging.getLogger(__name__)
 progress_bp = Blueprint("progress", __name__, url_prefix="/api/progress")
 
 
+def _new_progress(user_id, level, lesson_id=None, completed_lessons=0):
+    """قيم سجل تقدم جديد (المستوى الأول فقط مفتوح) للإدراج الجماعي"""
+    return {
+        "user_id": user_id,
+        "level_id": level.id,
+        "lesson_id": lesson_id,
+        "is_locked": level.order != 1,
+        "progress": 0.0,  # Always start with 0%
+        "learned_items": "{}",
+        "current_step": 0,
+        "total_steps": 0,
+        "is_completed": False,
+        "completed_at": None,
+        "last_activity": datetime.utcnow(),
+        "completed_lessons": completed_lessons,
+    }
+
+
+def _progress_by_key(user_id):
+    """كل سجلات تقدم المستخدم باستعلام واحد مفهرسة بـ (level_id, lesson_id)"""
+    progress_by_key = {}
+    for record in (
+        LearningProgress.query.filter_by(user_id=user_id)
+        .order_by(LearningProgress.id)
+        .all()
+    ):
+        # عند وجود سجلات مكررة نعتمد الأقدم
+        progress_by_key.setdefault((record.level_id, record.lesson_id), record)
+    return progress_by_key
+
+
 @progress_bp.route("/user/<int:user_id>", methods=["GET"])
 def get_user_progress(user_id):
-    """الحصول على تقدم المستخدم في جميع الدروس والمستويات"""
-    logger.info(f"Fetching progress for user {user_id}")
-
+    """
+    الحصول على تقدم المستخدم في جميع الدروس والمستويات
+    تُخدم من لقطة مخزنة مع ETag، وتعيد 304 إذا لم يتغير التقدم منذ آخر طلب
+    """
     try:
-        # التحقق من وجود المستخدم
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({"error": "المستخدم غير موجود"}), 404
-
-        # جلب جميع المستويات للتنظيم
-        levels = LearningLevel.query.order_by(LearningLevel.order).all()
-
-        # تجهيز القالب الأساسي للنتيجة
-        result = []
-        for level in levels:
-            # جلب تقدم المستوى (إذا وجد)
-            level_progress = LearningProgress.query.filter_by(
-                user_id=user_id, level_id=level.id, lesson_id=None
-            ).first()
-
-            # إذا لم يكن هناك تقدم، قم بإنشاء واحد جديد
-            if not level_progress:
-                logger.warning(
-                    f"No progress found for user {user_id} in level {level.id}, creating new progress"
-                )
-                level_progress = LearningProgress(
-                    user_id=user_id,
-                    level_id=level.id,
-                    lesson_id=None,
-                    is_locked=level.order != 1,  # فقط المستوى الأول مفتوح
-                    progress=0.0,  # Always start with 0%
-                    learned_items="{}",
-                    is_completed=False,
-                    completed_at=None,
-                    last_activity=datetime.utcnow(),
-                )
-                db.session.add(level_progress)
-                try:
-                    db.session.commit()
-                    logger.info(
-                        f"Created new progress for user {user_id} in level {level.id}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error creating progress: {str(e)}")
-                    db.session.rollback()
-                    return jsonify({"error": "Error creating progress"}), 500
-
-            # Verify progress value
-            if level_progress.progress is None:
-                level_progress.progress = 0.0
-                db.session.commit()
-
-            level_data = {
-                "level_id": level.id,
-                "level_title": level.title,
-                "level_progress": level_progress.progress,
-                "is_locked": level_progress.is_locked,
-                "is_completed": level_progress.is_completed,
+        # كتابة تحديثات الموضع المؤجلة لهذا المستخدم قبل قراءة تقدمه
+        progress_buffer.flush_user(user_id)
+
+        snapshot = get_progress_snapshot(user_id)
+        if snapshot is None:
+            # التحقق من وجود المستخدم
+            user = User.query.get(user_id)
+            if not user:
+                return jsonify({"error": "المستخدم غير موجود"}), 404
+
+            # الجيل يقرأ قبل البناء حتى لا تخزن لقطة سبقها تحديث
+            generation = progress_generation(user_id)
+            snapshot = store_progress_snapshot(
+                user_id, _build_user_progress(user_id), generation
+            )
+
+        response = jsonify(snapshot["data"])
+        response.set_etag(snapshot["etag"])
+        # العميل يحتفظ بالنسخة لكن يتحقق منها في كل طلب
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in get_user_progress: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": f"حدث خطأ أثناء جلب التقدم: {str(e)}"}), 500
+
+
+def _build_user_progress(user_id):
+    """
+    بناء شجرة تقدم المستخدم (المستويات ودروسها)
+    عدد ثابت من الاستعلامات مهما زاد عدد الدروس، والسجلات الناقصة تنشأ دفعة واحدة
+    """
+    # جلب المستويات والدروس وكل سجلات تقدم المستخدم باستعلام واحد لكل منها
+    levels = LearningLevel.query.order_by(LearningLevel.order).all()
+
+    lessons_by_level = {}
+    for lesson in Lesson.query.order_by(Lesson.level_id, Lesson.order).all():
+        lessons_by_level.setdefault(lesson.level_id, []).append(lesson)
+
+    progress_by_key = _progress_by_key(user_id)
+
+    # إنشاء السجلات الناقصة بإدراج جماعي واحد
+    # (سجل المستوى الجديد يبدأ بعدد الدروس المكتملة الموجودة فعلاً)
+    completed_by_level = {}
+    for (level_id, lesson_id), record in progress_by_key.items():
+        if lesson_id is not None and record.is_completed:
+            completed_by_level[level_id] = completed_by_level.get(level_id, 0) + 1
+
+    missing = []
+    for level in levels:
+        keys = [(level.id, None)] + [
+            (level.id, lesson.id) for lesson in lessons_by_level.get(level.id, [])
+        ]
+        missing.extend(
+            _new_progress(
+                user_id,
+                level,
+                lesson_id,
+                completed_by_level.get(level.id, 0) if lesson_id is None else 0,
+            )
+            for level_id, lesson_id in keys
+            if (level_id, lesson_id) not in progress_by_key
+        )
+
+    if missing:
+        logger.warning(
+            f"Creating {len(missing)} missing progress records for user {user_id}"
+        )
+        db.session.execute(insert(LearningProgress), missing)
+        progress_by_key = _progress_by_key(user_id)
+
+    for record in progress_by_key.values():
+        if record.progress is None:
+            record.progress = 0.0
+
+    # تجهيز النتيجة قبل الحفظ حتى لا يعاد تحميل السجلات بعده
+    result = []
+    for level in levels:
+        level_progress = progress_by_key[(level.id, None)]
+        level_data = {
+            "level_id": level.id,
+            "level_title": level.title,
+            "level_progress": level_progress.progress,
+            "is_locked": level_progress.is_locked,
+            "is_completed": level_progress.is_completed,
+            "completed_at": (
+                level_progress.completed_at.isoformat()
+                if level_progress.completed_at
+                else None
+            ),
+            "learned_items": (
+                json.loads(level_progress.learned_items)
+                if level_progress.learned_items
+                else {}
+            ),
+            "lessons": [],
+        }
+
+        for lesson in lessons_by_level.get(level.id, []):
+            lesson_progress = progress_by_key[(level.id, lesson.id)]
+            lesson_data = {
+                "lesson_id": lesson.id,
+                "lesson_title": lesson.title,
+                "progress": lesson_progress.progress,
+                "current_step": lesson_progress.current_step,
+                "total_steps": lesson_progress.total_steps,
+                "is_completed": lesson_progress.is_completed,
                 "completed_at": (
-                    level_progress.completed_at.isoformat()
-                    if level_progress and level_progress.completed_at
+                    lesson_progress.completed_at.isoformat()
+                    if lesson_progress.completed_at
                     else None
                 ),
-                "learned_items": (
-                    json.loads(level_progress.learned_items)
-                    if level_progress and level_progress.learned_items
-                    else {}
-                ),
-                "lessons": [],
             }
 
-            # Log the level progress being returned
-            logger.info(
-                f"Level {level.id} progress for user {user_id}: {level_progress.progress}%"
-            )
-
-            # جلب دروس المستوى
-            lessons = (
-                Lesson.query.filter_by(level_id=level.id).order_by(Lesson.order).all()
-            )
-
-            # جلب تقدم كل درس
-            for lesson in lessons:
-                lesson_progress = LearningProgress.query.filter_by(
-                    user_id=user_id, level_id=level.id, lesson_id=lesson.id
-                ).first()
-
-                if not lesson_progress:
-                    lesson_progress = LearningProgress(
-                        user_id=user_id,
-                        level_id=level.id,
-                        lesson_id=lesson.id,
-                        is_locked=level.order != 1,
-                        progress=0.0,
-                        learned_items="{}",
-                        is_completed=False,
-                        completed_at=None,
-                        last_activity=datetime.utcnow(),
+            if lesson_progress.last_position:
+                try:
+                    lesson_data["last_position"] = json.loads(
+                        lesson_progress.last_position
                     )
-                    db.session.add(lesson_progress)
-                    db.session.commit()
-
-                lesson_data = {
-                    "lesson_id": lesson.id,
-                    "lesson_title": lesson.title,
-                    "progress": lesson_progress.progress if lesson_progress else 0,
-                    "current_step": (
-                        lesson_progress.current_step if lesson_progress else 0
-                    ),
-                    "total_steps": (
-                        lesson_progress.total_steps if lesson_progress else 1
-                    ),
-                    "is_completed": (
-                        lesson_progress.is_completed if lesson_progress else False
-                    ),
-                    "completed_at": (
-                        lesson_progress.completed_at.isoformat()
-                        if lesson_progress and lesson_progress.completed_at
-                        else None
-                    ),
-                }
+                except:
+                    lesson_data["last_position"] = {}
 
-                if lesson_progress and lesson_progress.last_position:
-                    try:
-                        lesson_data["last_position"] = json.loads(
-                            lesson_progress.last_position
-                        )
-                    except:
-                        lesson_data["last_position"] = {}
-
-                level_data["lessons"].append(lesson_data)
+            level_data["lessons"].append(lesson_data)
 
-            result.append(level_data)
+        result.append(level_data)
 
-        return jsonify(result), 200
+    db.session.commit()
 
-    except Exception as e:
-        logger.error(f"Error in get_user_progress: {str(e)}")
-        traceback.print_exc()
-        return jsonify({"error": f"حدث خطأ أثناء جلب التقدم: {str(e)}"}), 500
+    return result
 
 
 @progress_bp.route("/update", methods=["POST"])
@@ -253,6 +289,8 @@ def update_progress():
             user.completed_lessons += 1
             db.session.commit()
 
+        invalidate_progress_snapshot(user_id)
+
         return jsonify(
             {
                 "success": True,
@@ -302,6 +340,8 @@ def get_level_progress(level_id, user_id):
 def get_lesson_progress(lesson_id, user_id):
     """Get user's progress for a specific lesson"""
     try:
+        progress_buffer.flush_user(user_id)
+
         # Check if user exists
         user = User.query.get(user_id)
         if not user:
@@ -323,6 +363,47 @@ def get_lesson_progress(lesson_id, user_id):
         return jsonify({"error": f"Failed to get lesson progress: {str(e)}"}), 500
 
 
+def _apply_lesson_update(lesson_progress, update):
+    """تطبيق حقول تحديث درس واحد على سجل تقدمه"""
+    lesson_progress.progress = update.get("progress", 0)
+    lesson_progress.last_activity = datetime.utcnow()
+
+    if update.get("current_step") is not None:
+        lesson_progress.current_step = update["current_step"]
+
+    if update.get("total_steps") is not None:
+        lesson_progress.total_steps = update["total_steps"]
+
+    last_position = update.get("last_position")
+    if last_position is not None:
+        if isinstance(last_position, dict):
+            lesson_progress.last_position = json.dumps(last_position)
+        else:
+            lesson_progress.last_position = last_position
+
+    # Mark as completed if specified
+    if update.get("completed", False):
+        lesson_progress.is_completed = True
+        lesson_progress.completed_at = datetime.utcnow()
+
+
+def _refresh_level_progress(level_progress, user, completed, total):
+    """
+    حساب تقدم المستوى من عدد دروسه المكتملة، ومكافأة المستخدم (نجمة ودرس
+    مكتمل) مرة واحدة فقط عند اكتمال المستوى لأول مرة
+    القاعدة نفسها في التحديث الفردي والدفعة
+    """
+    completed = completed or 0
+    total = total or 1
+    level_progress.progress = (completed / total) * 100
+
+    if completed >= total and not level_progress.is_completed:
+        level_progress.is_completed = True
+        level_progress.completed_at = datetime.utcnow()
+        user.total_stars = (user.total_stars or 0) + 1
+        user.completed_lessons = (user.completed_lessons or 0) + 1
+
+
 @progress_bp.route("/lesson/update", methods=["POST"])
 def update_lesson_progress():
     """Update user's progress for a specific lesson"""
@@ -334,11 +415,6 @@ def update_lesson_progress():
         user_id = data.get("user_id")
         level_id = data.get("level_id")
         lesson_id = data.get("lesson_id")
-        progress_value = data.get("progress", 0)
-        completed = data.get("completed", False)
-        current_step = data.get("current_step")
-        total_steps = data.get("total_steps")
-        last_position = data.get("last_position")
 
         if not user_id or not level_id or not lesson_id:
             return (
@@ -346,11 +422,40 @@ def update_lesson_progress():
                 400,
             )
 
+        # تحديثات الموضع فقط تؤجل وتدمج، والإكمال يكتب فورًا بعد تفريغ المؤجل
+        buffered = progress_buffer.enabled and not data.get("completed", False)
+        if not buffered:
+            progress_buffer.flush_user(user_id)
+
         # Check if user exists
         user = User.query.get(user_id)
         if not user:
             return jsonify({"success": False, "message": "User not found"}), 404
 
+        if buffered:
+            try:
+                fields = progress_buffer.record(user.id, level_id, lesson_id, data)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            if "last_position" in fields:
+                fields["last_position"] = json.loads(fields["last_position"])
+            return jsonify(
+                {
+                    "success": True,
+                    "message": "Lesson progress queued",
+                    "buffered": True,
+                    "data": {
+                        "progress": dict(
+                            fields,
+                            user_id=user.id,
+                            level_id=level_id,
+                            lesson_id=lesson_id,
+                        ),
+                        "user": user.to_dict(),
+                    },
+                }
+            )
+
         # Get the lesson progress record
         lesson_progress = LearningProgress.query.filter_by(
             user_id=user_id, level_id=level_id, lesson_id=lesson_id
@@ -368,24 +473,7 @@ def update_lesson_progress():
             db.session.add(lesson_progress)
 
         # Update progress fields
-        lesson_progress.progress = progress_value
-
-        if current_step is not None:
-            lesson_progress.current_step = current_step
-
-        if total_steps is not None:
-            lesson_progress.total_steps = total_steps
-
-        if last_position is not None:
-            if isinstance(last_position, dict):
-                lesson_progress.last_position = json.dumps(last_position)
-            else:
-                lesson_progress.last_position = last_position
-
-        # Mark as completed if specified
-        if completed:
-            lesson_progress.is_completed = True
-            lesson_progress.completed_at = datetime.utcnow()
+        _apply_lesson_update(lesson_progress, data)
 
         db.session.commit()
 
@@ -394,35 +482,25 @@ def update_lesson_progress():
             user_id=user_id, level_id=level_id, lesson_id=None
         ).first()
 
+        if not level_progress:
+            level = LearningLevel.query.get(level_id)
+            if level:
+                level_progress = LearningProgress(**_new_progress(user_id, level))
+                db.session.add(level_progress)
+                db.session.flush()
+
         if level_progress:
-            # Calculate percentage of completed lessons in this level
-            total_lessons = (
-                db.session.query(db.func.count())
-                .select_from(Lesson)
-                .filter_by(level_id=level_id)
-                .scalar()
-                or 1
-            )
-            completed_lessons = (
-                db.session.query(db.func.count())
-                .select_from(LearningProgress)
-                .filter_by(user_id=user_id, level_id=level_id, is_completed=True)
-                .filter(LearningProgress.lesson_id.isnot(None))
-                .scalar()
-                or 0
+            # العدادات تحدث مع كل تغيير في is_completed أو في دروس المستوى
+            _refresh_level_progress(
+                level_progress,
+                user,
+                level_progress.completed_lessons,
+                level_progress.level.lesson_count,
             )
-
-            level_progress.progress = (completed_lessons / total_lessons) * 100
-
-            # Check if all lessons are completed
-            if completed_lessons == total_lessons:
-                level_progress.is_completed = True
-                level_progress.completed_at = datetime.utcnow()
-                user.total_stars += 1
-                user.completed_lessons += 1
-
             db.session.commit()
 
+        invalidate_progress_snapshot(user_id)
+
         return jsonify(
             {
                 "success": True,
@@ -444,3 +522,208 @@ def update_lesson_progress():
             ),
             500,
         )
+
+
+# الحد الأقصى لعدد التحديثات في طلب دفعة واحد
+MAX_LESSON_BATCH = 200
+
+
+def _as_int(value):
+    """معرف موجب من JSON (رقم أو نص رقمي)، أو None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+@progress_bp.route("/lesson/batch", methods=["POST"])
+def update_lesson_progress_batch():
+    """
+    تحديث تقدم عدة دروس (من مستويات مختلفة) لمستخدم واحد في معاملة واحدة
+    Body: {"user_id": 1, "updates": [{"level_id", "lesson_id", "progress", ...}]}
+    يعاد حساب تقدم كل مستوى متأثر مرة واحدة وتعاد حالته النهائية
+    """
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"success": False, "message": "Missing data"}), 400
+
+        user_id = data.get("user_id")
+        updates = data.get("updates")
+
+        if not user_id or not isinstance(updates, list) or not updates:
+            return (
+                jsonify({"success": False, "message": "Missing required fields"}),
+                400,
+            )
+
+        if len(updates) > MAX_LESSON_BATCH:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "message": f"Too many updates (max {MAX_LESSON_BATCH})",
+                    }
+                ),
+                400,
+            )
+
+        for index, update in enumerate(updates):
+            if not isinstance(update, dict) or not all(
+                _as_int(update.get(field)) for field in ("level_id", "lesson_id")
+            ):
+                return (
+                    jsonify(
+                        {
+                            "success": False,
+                            "message": f"Missing level_id or lesson_id in update {index}",
+                        }
+                    ),
+                    400,
+                )
+
+        # المعرفات قد تصل كنصوص ("3")، فتوحد حتى تطابق مفاتيح السجلات
+        updates = [
+            dict(
+                update,
+                level_id=_as_int(update["level_id"]),
+                lesson_id=_as_int(update["lesson_id"]),
+            )
+            for update in updates
+        ]
+
+        progress_buffer.flush_user(user_id)
+
+        # Check if user exists
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({"success": False, "message": "User not found"}), 404
+
+        level_ids = {update["level_id"] for update in updates}
+        lesson_ids = {update["lesson_id"] for update in updates}
+
+        # جلب سجلات الدروس والمستويات المتأثرة باستعلام واحد لكل منها
+        lesson_records = {}
+        for record in (
+            LearningProgress.query.filter(
+                LearningProgress.user_id == user_id,
+                LearningProgress.lesson_id.in_(lesson_ids),
+            )
+            .order_by(LearningProgress.id)
+            .all()
+        ):
+            lesson_records.setdefault((record.level_id, record.lesson_id), record)
+
+        levels = {
+            level.id: level
+            for level in LearningLevel.query.filter(LearningLevel.id.in_(level_ids))
+        }
+        unknown = sorted(level_ids - set(levels))
+        if unknown:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "message": "Level not found",
+                        "level_ids": unknown,
+                    }
+                ),
+                404,
+            )
+
+        level_records = {}
+        for record in (
+            LearningProgress.query.filter(
+                LearningProgress.user_id == user_id,
+                LearningProgress.level_id.in_(level_ids),
+                LearningProgress.lesson_id.is_(None),
+            )
+            .order_by(LearningProgress.id)
+            .all()
+        ):
+            level_records.setdefault(record.level_id, record)
+
+        # المستوى بلا سجل تقدم ينشأ سجله كما في _build_user_progress حتى يحسب
+        # اكتماله (وعدد دروسه المكتملة يملأ عند إدراجه)
+        for level_id in level_ids - set(level_records):
+            level_records[level_id] = LearningProgress(
+                **_new_progress(user_id, levels[level_id])
+            )
+            db.session.add(level_records[level_id])
+
+        # تطبيق التحديثات بالترتيب (التحديث الأخير لنفس الدرس هو المعتمد)
+        touched_lessons = {}
+        for update in updates:
+            key = (update["level_id"], update["lesson_id"])
+            lesson_progress = lesson_records.get(key)
+            if not lesson_progress:
+                lesson_progress = LearningProgress(
+                    user_id=user_id,
+                    level_id=key[0],
+                    lesson_id=key[1],
+                    progress=0,
+                    is_locked=False,
+                )
+                db.session.add(lesson_progress)
+                lesson_records[key] = lesson_progress
+
+            _apply_lesson_update(lesson_progress, update)
+            touched_lessons[key] = lesson_progress
+
+        db.session.flush()
+
+        # إعادة حساب كل مستوى متأثر مرة واحدة من العدادات المحدثة أثناء flush
+        counters = {
+            level_id: (completed, lesson_count)
+            for level_id, completed, lesson_count in db.session.query(
+                LearningProgress.level_id,
+                LearningProgress.completed_lessons,
+                LearningLevel.lesson_count,
+            )
+            .join(LearningLevel, LearningLevel.id == LearningProgress.level_id)
+            .filter(
+                LearningProgress.id.in_(
+                    [record.id for record in level_records.values()]
+                )
+            )
+        }
+
+        for level_id, level_progress in level_records.items():
+            _refresh_level_progress(level_progress, user, *counters[level_id])
+
+        # تجهيز الحالة النهائية قبل الحفظ حتى لا يعاد تحميل كل سجل بعده
+        result = {
+            "levels": [
+                level_records[level_id].to_dict() for level_id in sorted(level_records)
+            ],
+            "lessons": [record.to_dict() for record in touched_lessons.values()],
+            "user": user.to_dict(),
+        }
+
+        db.session.commit()
+        invalidate_progress_snapshot(user_id)
+
+        return jsonify(
+            {
+                "success": True,
+                "message": f"{len(touched_lessons)} lessons updated successfully",
+                "data": result,
+            }
+        )
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating lesson progress batch: {str(e)}")
+        traceback.print_exc()
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "message": f"Failed to update lesson progress: {str(e)}",
+                }
+            ),
+            500,
+        )
@@ -1,31 +1,177 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from app.models.user import User, SpeechActivity, SpeechErrorRecord
 from app.db import db
-from datetime import datetime
-from sqlalchemy import func
-import os
-import base64
+from app.services.audio_upload import (
+    AudioTooLargeError,
+    audio_extension,
+    max_audio_bytes,
+    save_audio_base64,
+    save_audio_stream,
+)
+from app.services.phonetic_errors import classify_errors
+from app.services.speech_alignment import score_batch, score_submission
+from app.services.speech_stats import (
+    TREND_BUCKETS,
+    edge_accuracies,
+    load_accuracy_trend,
+    load_speech_stats,
+)
+from app.services.target_words import invalidate_target_words
+from app.services.word_error_stats import (
+    ERROR_COLUMNS,
+    add_word_errors,
+    top_word_errors,
+)
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert
+from werkzeug.exceptions import RequestEntityTooLarge
 import logging
 import traceback
 
 logger = logging.getLogger(__name__)
 speech_bp = Blueprint("speech", __name__)
 
+MAX_SCORE_BATCH = 100
+
+# مساحة حقول النموذج (النص الأصلي والمتعرف عليه) فوق حد حجم التسجيل
+MAX_FORM_OVERHEAD = 256 * 1024
+MAX_ERROR_BATCH = 1000
+
+ERROR_TYPES = ("minor", "severe")
+ERROR_WORD_FIELDS = ("original_word", "spoken_word")
+
+
+def _is_raw_audio(req):
+    return req.mimetype.startswith("audio/") or (
+        req.mimetype == "application/octet-stream"
+    )
+
+
+def _error_problems(error):
+    """Validation problems of one submitted error (empty when valid)"""
+    if not isinstance(error, dict):
+        return ["must be an object"]
+    problems = []
+    for field in ERROR_WORD_FIELDS:
+        value = error.get(field)
+        if not isinstance(value, str) or not value.strip():
+            problems.append(f"missing {field}")
+        elif len(value) > 100:
+            problems.append(f"{field} is longer than 100 characters")
+    if error.get("error_type") not in ERROR_TYPES:
+        problems.append(f"error_type must be one of {', '.join(ERROR_TYPES)}")
+    category = error.get("error_category")
+    if category is not None and (not isinstance(category, str) or len(category) > 50):
+        problems.append("error_category must be a string of at most 50 characters")
+    return problems
+
+
+def _activity_id(value):
+    """Submitted activity id as an int ("12" is accepted), None when invalid"""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def insert_error_records(user_id, errors, return_records=False):
+    """
+    Classify (in one batch) and insert validated errors with a single bulk
+    INSERT ... RETURNING. Column defaults (normalized_word, similarity_score,
+    created_at) are applied per row by the INSERT itself, and the returned
+    rows update user_word_error_stats.
+    Each error is {activity_id, original_word, spoken_word, error_type,
+    error_category?}; a category sent by the client takes precedence.
+    Returns the new ids in input order, or the SpeechErrorRecord objects
+    when return_records is True.
+    """
+    if not errors:
+        return []
+
+    categories = classify_errors(
+        (error["original_word"], error["spoken_word"]) for error in errors
+    )
+    rows = [
+        {
+            "user_id": user_id,
+            "activity_id": error["activity_id"],
+            "original_word": error["original_word"],
+            "spoken_word": error["spoken_word"],
+            "error_type": error["error_type"],
+            "error_category": error.get("error_category") or category,
+        }
+        for error, category in zip(errors, categories)
+    ]
+    if return_records:
+        inserted = db.session.scalars(
+            insert(SpeechErrorRecord).returning(
+                SpeechErrorRecord, sort_by_parameter_order=True
+            ),
+            rows,
+        ).all()
+    else:
+        inserted = db.session.execute(
+            insert(SpeechErrorRecord).returning(
+                *ERROR_COLUMNS, sort_by_parameter_order=True
+            ),
+            rows,
+        ).all()
+
+    # الإدراج الجماعي لا يطلق أحداث after_insert، فتحدث العدادات هنا مباشرة
+    add_word_errors(db.session.connection(), inserted)
+    return inserted if return_records else [row.id for row in inserted]
+
 
 @speech_bp.route("/save", methods=["POST"])
 def save_speech_activity():
-    """Save speech recognition activity and optionally the audio recording"""
+    """
+    Save speech recognition activity and optionally the audio recording.
+    The recording can be sent three ways:
+    - multipart/form-data: the activity fields as form fields and the
+      recording as an "audio" file part
+    - a raw audio/* (or application/octet-stream) body with the activity
+      fields in the query string
+    - JSON with a base64 "audio_data" field (kept for older clients)
+    Multipart and raw uploads are streamed to disk in chunks and capped at
+    SPEECH_AUDIO_MAX_BYTES.
+    """
     try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "Missing data"}), 400
+        audio_stream = None
+        audio_mimetype = None
+        if request.mimetype == "multipart/form-data" or _is_raw_audio(request):
+            # رفض الطلب الأكبر من الحد قبل قراءة أي جزء منه
+            request.max_content_length = max_audio_bytes() + MAX_FORM_OVERHEAD
+            if (
+                request.content_length is not None
+                and request.content_length > request.max_content_length
+            ):
+                raise RequestEntityTooLarge()
+
+            if request.mimetype == "multipart/form-data":
+                data = request.form
+                audio = request.files.get("audio")
+                if audio:
+                    audio_stream, audio_mimetype = audio.stream, audio.mimetype
+            else:
+                data = request.args
+                audio_stream, audio_mimetype = request.stream, request.mimetype
+
+            user_id = data.get("user_id", type=int)
+            accuracy = data.get("accuracy", type=float)
+        else:
+            data = request.json
+            if not data:
+                return jsonify({"error": "Missing data"}), 400
+
+            user_id = data.get("user_id")
+            accuracy = data.get("accuracy")
 
-        user_id = data.get("user_id")
         story_id = data.get("story_id")
         original_text = data.get("original_text")
         recognized_text = data.get("recognized_text")
-        accuracy = data.get("accuracy", 0)
-        audio_data = data.get("audio_data")  # Base64 encoded audio data
+        audio_data = data.get("audio_data")  # Base64 encoded audio data (JSON mode)
 
         if not user_id or not story_id or not original_text:
             return jsonify({"error": "Missing required fields"}), 400
@@ -36,33 +182,30 @@ def save_speech_activity():
             return jsonify({"error": "User not found"}), 404
 
         # Handle audio data if provided
-        audio_file_path = None
-        if audio_data:
+        audio = None
+        if audio_stream is not None or audio_data:
             try:
-                # Create directory if it doesn't exist
-                audio_dir = os.path.join(
-                    current_app.config.get("UPLOAD_FOLDER", "uploads"), "speech"
-                )
-                os.makedirs(audio_dir, exist_ok=True)
-
-                # Save audio file
-                file_name = f"speech_{user_id}_{story_id}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.wav"
-                audio_file_path = os.path.join(audio_dir, file_name)
-
-                # Remove data URL prefix if present
-                if audio_data.startswith("data:audio"):
-                    audio_data = audio_data.split(",")[1]
-
-                # Decode and save
-                with open(audio_file_path, "wb") as f:
-                    f.write(base64.b64decode(audio_data))
-
-                # Make path relative to app root
-                audio_file_path = os.path.join("uploads", "speech", file_name)
-
+                if audio_stream is not None:
+                    audio = save_audio_stream(
+                        audio_stream,
+                        user_id,
+                        story_id,
+                        audio_extension(audio_mimetype),
+                    )
+                else:
+                    audio = save_audio_base64(audio_data, user_id, story_id)
+            except AudioTooLargeError:
+                raise RequestEntityTooLarge()
             except Exception as e:
                 logger.error(f"Error saving audio file: {str(e)}")
-                audio_file_path = None
+                audio = None
+        audio_file_path = audio["path"] if audio else None
+
+        # بدون دقة من العميل يقيم الخادم القراءة ويسجل أخطاءها في نفس المعاملة
+        score = None
+        if accuracy is None:
+            score = score_submission(original_text, recognized_text or "")
+            accuracy = score["accuracy"]
 
         # Create speech activity record
         speech_activity = SpeechActivity(
@@ -76,23 +219,101 @@ def save_speech_activity():
         )
 
         db.session.add(speech_activity)
+
+        error_records = []
+        if score is not None:
+            db.session.flush()
+            error_records = insert_error_records(
+                user_id,
+                [
+                    dict(error, activity_id=speech_activity.id)
+                    for error in score["errors"]
+                ],
+                return_records=True,
+            )
+
         db.session.commit()
+        invalidate_target_words(user_id)
+
+        result = {
+            "activity_id": speech_activity.id,
+            "accuracy": accuracy,
+            "created_at": speech_activity.created_at.isoformat(),
+        }
+        if audio:
+            result["audio"] = {"sha256": audio["sha256"], "size": audio["size"]}
+        if score is not None:
+            result["words"] = score["words"]
+            result["errors"] = [record.to_dict() for record in error_records]
+
+        return jsonify({"success": True, "data": result})
+
+    except RequestEntityTooLarge:
+        return (
+            jsonify({"error": f"Audio is larger than {max_audio_bytes()} bytes"}),
+            413,
+        )
+    except Exception as e:
+        logger.error(f"Error saving speech activity: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to save speech activity: {str(e)}"}), 500
+
+
+@speech_bp.route("/score", methods=["POST"])
+def score_speech():
+    """Align recognized text with the original and score it without saving"""
+    try:
+        data = request.json or {}
+        if not data.get("original_text"):
+            return jsonify({"error": "Missing original_text"}), 400
 
         return jsonify(
             {
                 "success": True,
-                "data": {
-                    "activity_id": speech_activity.id,
-                    "accuracy": accuracy,
-                    "created_at": speech_activity.created_at.isoformat(),
-                },
+                "data": score_submission(
+                    data["original_text"], data.get("recognized_text") or ""
+                ),
             }
         )
 
     except Exception as e:
-        logger.error(f"Error saving speech activity: {str(e)}")
+        logger.error(f"Error scoring speech: {str(e)}")
         traceback.print_exc()
-        return jsonify({"error": f"Failed to save speech activity: {str(e)}"}), 500
+        return jsonify({"error": f"Failed to score speech: {str(e)}"}), 500
+
+
+@speech_bp.route("/score/batch", methods=["POST"])
+def score_speech_batch():
+    """Score many (original_text, recognized_text) submissions in one request"""
+    try:
+        data = request.json or {}
+        submissions = data.get("submissions")
+        if not isinstance(submissions, list) or not submissions:
+            return jsonify({"error": "submissions must be a non-empty list"}), 400
+        if len(submissions) > MAX_SCORE_BATCH:
+            return (
+                jsonify(
+                    {
+                        "error": f"At most {MAX_SCORE_BATCH} submissions per batch",
+                    }
+                ),
+                400,
+            )
+        if not all(
+            isinstance(submission, dict) and submission.get("original_text")
+            for submission in submissions
+        ):
+            return (
+                jsonify({"error": "Every submission needs an original_text"}),
+                400,
+            )
+
+        return jsonify({"success": True, "data": score_batch(submissions)})
+
+    except Exception as e:
+        logger.error(f"Error scoring speech batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to score speech batch: {str(e)}"}), 500
 
 
 @speech_bp.route("/history/<int:user_id>", methods=["GET"])
@@ -138,83 +359,7 @@ def get_speech_stats(user_id):
         # Get story_id filter if provided
         story_id = request.args.get("story_id")
 
-        # Base query for all activities
-        query = SpeechActivity.query.filter_by(user_id=user_id)
-        if story_id:
-            query = query.filter_by(story_id=story_id)
-
-        # Get total activities
-        total_activities = query.count()
-
-        if total_activities == 0:
-            return (
-                jsonify(
-                    {
-                        "total_activities": 0,
-                        "average_accuracy": 0,
-                        "highest_accuracy": 0,
-                        "improvement_trend": 0,
-                        "most_recent_accuracy": 0,
-                    }
-                ),
-                200,
-            )
-
-        # Get average accuracy
-        from sqlalchemy import func
-
-        avg_accuracy = (
-            db.session.query(func.avg(SpeechActivity.accuracy))
-            .filter(SpeechActivity.user_id == user_id)
-            .scalar()
-            or 0
-        )
-
-        # Get highest accuracy
-        highest_accuracy = (
-            db.session.query(func.max(SpeechActivity.accuracy))
-            .filter(SpeechActivity.user_id == user_id)
-            .scalar()
-            or 0
-        )
-
-        # Get most recent accuracy
-        most_recent = query.order_by(SpeechActivity.created_at.desc()).first()
-        most_recent_accuracy = most_recent.accuracy if most_recent else 0
-
-        # Calculate improvement trend (compare first 5 with most recent 5)
-        first_activities = (
-            query.order_by(SpeechActivity.created_at.asc()).limit(5).all()
-        )
-        recent_activities = (
-            query.order_by(SpeechActivity.created_at.desc()).limit(5).all()
-        )
-
-        first_avg = (
-            sum(a.accuracy for a in first_activities) / len(first_activities)
-            if first_activities
-            else 0
-        )
-        recent_avg = (
-            sum(a.accuracy for a in recent_activities) / len(recent_activities)
-            if recent_activities
-            else 0
-        )
-
-        improvement_trend = recent_avg - first_avg
-
-        return (
-            jsonify(
-                {
-                    "total_activities": total_activities,
-                    "average_accuracy": round(avg_accuracy, 2),
-                    "highest_accuracy": round(highest_accuracy, 2),
-                    "improvement_trend": round(improvement_trend, 2),
-                    "most_recent_accuracy": round(most_recent_accuracy, 2),
-                }
-            ),
-            200,
-        )
+        return jsonify(load_speech_stats(user_id, story_id)), 200
 
     except Exception as e:
         logger.error(f"Error getting speech stats: {str(e)}")
@@ -224,54 +369,116 @@ def get_speech_stats(user_id):
 
 @speech_bp.route("/errors", methods=["POST"])
 def record_speech_errors():
-    """Record specific pronunciation errors from a speech activity."""
+    """
+    Record pronunciation errors for one activity ({activity_id, errors}) or for
+    several at once ({activities: [{activity_id, errors}, ...]}, e.g. after an
+    offline session). The whole payload is validated before anything is written
+    and all rows go in with one bulk INSERT.
+    Returns the new record ids; pass ?include=errors for the full records.
+    """
     try:
-        data = request.json
+        data = request.json or {}
 
         # Validate request data
-        if not all(k in data for k in ["user_id", "activity_id", "errors"]):
+        if "activities" in data:
+            batches = data["activities"]
+        elif "activity_id" in data and "errors" in data:
+            batches = [{"activity_id": data["activity_id"], "errors": data["errors"]}]
+        else:
+            batches = None
+        if not data.get("user_id") or not isinstance(batches, list) or not batches:
             return (
                 jsonify({"success": False, "message": "Missing required fields"}),
                 400,
             )
 
+        invalid = []
+        for index, batch in enumerate(batches):
+            activity_id = (
+                _activity_id(batch.get("activity_id"))
+                if isinstance(batch, dict)
+                else None
+            )
+            if activity_id is None:
+                invalid.append(f"activities[{index}]: missing activity_id")
+            elif not isinstance(batch.get("errors"), list):
+                invalid.append(f"activities[{index}]: errors must be a list")
+            else:
+                batch["activity_id"] = activity_id
+                invalid.extend(
+                    f"activities[{index}].errors[{position}]: {problem}"
+                    for position, error in enumerate(batch["errors"])
+                    for problem in _error_problems(error)
+                )
+        if invalid:
+            return (
+                jsonify(
+                    {"success": False, "message": "Invalid errors", "invalid": invalid}
+                ),
+                400,
+            )
+
+        errors_count = sum(len(batch["errors"]) for batch in batches)
+        if errors_count > MAX_ERROR_BATCH:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "message": f"At most {MAX_ERROR_BATCH} errors per request",
+                    }
+                ),
+                400,
+            )
+
         # Check if user exists
-        user = User.query.get(data["user_id"])
+        user_id = data["user_id"]
+        user = User.query.get(user_id)
         if not user:
             return jsonify({"success": False, "message": "User not found"}), 404
 
-        # Check if activity exists
-        activity = SpeechActivity.query.get(data["activity_id"])
-        if not activity:
-            return jsonify({"success": False, "message": "Activity not found"}), 404
-
-        # Store each error record
-        saved_errors = []
-        for error in data["errors"]:
-            if all(k in error for k in ["original_word", "spoken_word", "error_type"]):
-                error_record = SpeechErrorRecord(
-                    user_id=data["user_id"],
-                    activity_id=data["activity_id"],
-                    original_word=error["original_word"],
-                    spoken_word=error["spoken_word"],
-                    error_type=error["error_type"],
-                    error_category=error.get("error_category"),
-                )
-
-                # Auto-classify if category not provided
-                if not error_record.error_category:
-                    error_record.error_category = error_record.classify_error()
-
-                db.session.add(error_record)
-                saved_errors.append(error_record)
+        # Check that every activity exists and belongs to the user (one query)
+        activity_ids = {batch["activity_id"] for batch in batches}
+        found = {
+            activity_id
+            for (activity_id,) in db.session.query(SpeechActivity.id).filter(
+                SpeechActivity.id.in_(activity_ids),
+                SpeechActivity.user_id == user_id,
+            )
+        }
+        missing = sorted(activity_ids - found)
+        if missing:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "message": "Activity not found",
+                        "activity_ids": missing,
+                    }
+                ),
+                404,
+            )
 
+        errors = [
+            dict(error, activity_id=batch["activity_id"])
+            for batch in batches
+            for error in batch["errors"]
+        ]
+        include_errors = request.args.get("include") == "errors"
+        saved = insert_error_records(user_id, errors, return_records=include_errors)
         db.session.commit()
+        invalidate_target_words(user_id)
+
+        result = {"count": len(saved)}
+        if include_errors:
+            result["errors"] = [record.to_dict() for record in saved]
+        else:
+            result["ids"] = saved
 
         return jsonify(
             {
                 "success": True,
-                "message": f"Speech errors recorded successfully ({len(saved_errors)} errors)",
-                "data": {"errors": [error.to_dict() for error in saved_errors]},
+                "message": f"Speech errors recorded successfully ({len(saved)} errors)",
+                "data": result,
             }
         )
 
@@ -295,37 +502,17 @@ def get_user_errors(user_id):
         limit = request.args.get("limit", 10, type=int)
         error_type = request.args.get("error_type")
 
-        # Build query
-        query = db.session.query(
-            SpeechErrorRecord.original_word,
-            SpeechErrorRecord.spoken_word,
-            SpeechErrorRecord.error_type,
-            SpeechErrorRecord.error_category,
-            func.count().label("occurrence_count"),
-        ).filter(SpeechErrorRecord.user_id == user_id)
-
-        if error_type:
-            query = query.filter(SpeechErrorRecord.error_type == error_type)
-
-        result = (
-            query.group_by(
-                SpeechErrorRecord.original_word, SpeechErrorRecord.spoken_word
-            )
-            .order_by(func.count().desc())
-            .limit(limit)
-            .all()
-        )
-
-        # Format response
+        # Top-K from the incremental per-word counters (one indexed lookup)
         errors = [
             {
-                "original_word": r.original_word,
-                "spoken_word": r.spoken_word,
-                "error_type": r.error_type,
-                "error_category": r.error_category,
-                "count": r.occurrence_count,
+                "original_word": word["original_word"],
+                "spoken_word": word["spoken_word"],
+                "error_type": word["error_type"],
+                "error_category": word["error_category"],
+                "count": word["error_count"],
+                "similarity_score": word["similarity_score"],
             }
-            for r in result
+            for word in top_word_errors(user_id, limit=limit, error_type=error_type)
         ]
 
         return jsonify({"success": True, "errors": errors})
@@ -346,18 +533,7 @@ def generate_personalized_exercises(user_id):
             return jsonify({"success": False, "message": "User not found"}), 404
 
         # Get user's common errors
-        common_errors = (
-            db.session.query(
-                SpeechErrorRecord.original_word,
-                SpeechErrorRecord.error_category,
-                func.count().label("error_count"),
-            )
-            .filter(SpeechErrorRecord.user_id == user_id)
-            .group_by(SpeechErrorRecord.original_word)
-            .order_by(func.count().desc())
-            .limit(10)
-            .all()
-        )
+        common_errors = top_word_errors(user_id, limit=10)
 
         if not common_errors:
             return jsonify(
@@ -374,10 +550,10 @@ def generate_personalized_exercises(user_id):
             # Create practice sentences containing the error word
             exercises.append(
                 {
-                    "word": error.original_word,
-                    "category": error.error_category,
-                    "frequency": error.error_count,
-                    "practice_sentence": f"هذه جملة تدريبية تحتوي على كلمة {error.original_word} للتمرين عليها.",
+                    "word": error["original_word"],
+                    "category": error["error_category"],
+                    "frequency": error["error_count"],
+                    "practice_sentence": f"هذه جملة تدريبية تحتوي على كلمة {error['original_word']} للتمرين عليها.",
                     # In a more advanced implementation, you'd generate proper sentences
                 }
             )
@@ -402,20 +578,33 @@ def get_user_speech_analytics(user_id):
         # Get time range from query parameters
         from_date = request.args.get("from_date")
         to_date = request.args.get("to_date")
+        bucket = request.args.get("bucket", "day")
+        if bucket not in TREND_BUCKETS:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "message": f"bucket must be one of {', '.join(TREND_BUCKETS)}",
+                    }
+                ),
+                400,
+            )
 
-        # Base query for user's speech activities
-        query = SpeechActivity.query.filter_by(user_id=user_id)
-
-        # Apply date filters if provided
-        if from_date:
-            query = query.filter(SpeechActivity.created_at >= from_date)
-        if to_date:
-            query = query.filter(SpeechActivity.created_at <= to_date)
+        try:
+            from_day = date.fromisoformat(from_date[:10]) if from_date else None
+            to_day = date.fromisoformat(to_date[:10]) if to_date else None
+        except ValueError:
+            return (
+                jsonify({"success": False, "message": "Dates must be YYYY-MM-DD"}),
+                400,
+            )
 
-        # Get all activities ordered by date
-        activities = query.order_by(SpeechActivity.created_at).all()
+        # منحنى الدقة من المجاميع اليومية بدلاً من تحميل كل نشاط في الفترة
+        accuracy_trend, total_activities, accuracy_sum = load_accuracy_trend(
+            user_id, from_day, to_day, bucket
+        )
 
-        if not activities:
+        if not total_activities:
             return jsonify(
                 {
                     "success": True,
@@ -426,44 +615,46 @@ def get_user_speech_analytics(user_id):
                         "improvement": 0,
                         "total_activities": 0,
                         "average_accuracy": 0,
+                        "bucket": bucket,
                     },
                 }
             )
 
-        # Calculate accuracy trends
-        accuracy_trend = [
-            {
-                "date": activity.created_at.strftime("%Y-%m-%d"),
-                "accuracy": activity.accuracy,
-                "story_id": activity.story_id,
-            }
-            for activity in activities
-        ]
+        # Get most challenging words: all-time from the per-word counters,
+        # a date range still needs the raw records
+        if from_day or to_day:
+            error_query = db.session.query(
+                func.min(SpeechErrorRecord.original_word).label("original_word"),
+                func.count().label("error_count"),
+            ).filter_by(user_id=user_id)
 
-        # Get most challenging words
-        error_query = db.session.query(
-            SpeechErrorRecord.original_word, func.count().label("error_count")
-        ).filter_by(user_id=user_id)
-
-        if from_date:
-            error_query = error_query.filter(SpeechErrorRecord.created_at >= from_date)
-        if to_date:
-            error_query = error_query.filter(SpeechErrorRecord.created_at <= to_date)
-
-        challenging_words = (
-            error_query.group_by(SpeechErrorRecord.original_word)
-            .order_by(func.count().desc())
-            .limit(10)
-            .all()
-        )
+            if from_day:
+                error_query = error_query.filter(
+                    SpeechErrorRecord.created_at
+                    >= datetime.combine(from_day, datetime.min.time())
+                )
+            if to_day:
+                error_query = error_query.filter(
+                    SpeechErrorRecord.created_at
+                    < datetime.combine(to_day + timedelta(days=1), datetime.min.time())
+                )
+
+            challenging_words = [
+                {"word": w.original_word, "count": w.error_count}
+                for w in error_query.group_by(SpeechErrorRecord.normalized_word)
+                .order_by(func.count().desc())
+                .limit(10)
+            ]
+        else:
+            challenging_words = [
+                {"word": w["original_word"], "count": w["error_count"]}
+                for w in top_word_errors(user_id, limit=10)
+            ]
 
         # Calculate improvement metrics
         improvement = 0
-        if len(activities) >= 10:
-            first_five = activities[:5]
-            last_five = activities[-5:]
-            avg_first = sum(a.accuracy for a in first_five) / len(first_five)
-            avg_last = sum(a.accuracy for a in last_five) / len(last_five)
+        if total_activities >= 10:
+            avg_first, avg_last = edge_accuracies(user_id, from_day, to_day)
             improvement = avg_last - avg_first
 
         return jsonify(
@@ -471,15 +662,11 @@ def get_user_speech_analytics(user_id):
                 "success": True,
                 "analytics": {
                     "accuracy_trend": accuracy_trend,
-                    "challenging_words": [
-                        {"word": w.original_word, "count": w.error_count}
-                        for w in challenging_words
-                    ],
+                    "challenging_words": challenging_words,
                     "improvement": round(improvement, 2),
-                    "total_activities": len(activities),
-                    "average_accuracy": round(
-                        sum(a.accuracy for a in activities) / len(activities), 2
-                    ),
+                    "total_activities": total_activities,
+                    "average_accuracy": round(accuracy_sum / total_activities, 2),
+                    "bucket": bucket,
                 },
             }
         )
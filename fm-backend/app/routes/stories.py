@@ -1,228 +1,106 @@
-from flask import Blueprint, request, jsonify
-from app.models.user import User, SpeechErrorRecord, SpeechActivity, AIGeneratedStory
+from flask import (
+    Blueprint,
+    request,
+    jsonify,
+    current_app,
+    Response,
+    stream_with_context,
+)
+from app.models.user import (
+    User,
+    AIGeneratedStory,
+    StoryImage,
+)
 from app.db import db
 from app.services.ai_service import AIService
+from app.services.job_queue import job_queue, wants_async, enqueue_response
+from app.services.story_stream import format_sse
+from app.services.story_index import index_story
+from app.services.pagination import InvalidCursorError, keyset_page
+from app.services.target_words import (
+    default_candidates,
+    pick_weighted,
+    target_word_candidates,
+)
 from sqlalchemy import func
 import datetime
 import logging
 import traceback
 import json
-import re
-import random
 import threading
 
 logger = logging.getLogger(__name__)
 stories_bp = Blueprint("stories", __name__)
 
-# قائمة بحروف الجر والكلمات غير المهمة باللغة العربية
-ARABIC_STOPWORDS = [
-    "في",
-    "على",
-    "من",
-    "إلى",
-    "عن",
-    "بـ",
-    "لـ",
-    "كـ",
-    "ب",
-    "ل",
-    "و",
-    "ثم",
-    "أو",
-    "أم",
-    "إن",
-    "إذا",
-    "هو",
-    "هي",
-    "هم",
-    "هن",
-    "أنت",
-    "أنتم",
-    "أنتن",
-    "أنا",
-    "نحن",
-    "هذا",
-    "هذه",
-    "ذلك",
-    "تلك",
-    "هؤلاء",
-    "أولئك",
-    "التي",
-    "الذي",
-    "اللذان",
-    "اللتان",
-    "الذين",
-    "اللواتي",
-    "ما",
-    "ماذا",
-    "متى",
-    "أين",
-    "كيف",
-    "لماذا",
-    "لم",
-    "لن",
-    "لا",
-    "ليس",
-    "كان",
-    "كانت",
-    "كانوا",
-    "يكون",
-    "تكون",
-    "بين",
-    "حول",
-    "عند",
-    "حتى",
-    "منذ",
-    "خلال",
-    "عبر",
-    "فوق",
-    "تحت",
-    "أمام",
-    "خلف",
-    "قبل",
-    "بعد",
-]
 
+def select_story_words(user_id, data, error_limit):
+    """اختيار الكلمات المستهدفة للقصة: كلمات مخصصة أو أخطاء النطق أو كلمات افتراضية"""
+    # التحقق من وجود كلمات مخصصة في الطلب
+    custom_words = data.get("custom_words")
 
-# دالة للتحقق من أن الكلمة ليست علامة ترقيم
-def is_valid_word(word):
-    # إزالة الفراغات
-    word = word.strip()
+    if custom_words and isinstance(custom_words, list) and len(custom_words) > 0:
+        # استخدام الكلمات المخصصة التي تم اختيارها من قبل المستخدم
+        error_words = custom_words
+        logger.info(f"Using {len(error_words)} custom words for story generation")
+    else:
+        # الكلمات المرشحة (أخطاء النطق ثم كلمات آخر الأنشطة) مرتبة حسب الوزن،
+        # واختيار error_limit منها عشوائيًا مع تفضيل الأكثر تكرارًا وحداثة
+        candidates = target_word_candidates(user_id)[: error_limit * 2]
+        selected = pick_weighted(candidates, error_limit)
 
-    # التحقق من أن الكلمة ليست فارغة
-    if not word:
-        return False
+        # إذا لم نجد أي كلمات صالحة، استخدم كلمات افتراضية للتدريب
+        if not selected:
+            selected = default_candidates(5)
 
-    # التحقق من أن الكلمة ليست علامة ترقيم
-    if re.match(r'^[،.؟!:؛"""\'()\[\]{}…—–-]+$', word):
-        return False
+        # تحضير بيانات الأخطاء للإرسال إلى خدمة الذكاء الاصطناعي
+        error_words = [
+            {
+                "word": candidate["word"],
+                "category": candidate["category"],
+                "count": candidate["count"],
+            }
+            for candidate in selected
+        ]
 
-    # التحقق من أن الكلمة ليست من حروف الجر أو الكلمات غير المهمة
-    if word in ARABIC_STOPWORDS:
-        return False
+    return error_words
 
-    # التحقق من أن طول الكلمة مناسب (أكثر من حرفين)
-    if len(word) <= 2:
-        return False
 
-    return True
+def request_flag(data, name, default=False):
+    """قراءة قيمة منطقية من جسم الطلب (true/false أو "true"/"false" أو 1/0)"""
+    value = data.get(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
 
 
-@stories_bp.route("/generate/<int:user_id>", methods=["POST"])
-def generate_story(user_id):
+def build_story(user_id, data):
     """
     إنشاء قصة مخصصة بناءً على أخطاء النطق السابقة للمستخدم
+    تعيد (البيانات، رمز الحالة) لاستخدامها من المسار أو من طابور المهام
     """
     try:
         # التحقق من وجود المستخدم
         user = User.query.get(user_id)
         if not user:
             return (
-                jsonify({"success": False, "message": "لم يتم العثور على المستخدم"}),
+                {"success": False, "message": "لم يتم العثور على المستخدم"},
                 404,
             )
 
         # استخراج معلمات الطلب
-        data = request.json or {}
         theme = data.get("theme")  # موضوع القصة (اختياري)
         age_group = data.get("age_group", "children")
         difficulty = data.get("difficulty", "intermediate")
         length = data.get("length", "short")
+        force_fresh = request_flag(data, "force_fresh")  # تجاوز القصص المخزنة
+        reuse_existing = request_flag(
+            data, "reuse_existing", True
+        )  # إعادة استخدام قصة محفوظة تغطي الكلمات (reuse_existing=false للتعطيل)
         error_limit = data.get(
             "error_limit", 15
         )  # زيادة الحد لضمان الحصول على كلمات كافية بعد التصفية
 
-        # التحقق من وجود كلمات مخصصة في الطلب
-        custom_words = data.get("custom_words")
-
-        if custom_words and isinstance(custom_words, list) and len(custom_words) > 0:
-            # استخدام الكلمات المخصصة التي تم اختيارها من قبل المستخدم
-            error_words = custom_words
-            logger.info(f"Using {len(error_words)} custom words for story generation")
-        else:
-            # الحصول على أخطاء النطق للمستخدم
-            speech_errors = (
-                db.session.query(
-                    SpeechErrorRecord.original_word,
-                    SpeechErrorRecord.error_category,
-                    func.count(SpeechErrorRecord.id).label("error_count"),
-                )
-                .filter_by(user_id=user_id)
-                .group_by(
-                    SpeechErrorRecord.original_word, SpeechErrorRecord.error_category
-                )
-                .order_by(func.count(SpeechErrorRecord.id).desc())
-                .limit(
-                    error_limit * 2
-                )  # ضاعف الحد لضمان وجود عدد كافٍ من الكلمات بعد الفلترة
-                .all()
-            )
-
-            # تصفية الكلمات الصالحة فقط
-            filtered_errors = []
-            for error in speech_errors:
-                if is_valid_word(error.original_word):
-                    filtered_errors.append(error)
-
-            # إذا كان لدينا أقل من 5 كلمات، استخدم بعض الكلمات من أنشطة النطق السابقة
-            if len(filtered_errors) < 5:
-                recent_activities = (
-                    SpeechActivity.query.filter_by(user_id=user_id)
-                    .order_by(SpeechActivity.created_at.desc())
-                    .limit(5)
-                    .all()
-                )
-
-                sample_words = set()  # استخدام مجموعة لتجنب التكرار
-                for activity in recent_activities:
-                    if activity.original_text:
-                        words = activity.original_text.split()
-                        for word in words:
-                            if is_valid_word(word) and word not in sample_words:
-                                sample_words.add(word)
-
-                # إنشاء كائنات شبيهة بأخطاء النطق من الكلمات العينة
-                for word in sample_words:
-                    sample_error = type(
-                        "obj",
-                        (object,),
-                        {
-                            "original_word": word,
-                            "error_category": "general",
-                            "error_count": 1,
-                        },
-                    )
-                    filtered_errors.append(sample_error)
-
-            # اختيار عشوائي للكلمات من القائمة المصفاة
-            # وضمان أننا لا نستخدم أكثر من error_limit
-            if len(filtered_errors) > error_limit:
-                selected_errors = random.sample(
-                    filtered_errors, min(error_limit, len(filtered_errors))
-                )
-            else:
-                selected_errors = filtered_errors
-
-            # مزج الترتيب للتأكد من أن الكلمات مختلفة في كل مرة
-            random.shuffle(selected_errors)
-
-            # تحضير بيانات الأخطاء للإرسال إلى خدمة الذكاء الاصطناعي
-            error_words = [
-                {
-                    "word": error.original_word,
-                    "category": error.error_category,
-                    "count": error.error_count,
-                }
-                for error in selected_errors
-            ]
-
-            # إذا لم نجد أي كلمات صالحة، استخدم كلمات افتراضية للتدريب
-            if not error_words:
-                default_words = ["مدرسة", "كتاب", "قلم", "طالب", "معلم"]
-                error_words = [
-                    {"word": word, "category": "default", "count": 1}
-                    for word in default_words
-                ]
+        error_words = select_story_words(user_id, data, error_limit)
 
         # إنشاء قصة باستخدام OpenAI
         ai_service = AIService()
@@ -232,17 +110,18 @@ def generate_story(user_id):
             age_group=age_group,
             difficulty=difficulty,
             length=length,
+            force_fresh=force_fresh,
+            reuse_existing=reuse_existing,
+            user_id=user_id,
         )
 
         if not result.get("success"):
             return (
-                jsonify(
-                    {
-                        "success": False,
-                        "message": "فشل في إنشاء القصة",
-                        "error": result.get("error"),
-                    }
-                ),
+                {
+                    "success": False,
+                    "message": "فشل في إنشاء القصة",
+                    "error": result.get("error"),
+                },
                 500,
             )
 
@@ -250,30 +129,29 @@ def generate_story(user_id):
         result["user_id"] = user_id
         result["target_errors"] = error_words
 
-        return jsonify(result)
+        return result, 200
 
     except Exception as e:
         logger.error(f"Error generating story: {str(e)}")
         traceback.print_exc()
-        return jsonify({"success": False, "message": str(e)}), 500
+        return {"success": False, "message": str(e)}, 500
 
 
-@stories_bp.route("/exercises/<int:user_id>", methods=["POST"])
-def generate_exercises(user_id):
+def build_exercises(user_id, data):
     """
     إنشاء تمارين مخصصة للتدريب على النطق بناءً على أخطاء المستخدم
+    تعيد (البيانات، رمز الحالة) لاستخدامها من المسار أو من طابور المهام
     """
     try:
         # التحقق من وجود المستخدم
         user = User.query.get(user_id)
         if not user:
             return (
-                jsonify({"success": False, "message": "لم يتم العثور على المستخدم"}),
+                {"success": False, "message": "لم يتم العثور على المستخدم"},
                 404,
             )
 
         # استخراج معلمات الطلب
-        data = request.json or {}
         count = data.get("count", 5)  # عدد التمارين
         error_limit = data.get(
             "error_limit", 15
@@ -284,72 +162,42 @@ def generate_exercises(user_id):
 
         if custom_words and isinstance(custom_words, list) and len(custom_words) > 0:
             # استخدام الكلمات المخصصة التي تم اختيارها من قبل المستخدم
-            # سننشئ filtered_errors في شكل كائنات متوافقة مع الواجهة التي نستخدمها
+            # سننشئ filtered_errors بنفس شكل الكلمات المرشحة
             filtered_errors = [
-                type(
-                    "obj",
-                    (object,),
-                    {
-                        "original_word": word["word"],
-                        "error_category": word["category"],
-                        "error_count": word["count"],
-                    },
-                )
+                {
+                    "word": word["word"],
+                    "category": word["category"],
+                    "count": word["count"],
+                    "weight": 1,
+                }
                 for word in custom_words
             ]
             logger.info(
                 f"Using {len(filtered_errors)} custom words for exercises generation"
             )
         else:
-            # الحصول على أخطاء النطق للمستخدم
-            speech_errors = (
-                db.session.query(
-                    SpeechErrorRecord.original_word,
-                    SpeechErrorRecord.error_category,
-                    func.count(SpeechErrorRecord.id).label("error_count"),
-                )
-                .filter_by(user_id=user_id)
-                .group_by(
-                    SpeechErrorRecord.original_word, SpeechErrorRecord.error_category
-                )
-                .order_by(func.count(SpeechErrorRecord.id).desc())
-                .limit(
-                    error_limit * 2
-                )  # ضاعف الحد لضمان وجود عدد كافٍ من الكلمات بعد الفلترة
-                .all()
-            )
-
-            # تصفية الكلمات الصالحة فقط
-            filtered_errors = []
-            for error in speech_errors:
-                if is_valid_word(error.original_word):
-                    filtered_errors.append(error)
+            # كلمات أخطاء النطق فقط من الكلمات المرشحة (بدون كلمات الأنشطة)
+            filtered_errors = [
+                candidate
+                for candidate in target_word_candidates(user_id)[: error_limit * 2]
+                if candidate["source"] == "errors"
+            ]
 
         if not filtered_errors:
             return (
-                jsonify(
-                    {
-                        "success": False,
-                        "message": "لم يتم العثور على أخطاء نطق مناسبة لهذا المستخدم",
-                    }
-                ),
+                {
+                    "success": False,
+                    "message": "لم يتم العثور على أخطاء نطق مناسبة لهذا المستخدم",
+                },
                 404,
             )
 
-        # اختيار عشوائي للكلمات من القائمة المصفاة
-        if len(filtered_errors) > count:
-            selected_errors = random.sample(
-                filtered_errors, min(count, len(filtered_errors))
-            )
-        else:
-            selected_errors = filtered_errors
-
-        # مزج الترتيب للتأكد من أن الكلمات مختلفة في كل مرة
-        random.shuffle(selected_errors)
+        # اختيار عشوائي مع تفضيل الكلمات الأكثر تكرارًا وحداثة
+        selected_errors = pick_weighted(filtered_errors, count)
 
         # تحضير بيانات الأخطاء للإرسال إلى خدمة الذكاء الاصطناعي
-        error_words = [error.original_word for error in selected_errors]
-        error_categories = [error.error_category for error in selected_errors]
+        error_words = [error["word"] for error in selected_errors]
+        error_categories = [error["category"] for error in selected_errors]
 
         # إنشاء تمارين باستخدام OpenAI
         ai_service = AIService()
@@ -359,13 +207,11 @@ def generate_exercises(user_id):
 
         if not result.get("success"):
             return (
-                jsonify(
-                    {
-                        "success": False,
-                        "message": "فشل في إنشاء التمارين",
-                        "error": result.get("error"),
-                    }
-                ),
+                {
+                    "success": False,
+                    "message": "فشل في إنشاء التمارين",
+                    "error": result.get("error"),
+                },
                 500,
             )
 
@@ -375,13 +221,103 @@ def generate_exercises(user_id):
         # parsed_exercises الآن يتم إرجاعها مباشرة من ai_service
         # فلا حاجة لإعادة تحليل exercises_text
 
-        return jsonify(result)
+        return result, 200
 
     except Exception as e:
         logger.error(f"Error generating exercises: {str(e)}")
         traceback.print_exc()
+        return {"success": False, "message": str(e)}, 500
+
+
+@stories_bp.route("/generate/<int:user_id>", methods=["POST"])
+def generate_story(user_id):
+    """
+    إنشاء قصة مخصصة بناءً على أخطاء النطق السابقة للمستخدم
+    مع async=true يتم إرجاع معرف مهمة فورًا ومتابعتها عبر /api/jobs/<id>
+    """
+    data = request.json or {}
+    if wants_async(data):
+        return enqueue_response("story", user_id, data)
+
+    result, status_code = build_story(user_id, data)
+    return jsonify(result), status_code
+
+
+@stories_bp.route("/generate/<int:user_id>/stream", methods=["POST"])
+def stream_story(user_id):
+    """
+    إنشاء قصة مخصصة مع بث النص أثناء كتابته عبر Server-Sent Events
+    الأحداث: story_delta ثم vocabulary و questions و moral وأخيرًا done (أو error)
+    """
+    try:
+        # التحقق من وجود المستخدم
+        user = User.query.get(user_id)
+        if not user:
+            return (
+                jsonify({"success": False, "message": "لم يتم العثور على المستخدم"}),
+                404,
+            )
+
+        data = request.json or {}
+        error_words = select_story_words(user_id, data, data.get("error_limit", 15))
+
+        ai_service = AIService()
+        events = ai_service.stream_story(
+            error_words=error_words,
+            theme=data.get("theme"),
+            age_group=data.get("age_group", "children"),
+            difficulty=data.get("difficulty", "intermediate"),
+            length=data.get("length", "short"),
+            force_fresh=request_flag(data, "force_fresh"),
+            reuse_existing=request_flag(data, "reuse_existing", True),
+            user_id=user_id,
+        )
+
+    except Exception as e:
+        logger.error(f"Error starting story stream: {str(e)}")
+        traceback.print_exc()
         return jsonify({"success": False, "message": str(e)}), 500
 
+    def generate():
+        for event, payload in events:
+            if event == "done":
+                # إضافة معلومات المستخدم والأخطاء إلى النتيجة
+                payload["user_id"] = user_id
+                payload["target_errors"] = error_words
+            elif event == "error":
+                logger.error(f"Error streaming story: {payload.get('error')}")
+                payload["message"] = "فشل في إنشاء القصة"
+            yield format_sse(event, payload)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@stories_bp.route("/exercises/<int:user_id>", methods=["POST"])
+def generate_exercises(user_id):
+    """
+    إنشاء تمارين مخصصة للتدريب على النطق بناءً على أخطاء المستخدم
+    مع async=true يتم إرجاع معرف مهمة فورًا ومتابعتها عبر /api/jobs/<id>
+    """
+    data = request.json or {}
+    if wants_async(data):
+        return enqueue_response("exercises", user_id, data)
+
+    result, status_code = build_exercises(user_id, data)
+    return jsonify(result), status_code
+
+
+job_queue.register("story", build_story)
+job_queue.register("exercises", build_exercises)
+
+
+def _generate_images_in_background(app, ai_service, story_id, image_style):
+    with app.app_context():
+        ai_service.generate_story_images(story_id, image_style)
+
 
 @stories_bp.route("/save/<int:user_id>", methods=["POST"])
 def save_story(user_id):
@@ -432,6 +368,13 @@ def save_story(user_id):
         db.session.add(story)
         db.session.commit()
 
+        # فهرسة كلمات القصة لإعادة استخدامها مع مستخدمين آخرين
+        try:
+            index_story(story)
+        except Exception as index_error:
+            db.session.rollback()
+            logger.error(f"تعذرت فهرسة القصة: {str(index_error)}")
+
         # بدء عملية إنشاء الصور في الخلفية (استدعاء غير متزامن)
         # يمكن استخدام Celery أو طرق أخرى للعمليات الخلفية، لكن هنا سنستخدم طريقة بسيطة
         try:
@@ -443,8 +386,11 @@ def save_story(user_id):
                 image_style = "realistic"
 
             # إنشاء الصور (هذا سيحدث بعد الاستجابة للطلب)
+            # الخيط يحتاج إلى سياق التطبيق لحفظ الصور في قاعدة البيانات
+            app = current_app._get_current_object()
             threading.Thread(
-                target=ai_service.generate_story_images, args=(story.id, image_style)
+                target=_generate_images_in_background,
+                args=(app, ai_service, story.id, image_style),
             ).start()
         except Exception as img_error:
             logger.error(f"تعذر بدء عملية إنشاء الصور: {str(img_error)}")
@@ -460,10 +406,36 @@ def save_story(user_id):
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+# الحقول المتاحة في قائمة القصص (fields=) والحقول الافتراضية الخفيفة
+# القائمة ملخصات فقط: نص القصة وكلماتها وأسئلتها وصورها تحمل من /ai-story/<id>
+STORY_LIST_FIELDS = {
+    "id": AIGeneratedStory.id,
+    "title": AIGeneratedStory.title,
+    "theme": AIGeneratedStory.theme,
+    "difficulty": AIGeneratedStory.difficulty,
+    "age_group": AIGeneratedStory.age_group,
+    "moral": AIGeneratedStory.moral,
+    "images_generated": AIGeneratedStory.images_generated,
+    "created_at": AIGeneratedStory.created_at,
+}
+STORY_LIST_DEFAULT_FIELDS = [
+    "id",
+    "title",
+    "theme",
+    "difficulty",
+    "image_count",
+    "created_at",
+]
+MAX_STORY_PAGE_SIZE = 100
+
+
 @stories_bp.route("/ai-stories/<int:user_id>", methods=["GET"])
 def get_ai_stories(user_id):
     """
-    الحصول على جميع القصص المولدة بواسطة الذكاء الاصطناعي للمستخدم
+    الحصول على القصص المولدة بواسطة الذكاء الاصطناعي للمستخدم على صفحات
+    - limit: عدد القصص في الصفحة (الافتراضي 20)
+    - cursor: مؤشر الصفحة التالية (next_cursor من الاستجابة السابقة)
+    - fields: الحقول المطلوبة مفصولة بفواصل (الافتراضي ملخص خفيف)
     """
     try:
         # التحقق من وجود المستخدم
@@ -474,17 +446,83 @@ def get_ai_stories(user_id):
                 404,
             )
 
-        # الحصول على القصص
-        stories = (
-            AIGeneratedStory.query.filter_by(user_id=user_id)
-            .order_by(AIGeneratedStory.created_at.desc())
-            .all()
+        limit = min(
+            max(request.args.get("limit", 20, type=int), 1), MAX_STORY_PAGE_SIZE
         )
 
-        # تحويل القصص إلى تنسيق متوافق مع الواجهة الأمامية
-        stories_data = [story.to_story_response() for story in stories]
+        fields_param = request.args.get("fields")
+        fields = (
+            [field.strip() for field in fields_param.split(",") if field.strip()]
+            if fields_param
+            else STORY_LIST_DEFAULT_FIELDS
+        )
+        unknown = [
+            field
+            for field in fields
+            if field not in STORY_LIST_FIELDS and field != "image_count"
+        ]
+        if unknown:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "message": f"حقول غير معروفة: {', '.join(unknown)}",
+                    }
+                ),
+                400,
+            )
 
-        return jsonify({"success": True, "stories": stories_data})
+        # قراءة الأعمدة المطلوبة فقط (مع id و created_at اللازمين للمؤشر)
+        columns = [
+            STORY_LIST_FIELDS[field].label(field)
+            for field in fields
+            if field in STORY_LIST_FIELDS and field not in ("id", "created_at")
+        ]
+        if "image_count" in fields:
+            image_count = (
+                db.session.query(func.count(StoryImage.id))
+                .filter(StoryImage.story_id == AIGeneratedStory.id)
+                .correlate(AIGeneratedStory)
+                .scalar_subquery()
+            )
+            columns.append(image_count.label("image_count"))
+
+        query = db.session.query(
+            AIGeneratedStory.id.label("id"),
+            AIGeneratedStory.created_at.label("created_at"),
+            *columns,
+        ).filter(AIGeneratedStory.user_id == user_id)
+
+        try:
+            rows, next_cursor = keyset_page(
+                query,
+                AIGeneratedStory.created_at,
+                AIGeneratedStory.id,
+                cursor=request.args.get("cursor"),
+                limit=limit,
+            )
+        except InvalidCursorError:
+            return jsonify({"success": False, "message": "مؤشر الصفحة غير صالح"}), 400
+
+        stories_data = []
+        for row in rows:
+            values = row._asdict()
+            item = {}
+            for field in fields:
+                value = values.get(field)
+                if field == "created_at":
+                    value = value.isoformat() if value else None
+                item[field] = value
+            stories_data.append(item)
+
+        return jsonify(
+            {
+                "success": True,
+                "stories": stories_data,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+            }
+        )
 
     except Exception as e:
         logger.error(f"Error retrieving AI stories: {str(e)}")
@@ -544,10 +582,35 @@ def delete_ai_story(story_id):
 @stories_bp.route("/history/<int:user_id>", methods=["GET"])
 def get_story_history(user_id):
     """
-    الحصول على تاريخ القصص المنشأة للمستخدم
+    الحصول على تاريخ القصص المنشأة للمستخدم (كل القصص كاملة بالشكل القديم)
+    مسار قديم للتوافق مع العملاء السابقين؛ القائمة الجديدة على صفحات هي
+    /ai-stories/<user_id> والقصة الكاملة من /ai-story/<id>
     """
-    # تحويل المسار للمسار الجديد
-    return get_ai_stories(user_id)
+    try:
+        # التحقق من وجود المستخدم
+        user = User.query.get(user_id)
+        if not user:
+            return (
+                jsonify({"success": False, "message": "لم يتم العثور على المستخدم"}),
+                404,
+            )
+
+        # الحصول على القصص
+        stories = (
+            AIGeneratedStory.query.filter_by(user_id=user_id)
+            .order_by(AIGeneratedStory.created_at.desc())
+            .all()
+        )
+
+        # تحويل القصص إلى تنسيق متوافق مع الواجهة الأمامية
+        stories_data = [story.to_story_response() for story in stories]
+
+        return jsonify({"success": True, "stories": stories_data})
+
+    except Exception as e:
+        logger.error(f"Error retrieving story history: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"success": False, "message": str(e)}), 500
 
 
 @stories_bp.route("/generate-images/<int:story_id>", methods=["POST"])
@@ -590,78 +653,9 @@ def get_target_words(user_id):
                 404,
             )
 
-        # الحصول على أخطاء النطق للمستخدم
-        speech_errors = (
-            db.session.query(
-                SpeechErrorRecord.original_word,
-                SpeechErrorRecord.error_category,
-                func.count(SpeechErrorRecord.id).label("error_count"),
-            )
-            .filter_by(user_id=user_id)
-            .group_by(SpeechErrorRecord.original_word, SpeechErrorRecord.error_category)
-            .order_by(func.count(SpeechErrorRecord.id).desc())
-            .limit(30)  # زيادة الحد لضمان وجود عدد كافٍ من الكلمات بعد الفلترة
-            .all()
-        )
-
-        # تصفية الكلمات الصالحة فقط
-        filtered_errors = []
-        for error in speech_errors:
-            if is_valid_word(error.original_word):
-                filtered_errors.append(
-                    {
-                        "word": error.original_word,
-                        "category": error.error_category,
-                        "count": error.error_count,
-                    }
-                )
-
-        # إذا كان لدينا أقل من 5 كلمات، استخدم بعض الكلمات من أنشطة النطق السابقة
-        if len(filtered_errors) < 5:
-            recent_activities = (
-                SpeechActivity.query.filter_by(user_id=user_id)
-                .order_by(SpeechActivity.created_at.desc())
-                .limit(5)
-                .all()
-            )
-
-            sample_words = set()  # استخدام مجموعة لتجنب التكرار
-            for activity in recent_activities:
-                if activity.original_text:
-                    words = activity.original_text.split()
-                    for word in words:
-                        if (
-                            is_valid_word(word)
-                            and word not in [e["word"] for e in filtered_errors]
-                            and word not in sample_words
-                        ):
-                            sample_words.add(word)
-                            filtered_errors.append(
-                                {
-                                    "word": word,
-                                    "category": "general",
-                                    "count": 1,
-                                }
-                            )
-
-        # إذا لم نجد أي كلمات صالحة، استخدم كلمات افتراضية للتدريب
-        if not filtered_errors:
-            default_words = [
-                "مدرسة",
-                "كتاب",
-                "قلم",
-                "طالب",
-                "معلم",
-                "حديقة",
-                "منزل",
-                "سيارة",
-                "طريق",
-                "صديق",
-            ]
-            filtered_errors = [
-                {"word": word, "category": "default", "count": 1}
-                for word in default_words
-            ]
+        # الكلمات المرشحة (أخطاء النطق ثم كلمات آخر الأنشطة) مرتبة حسب الوزن
+        # وإذا لم نجد أي كلمات صالحة، استخدم كلمات افتراضية للتدريب
+        filtered_errors = target_word_candidates(user_id) or default_candidates()
 
         return jsonify({"success": True, "words": filtered_errors})
 
@@ -1,29 +1,50 @@
-import openai
 import os
 import json
 import random
 from datetime import datetime
 import re
-import requests
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Import these at the top level to avoid circular imports
 from app.db import db
+from app.services.arabic_text import is_valid_word
+from app.services.blob_store import get_blob_store
+from app.services.env import env_int
+from app.services.highlighter import highlight_words
+from app.services.openai_client import get_pooled_client
+from app.services.response_cache import get_story_cache, make_story_cache_key
+from app.services.story_index import find_covering_story
+from app.services.story_stream import IncrementalHighlighter, StoryTextExtractor
 
 # Import the models class references but not the actual models
 import app.models.user as user_models
 
+# مواضيع القصص عند عدم تحديد موضوع
+STORY_THEMES = [
+    "الطبيعة",
+    "المغامرات",
+    "المدرسة",
+    "الحيوانات",
+    "العائلة",
+    "الصداقة",
+    "الرياضة",
+]
+
+# عدد المشاهد التي تُرسم بالتوازي للقصة الواحدة
+STORY_IMAGE_CONCURRENCY = env_int("STORY_IMAGE_CONCURRENCY", 4)
+# الحد الأقصى لطلبات الصور المتزامنة في العملية لكل القصص معًا
+_image_slots = threading.BoundedSemaphore(env_int("IMAGE_MAX_CONCURRENCY", 8))
+
 
 class AIService:
     """خدمة الذكاء الاصطناعي للتكامل مع OpenAI وإنشاء محتوى تعليمي"""
 
     def __init__(self):
-        self.api_key = os.environ.get("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("يجب تعيين OPENAI_API_KEY في متغيرات البيئة")
-
-        # Set API key for OpenAI client
-        self.client = openai.OpenAI(api_key=self.api_key)
+        # واجهة خفيفة فوق عميل OpenAI المشترك في العملية (لا اتصالات جديدة لكل طلب)
+        self.pool = get_pooled_client()
+        self.client = self.pool.client
 
     def generate_story(
         self,
@@ -32,6 +53,9 @@ class AIService:
         age_group="children",
         difficulty="intermediate",
         length="short",
+        force_fresh=False,
+        reuse_existing=True,
+        user_id=None,
     ):
         """
         إنشاء قصة تتضمن الكلمات التي يواجه الطالب صعوبة في نطقها
@@ -42,6 +66,9 @@ class AIService:
         - age_group: الفئة العمرية (children, youth)
         - difficulty: مستوى الصعوبة (beginner, intermediate, advanced)
         - length: طول القصة (short, medium)
+        - force_fresh: تجاهل الذاكرة المؤقتة وتوليد قصة جديدة
+        - reuse_existing: إعادة استخدام قصة محفوظة تغطي الكلمات إن وجدت
+        - user_id: المستخدم الطالب (تستبعد قصصه عند إعادة الاستخدام)
 
         Returns:
         - قصة مولدة تحتوي على الكلمات المستهدفة
@@ -49,18 +76,225 @@ class AIService:
         # تجهيز الكلمات للتضمين في القصة
         target_words = [item["word"] for item in error_words]
 
+        # إعادة قصة مخزنة لنفس المدخلات إن وجدت
+        cache = get_story_cache()
+        cache_key = make_story_cache_key(
+            target_words, theme, age_group, difficulty, length
+        )
+        if force_fresh:
+            cache.note_bypass()
+        else:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                cached["cached"] = True
+                return cached
+
+            # قصة محفوظة سابقًا تحتوي معظم الكلمات تغني عن طلب جديد
+            if reuse_existing:
+                reused = self._reused_story_result(
+                    target_words, theme, age_group, difficulty, length, user_id
+                )
+                if reused is not None:
+                    return reused
+
         # تحديد موضوع القصة إذا لم يتم تحديده
-        themes = [
-            "الطبيعة",
-            "المغامرات",
-            "المدرسة",
-            "الحيوانات",
-            "العائلة",
-            "الصداقة",
-            "الرياضة",
-        ]
-        story_theme = theme if theme else random.choice(themes)
+        story_theme = theme if theme else random.choice(STORY_THEMES)
+
+        messages = self._story_messages(
+            target_words, story_theme, age_group, difficulty, length
+        )
+
+        try:
+            # Use the updated OpenAI client
+            response = self.client.chat.completions.create(
+                model="gpt-4.1-nano-2025-04-14",
+                timeout=self.pool.timeout_for("chat"),
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1500,
+                response_format={"type": "json_object"},
+            )
+
+            # استخراج الاستجابة الكاملة
+            response_content = response.choices[0].message.content
+
+            result, cacheable = self._build_story_result(
+                response_content,
+                target_words,
+                story_theme,
+                age_group,
+                difficulty,
+                length,
+            )
+
+            if cacheable:
+                cache.set(cache_key, result)
+
+            result["cached"] = False
+            return result
 
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def stream_story(
+        self,
+        error_words,
+        theme=None,
+        age_group="children",
+        difficulty="intermediate",
+        length="short",
+        force_fresh=False,
+        reuse_existing=True,
+        user_id=None,
+    ):
+        """
+        نسخة متدفقة من generate_story تعيد أحداثًا (اسم الحدث، البيانات):
+        story_delta أثناء كتابة النص ثم vocabulary و questions و moral و done
+        أو error عند الفشل
+        """
+        target_words = [item["word"] for item in error_words]
+
+        cache = get_story_cache()
+        cache_key = make_story_cache_key(
+            target_words, theme, age_group, difficulty, length
+        )
+        result = None
+        if force_fresh:
+            cache.note_bypass()
+        else:
+            result = cache.get(cache_key)
+            if result is not None:
+                result["cached"] = True
+            elif reuse_existing:
+                result = self._reused_story_result(
+                    target_words, theme, age_group, difficulty, length, user_id
+                )
+
+        if result is not None:
+            yield "story_delta", {
+                "text": result["story"]["text"],
+                "highlighted_text": result["story"]["highlighted_text"],
+            }
+        else:
+            story_theme = theme if theme else random.choice(STORY_THEMES)
+            messages = self._story_messages(
+                target_words, story_theme, age_group, difficulty, length
+            )
+
+            extractor = StoryTextExtractor()
+            highlighter = IncrementalHighlighter(
+                lambda text: self._highlight_target_words(text, target_words)
+            )
+            parts = []
+
+            try:
+                stream = self.client.chat.completions.create(
+                    model="gpt-4.1-nano-2025-04-14",
+                    timeout=self.pool.timeout_for("chat"),
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=1500,
+                    response_format={"type": "json_object"},
+                    stream=True,
+                )
+
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if not content:
+                        continue
+
+                    parts.append(content)
+                    text, highlighted = highlighter.feed(extractor.feed(content))
+                    if text:
+                        yield "story_delta", {
+                            "text": text,
+                            "highlighted_text": highlighted,
+                        }
+
+                text, highlighted = highlighter.flush()
+                if text:
+                    yield "story_delta", {"text": text, "highlighted_text": highlighted}
+
+                result, cacheable = self._build_story_result(
+                    "".join(parts),
+                    target_words,
+                    story_theme,
+                    age_group,
+                    difficulty,
+                    length,
+                )
+            except Exception as e:
+                yield "error", {"success": False, "error": str(e)}
+                return
+
+            if cacheable:
+                cache.set(cache_key, result)
+            result["cached"] = False
+
+        yield "vocabulary", {"vocabulary": result["vocabulary"]}
+        yield "questions", {"questions": result["questions"]}
+        yield "moral", {"moral": result["moral"]}
+        yield "done", result
+
+    def _reused_story_result(
+        self, target_words, theme, age_group, difficulty, length, exclude_user_id
+    ):
+        """
+        البحث في فهرس القصص المحفوظة عن قصة تغطي الكلمات المستهدفة بنفس
+        الصعوبة والفئة العمرية والطول المطلوب، وإرجاعها بنفس شكل نتيجة
+        generate_story، أو None للتوليد من جديد
+        """
+        try:
+            match = find_covering_story(
+                target_words,
+                theme=theme,
+                difficulty=difficulty,
+                age_group=age_group,
+                length=length,
+                exclude_user_id=exclude_user_id,
+            )
+        except Exception as e:
+            # الفهرس تحسين فقط: أي خطأ فيه لا يمنع توليد قصة جديدة
+            db.session.rollback()
+            print(f"Error searching story index: {str(e)}")
+            return None
+
+        if match is None:
+            return None
+
+        story, coverage, matched_words = match
+
+        return {
+            "success": True,
+            "story": {
+                "text": story.content,
+                "highlighted_text": self._highlight_target_words(
+                    story.content, target_words
+                ),
+                "target_words": target_words,
+                "theme": story.theme,
+                "generated_at": (
+                    story.created_at.isoformat() if story.created_at else None
+                ),
+                "metadata": {
+                    "age_group": story.age_group,
+                    "difficulty": story.difficulty,
+                    "length": story.length,
+                },
+            },
+            "vocabulary": json.loads(story.vocabulary),
+            "questions": json.loads(story.questions),
+            "moral": story.moral,
+            "cached": False,
+            "reused_story_id": story.id,
+            "coverage": round(coverage, 2),
+            "matched_words": matched_words,
+        }
+
+    def _story_messages(self, target_words, story_theme, age_group, difficulty, length):
+        """تعليمات النظام والمستخدم لتوليد القصة"""
         # تحديد طول القصة
         word_count = "150" if length == "short" else "300"
 
@@ -114,154 +348,115 @@ class AIService:
         يجب تضمين جميع المكونات المذكورة أعلاه في كائن JSON واحد حسب البنية المحددة في تعليمات النظام.
         """
 
-        try:
-            # Use the updated OpenAI client
-            response = self.client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.7,
-                max_tokens=1500,
-                response_format={"type": "json_object"},
-            )
-
-            # استخراج الاستجابة الكاملة
-            response_content = response.choices[0].message.content
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
 
-            try:
-                data = json.loads(response_content)
+    def _build_story_result(
+        self, response_content, target_words, story_theme, age_group, difficulty, length
+    ):
+        """
+        تحويل استجابة النموذج (JSON) إلى نتيجة القصة
+        تعيد (النتيجة، هل يمكن تخزينها مؤقتًا)
+        """
+        try:
+            data = json.loads(response_content)
 
-                # استخراج مكونات القصة من JSON
-                story_text = data.get("story_text", "")
-                vocabulary = data.get("vocabulary", [])
-                questions = data.get("questions", [])
-                moral = data.get("moral", "تحسين مهارات النطق والقراءة من خلال التمرين")
+            # استخراج مكونات القصة من JSON
+            story_text = data.get("story_text", "")
+            vocabulary = data.get("vocabulary", [])
+            questions = data.get("questions", [])
+            moral = data.get("moral", "تحسين مهارات النطق والقراءة من خلال التمرين")
+            cacheable = bool(story_text)
 
-            except Exception as e:
-                print(f"Error parsing AI response JSON: {str(e)}")
-                # في حالة فشل التحليل، استخدم قيمًا افتراضية
-                story_text = response_content
-
-                # تحليل النص لاستخراج كلمات مفيدة للمفردات
-                # في هذه الحالة نستخدم مزيج من الكلمات المستهدفة وبعض الكلمات الطويلة من النص
-                words = story_text.split()
-                long_words = [w for w in words if len(w) > 5 and is_valid_word(w)]
-                unique_words = list(set(long_words))
-                random.shuffle(unique_words)
-
-                # إنشاء قائمة مفردات بالجمع بين الكلمات المستهدفة وكلمات أخرى من القصة
-                vocabulary = []
-                for word in target_words[:3]:  # نأخذ بعض الكلمات المستهدفة
-                    if word not in [v["word"] for v in vocabulary]:
-                        vocabulary.append(
-                            {"word": word, "meaning": "كلمة مستهدفة للتمرين"}
-                        )
-
-                # إضافة بعض الكلمات الطويلة من القصة
-                for word in unique_words[:5]:
-                    if len(vocabulary) < 5 and word not in [
-                        v["word"] for v in vocabulary
-                    ]:
-                        vocabulary.append(
-                            {"word": word, "meaning": f"كلمة مهمة من القصة تعني..."}
-                        )
-
-                questions = [
-                    {
-                        "question": "ما هو موضوع القصة؟",
-                        "options": [story_theme, "الصداقة", "المغامرات", "الطبيعة"],
-                        "correctAnswer": 0,
-                    },
-                    {
-                        "question": "ما هي الكلمات المستهدفة في القصة؟",
-                        "options": [
-                            "كل الكلمات",
-                            "الكلمات الطويلة",
-                            target_words[0] if target_words else "كلمات محددة",
-                            "لا توجد كلمات مستهدفة",
-                        ],
-                        "correctAnswer": 2,
-                    },
-                    {
-                        "question": "ما الهدف من هذه القصة؟",
-                        "options": [
-                            "التسلية فقط",
-                            "تعلم النطق الصحيح",
-                            "القراءة السريعة",
-                            "الحفظ",
-                        ],
-                        "correctAnswer": 1,
-                    },
-                ]
-                moral = "تحسين مهارات النطق والقراءة من خلال التمرين"
-
-            # تحديد الكلمات المستهدفة في النص
-            highlighted_story = self._highlight_target_words(story_text, target_words)
+        except Exception as e:
+            print(f"Error parsing AI response JSON: {str(e)}")
+            # لا نخزن القيم الافتراضية الناتجة عن فشل التحليل
+            cacheable = False
+            # في حالة فشل التحليل، استخدم قيمًا افتراضية
+            story_text = response_content
+
+            # تحليل النص لاستخراج كلمات مفيدة للمفردات
+            # في هذه الحالة نستخدم مزيج من الكلمات المستهدفة وبعض الكلمات الطويلة من النص
+            words = story_text.split()
+            long_words = [w for w in words if len(w) > 5 and is_valid_word(w)]
+            unique_words = list(set(long_words))
+            random.shuffle(unique_words)
+
+            # إنشاء قائمة مفردات بالجمع بين الكلمات المستهدفة وكلمات أخرى من القصة
+            vocabulary = []
+            for word in target_words[:3]:  # نأخذ بعض الكلمات المستهدفة
+                if word not in [v["word"] for v in vocabulary]:
+                    vocabulary.append({"word": word, "meaning": "كلمة مستهدفة للتمرين"})
+
+            # إضافة بعض الكلمات الطويلة من القصة
+            for word in unique_words[:5]:
+                if len(vocabulary) < 5 and word not in [v["word"] for v in vocabulary]:
+                    vocabulary.append(
+                        {"word": word, "meaning": f"كلمة مهمة من القصة تعني..."}
+                    )
 
-            return {
-                "success": True,
-                "story": {
-                    "text": story_text,
-                    "highlighted_text": highlighted_story,
-                    "target_words": target_words,
-                    "theme": story_theme,
-                    "generated_at": datetime.utcnow().isoformat(),
-                    "metadata": {
-                        "age_group": age_group,
-                        "difficulty": difficulty,
-                        "length": length,
-                    },
+            questions = [
+                {
+                    "question": "ما هو موضوع القصة؟",
+                    "options": [story_theme, "الصداقة", "المغامرات", "الطبيعة"],
+                    "correctAnswer": 0,
                 },
-                "vocabulary": vocabulary,
-                "questions": questions,
-                "moral": moral,
-            }
+                {
+                    "question": "ما هي الكلمات المستهدفة في القصة؟",
+                    "options": [
+                        "كل الكلمات",
+                        "الكلمات الطويلة",
+                        target_words[0] if target_words else "كلمات محددة",
+                        "لا توجد كلمات مستهدفة",
+                    ],
+                    "correctAnswer": 2,
+                },
+                {
+                    "question": "ما الهدف من هذه القصة؟",
+                    "options": [
+                        "التسلية فقط",
+                        "تعلم النطق الصحيح",
+                        "القراءة السريعة",
+                        "الحفظ",
+                    ],
+                    "correctAnswer": 1,
+                },
+            ]
+            moral = "تحسين مهارات النطق والقراءة من خلال التمرين"
+
+        # تحديد الكلمات المستهدفة في النص
+        highlighted_story = self._highlight_target_words(story_text, target_words)
+
+        result = {
+            "success": True,
+            "story": {
+                "text": story_text,
+                "highlighted_text": highlighted_story,
+                "target_words": target_words,
+                "theme": story_theme,
+                "generated_at": datetime.utcnow().isoformat(),
+                "metadata": {
+                    "age_group": age_group,
+                    "difficulty": difficulty,
+                    "length": length,
+                },
+            },
+            "vocabulary": vocabulary,
+            "questions": questions,
+            "moral": moral,
+        }
 
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        return result, cacheable
 
     def _highlight_target_words(self, text, target_words):
         """
         تمييز الكلمات المستهدفة في النص
         إضافة علامات HTML لتمييز الكلمات (<mark>الكلمة</mark>)
-        استخدام التعبيرات النمطية لضمان تحديد جميع الحالات
+        يستخدم تعبيرًا واحدًا مخزنًا لمجموعة الكلمات ويمر على النص مرة واحدة
         """
-        highlighted_text = text
-
-        # Sort target words by length (descending) to handle longer phrases first
-        sorted_target_words = sorted(target_words, key=len, reverse=True)
-
-        for word in sorted_target_words:
-            if not word or len(word.strip()) < 2:
-                continue  # Skip empty or very short words
-
-            # تطهير الكلمة من أي أحرف خاصة قد تؤثر على التعبير النمطي
-            escaped_word = re.escape(word.strip())
-
-            # استخدام تعبير نمطي محسن لمطابقة الكلمة في جميع السياقات المحتملة
-            # 1. يراعي الحروف المتصلة واللواحق والسوابق
-            # 2. يطابق الكلمات بداية ووسط ونهاية النص
-            # 3. يتعامل مع علامات الترقيم المختلفة
-
-            # Arabic word boundaries - these are characters that can surround an Arabic word
-            arabic_boundaries = r'[،.؟!:؛""\'()[\]{}\s\n…—–\-]'
-
-            # Pattern: word at beginning, middle, or end of text with proper boundaries
-            pattern = rf"(^|{arabic_boundaries})({escaped_word})($|{arabic_boundaries})"
-
-            # Replace while preserving surrounding context
-            highlighted_text = re.sub(pattern, r"\1<mark>\2</mark>\3", highlighted_text)
-
-            # Also try to match word forms that might have prefixes or suffixes
-            # This is particularly important for Arabic where words can have affixes
-            word_form_pattern = rf"(\b)({escaped_word}[ً-ْ]*)(\b)"
-            highlighted_text = re.sub(
-                word_form_pattern, r"\1<mark>\2</mark>\3", highlighted_text
-            )
-
-        return highlighted_text
+        return highlight_words(text, target_words)
 
     def generate_practice_exercises(self, error_words, error_categories, count=5):
         """
@@ -318,6 +513,7 @@ class AIService:
             # Use the updated OpenAI client
             response = self.client.chat.completions.create(
                 model="gpt-4.1-nano-2025-04-14",
+                timeout=self.pool.timeout_for("chat"),
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt},
@@ -438,6 +634,7 @@ class AIService:
             # الحصول على وصف الصورة باللغة الإنجليزية
             description_response = self.client.chat.completions.create(
                 model="gpt-4.1-nano-2025-04-14",
+                timeout=self.pool.timeout_for("chat"),
                 messages=[
                     {
                         "role": "system",
@@ -477,13 +674,14 @@ class AIService:
                 size=size,
                 n=1,
                 quality="standard",
+                timeout=self.pool.timeout_for("image"),
             )
 
             # استخراج URL الصورة والتحويل إلى base64
             image_url = result.data[0].url
 
             # تنزيل الصورة من URL
-            response = requests.get(image_url)
+            response = self.pool.download(image_url)
             if response.status_code == 200:
                 # تحويل الصورة إلى base64
                 image_b64 = base64.b64encode(response.content).decode("utf-8")
@@ -530,9 +728,6 @@ class AIService:
             # استخراج مشاهد رئيسية من القصة
             key_scenes = self._extract_key_scenes(story.content)
 
-            # إنشاء الصور بشكل متتابع
-            images = []
-
             # أولاً، قم بإنشاء سياق للقصة لضمان تناسق الصور
             story_context = f"""
                 القصة تتحدث عن: {story.content[:150]}...
@@ -542,7 +737,9 @@ class AIService:
             """
 
             # إنشاء الصور (بحد أقصى 4 صور)
-            for i, scene in enumerate(key_scenes[:4]):
+            scenes = key_scenes[:4]
+            scene_contexts = []
+            for i, scene in enumerate(scenes):
                 # تحديد موقع المشهد في القصة
                 scene_position = (
                     "بداية"
@@ -559,35 +756,57 @@ class AIService:
                     
                     الصورة رقم {i + 1} من {min(len(key_scenes), 4)} في القصة.
                 """
+                scene_contexts.append(scene_context)
+
+            # المشاهد التي حفظت صورها في محاولة سابقة لا ترسم مرة أخرى
+            existing_positions = {img.position for img in story.images}
+            missing = [i for i in range(len(scenes)) if i not in existing_positions]
 
-                result = self.generate_image_for_sentence(
-                    sentence=scene_context,
-                    image_style=image_style,
-                    size="1024x1024",
-                    consistent_with_previous=i > 0,
-                    consistency_factor=0.8,
+            # رسم المشاهد الناقصة بالتوازي ثم حفظها بترتيب موقعها في القصة
+            results = self._render_scenes(
+                [scene_contexts[i] for i in missing], image_style
+            )
+            blob_store = get_blob_store()
+
+            images = []
+            failed_positions = []
+            for i, result in zip(missing, results):
+                if not result.get("success"):
+                    failed_positions.append(i)
+                    continue
+
+                # حفظ ملف الصورة في مخزن الملفات وربطه بالقصة عبر بصمته
+                blob_hash = blob_store.put(base64.b64decode(result["image_data"]))
+                story_image = StoryImage(
+                    story_id=story.id,
+                    blob_hash=blob_hash,
+                    scene_text=scenes[i],
+                    position=i,
+                    style=image_style,
                 )
+                db.session.add(story_image)
+                images.append(story_image)
 
-                if result["success"]:
-                    # إنشاء وحفظ صورة جديدة
-                    story_image = StoryImage(
-                        story_id=story.id,
-                        image_data=result["image_data"],
-                        scene_text=scene,
-                        position=i,
-                        style=image_style,
-                    )
-                    db.session.add(story_image)
-                    images.append(story_image)
+            if missing and not images:
+                return {
+                    "success": False,
+                    "message": "فشل إنشاء جميع صور القصة",
+                    "failed_positions": failed_positions,
+                }
 
-            # تحديث حالة إنشاء الصور في القصة
-            story.images_generated = True
+            # نحفظ الصور الناجحة حتى لو فشل بعضها، لكن القصة لا تعتبر مكتملة
+            # الصور إلا إذا نجحت كل المشاهد، فيعيد الطلب التالي رسم الناقص فقط
+            story.images_generated = not failed_positions
             db.session.commit()
 
             return {
                 "success": True,
                 "message": f"تم إنشاء {len(images)} صور للقصة",
-                "images": [img.to_dict() for img in images],
+                "images": [
+                    img.to_dict()
+                    for img in sorted(story.images, key=lambda img: img.position)
+                ],
+                "failed_positions": failed_positions,
             }
 
         except Exception as e:
@@ -595,6 +814,44 @@ class AIService:
             print(f"Error generating story images: {str(e)}")
             return {"success": False, "message": f"حدث خطأ: {str(e)}"}
 
+    def _render_scenes(self, scene_contexts, image_style):
+        """
+        رسم مشاهد القصة بالتوازي مع حد لكل قصة وحد عام لكل العملية
+        تعيد النتائج بنفس ترتيب المشاهد
+        """
+        results = [None] * len(scene_contexts)
+        if not scene_contexts:
+            return results
+
+        workers = max(1, min(len(scene_contexts), STORY_IMAGE_CONCURRENCY))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="fm-scene"
+        ) as executor:
+            futures = {
+                executor.submit(self._render_scene, i, context, image_style): i
+                for i, context in enumerate(scene_contexts)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    print(f"Error rendering scene {i}: {str(e)}")
+                    results[i] = {"success": False, "error": str(e)}
+
+        return results
+
+    def _render_scene(self, index, scene_context, image_style):
+        """رسم مشهد واحد بعد حجز مكان من الحد العام للصور المتزامنة"""
+        with _image_slots:
+            return self.generate_image_for_sentence(
+                sentence=scene_context,
+                image_style=image_style,
+                size="1024x1024",
+                consistent_with_previous=index > 0,
+                consistency_factor=0.8,
+            )
+
     def _extract_key_scenes(self, text):
         """استخراج المشاهد الرئيسية من النص"""
         # تقسيم النص إلى جمل
@@ -725,6 +982,7 @@ class AIService:
             # استدعاء نموذج OpenAI
             response = self.client.chat.completions.create(
                 model="gpt-4.1-nano-2025-04-14",
+                timeout=self.pool.timeout_for("chat"),
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt},
@@ -832,6 +1090,7 @@ class AIService:
             # استدعاء نموذج OpenAI
             response = self.client.chat.completions.create(
                 model="gpt-4.1-nano-2025-04-14",
+                timeout=self.pool.timeout_for("chat"),
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt},
@@ -889,95 +1148,3 @@ class AIService:
                 "error": str(e),
                 "generated_at": datetime.utcnow().isoformat(),
             }
-
-
-def is_valid_word(word):
-    # إزالة الفراغات
-    word = word.strip()
-
-    # التحقق من أن الكلمة ليست فارغة
-    if not word:
-        return False
-
-    # التحقق من أن الكلمة ليست علامة ترقيم
-    if re.match(r'^[،.؟!:؛""\'()[\]{}…—–-]+$', word):
-        return False
-
-    # قائمة بحروف الجر والكلمات غير المهمة باللغة العربية
-    stopwords = [
-        "في",
-        "على",
-        "من",
-        "إلى",
-        "عن",
-        "بـ",
-        "لـ",
-        "كـ",
-        "ب",
-        "ل",
-        "و",
-        "ثم",
-        "أو",
-        "أم",
-        "إن",
-        "إذا",
-        "هو",
-        "هي",
-        "هم",
-        "هن",
-        "أنت",
-        "أنتم",
-        "أنتن",
-        "أنا",
-        "نحن",
-        "هذا",
-        "هذه",
-        "ذلك",
-        "تلك",
-        "هؤلاء",
-        "أولئك",
-        "التي",
-        "الذي",
-        "اللذان",
-        "اللتان",
-        "الذين",
-        "اللواتي",
-        "ما",
-        "ماذا",
-        "متى",
-        "أين",
-        "كيف",
-        "لماذا",
-        "لم",
-        "لن",
-        "لا",
-        "ليس",
-        "كان",
-        "كانت",
-        "كانوا",
-        "يكون",
-        "تكون",
-        "بين",
-        "حول",
-        "عند",
-        "حتى",
-        "منذ",
-        "خلال",
-        "عبر",
-        "فوق",
-        "تحت",
-        "أمام",
-        "خلف",
-        "قبل",
-        "بعد",
-    ]
-
-    # التحقق من أن الكلمة ليست من حروف الجر أو الكلمات غير المهمة
-    if word in stopwords:
-        return False
-
-    # التحقق من أن طول الكلمة مناسب (أكثر من حرفين)
-    if len(word) <= 2:
-        return False
-
-    return True
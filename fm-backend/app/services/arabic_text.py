@@ -0,0 +1,114 @@
+import re
+
+# تطبيع النص العربي المشترك بين كل أجزاء المطابقة (تمييز الكلمات، فهرس القصص،
+# تقييم القراءة، تصنيف الأخطاء ومفاتيح تجميعها). الجداول تبنى مرة واحدة عند
+# الاستيراد وتطبق بـ str.translate بدلاً من سلسلة تعبيرات لكل كلمة
+
+# علامات التشكيل وعلامات المصحف والتطويل (نطاقات بصيغة regex)
+MARKS = "\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640"
+
+_MARK_CODEPOINTS = [
+    code for code in range(0x0600, 0x0700) if re.match(f"[{MARKS}]", chr(code))
+]
+
+# أشكال الحرف التي تعامل كحرف واحد عند المطابقة
+LETTER_VARIANTS = {
+    "ا": "أإآٱ",
+    "و": "ؤ",
+    "ي": "ئى",
+    "ه": "ة",
+}
+
+# حذف العلامات فقط (يحافظ على الحروف كما هي)
+STRIP_MARKS_TABLE = str.maketrans(dict.fromkeys(_MARK_CODEPOINTS))
+
+# حذف العلامات وتوحيد أشكال الحروف
+NORMALIZE_TABLE = str.maketrans(
+    {
+        **dict.fromkeys(_MARK_CODEPOINTS),
+        **{
+            variant: letter
+            for letter, variants in LETTER_VARIANTS.items()
+            for variant in variants
+        },
+    }
+)
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+_PUNCTUATION_RE = re.compile(r"""([.،؛؟!:"“”'‘’()\[\]{}…—–-])""")
+
+# حروف الجر والضمائر وأسماء الإشارة وغيرها من الكلمات غير المفيدة كأهداف للتمرين
+# (مخزنة بعد التطبيع حتى تطابق "إلى" و"الى")
+_STOPWORDS = (
+    "في على من إلى عن بـ لـ كـ ب ل و ثم أو أم إن إذا هو هي هم هن أنت أنتم أنتن أنا"
+    " نحن هذا هذه ذلك تلك هؤلاء أولئك التي الذي اللذان اللتان الذين اللواتي ما ماذا"
+    " متى أين كيف لماذا لم لن لا ليس كان كانت كانوا يكون تكون بين حول عند حتى منذ"
+    " خلال عبر فوق تحت أمام خلف قبل بعد"
+)
+
+# أقصر طول لكلمة تصلح هدفًا للتمرين
+MIN_WORD_LENGTH = 3
+
+
+def strip_marks(text):
+    """إزالة التشكيل والتطويل فقط"""
+    return text.translate(STRIP_MARKS_TABLE) if text else ""
+
+
+def normalize_arabic(text):
+    """إزالة التشكيل والتطويل وتوحيد أشكال الألف والهمزات والتاء المربوطة والمسافات"""
+    if not text:
+        return ""
+    return " ".join(text.translate(NORMALIZE_TABLE).split())
+
+
+def normalize_word(word):
+    """مفتاح المطابقة للكلمة: النص المطبع بدون علامات الترقيم"""
+    if not word:
+        return ""
+    return _NON_WORD_RE.sub("", word.translate(NORMALIZE_TABLE))
+
+
+def normalize_words(words):
+    """تطبيع قائمة كلمات دفعة واحدة (نفس ترتيب المدخلات)"""
+    table, non_word = NORMALIZE_TABLE, _NON_WORD_RE.sub
+    return [non_word("", word.translate(table)) if word else "" for word in words]
+
+
+def tokenize(text):
+    """تقسيم النص بعد التطبيع إلى كلمات، مع فصل علامات الترقيم كرموز مستقلة"""
+    return _PUNCTUATION_RE.sub(r" \1 ", normalize_arabic(text)).split()
+
+
+STOPWORDS = frozenset(normalize_words(_STOPWORDS.split()))
+
+
+def is_stopword(word):
+    return normalize_word(word) in STOPWORDS
+
+
+def is_valid_word(word):
+    """الكلمة تصلح هدفًا للتمرين: ليست ترقيمًا ولا كلمة شائعة ولا قصيرة جدًا"""
+    key = normalize_word(word)
+    return len(key) >= MIN_WORD_LENGTH and key not in STOPWORDS
+
+
+def filter_valid_words(words):
+    """الكلمات الصالحة من قائمة، بدون تكرار بحسب الصيغة المطبعة وبنفس الترتيب"""
+    seen = set()
+    valid = []
+    for word, key in zip(words, normalize_words(words)):
+        if len(key) >= MIN_WORD_LENGTH and key not in STOPWORDS and key not in seen:
+            seen.add(key)
+            valid.append(word)
+    return valid
+
+
+def letter_class(char):
+    """
+    نمط regex يطابق الحرف وكل أشكاله (للبحث في النص الأصلي غير المطبع)
+    """
+    variants = LETTER_VARIANTS.get(char)
+    if not variants:
+        return re.escape(char)
+    return f"[{char}{variants}]"
@@ -0,0 +1,121 @@
+import base64
+import hashlib
+import io
+import os
+import tempfile
+from datetime import datetime
+
+from flask import current_app, has_app_context
+
+from app.services.env import env_int
+
+# حفظ تسجيلات القراءة على القرص على دفعات: كل دفعة تكتب في ملف مؤقت وتضاف
+# إلى بصمة SHA-256، فلا يحتفظ الخادم بالتسجيل كاملاً في الذاكرة، ويتوقف
+# الرفع فور تجاوز الحد الأقصى للحجم
+
+CHUNK_SIZE = 64 * 1024
+
+# امتداد الملف حسب نوع المحتوى (webm هو ما يرسله MediaRecorder في المتصفح)
+AUDIO_EXTENSIONS = {
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/webm": "webm",
+    "audio/ogg": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp4": "m4a",
+}
+DEFAULT_EXTENSION = "wav"
+
+
+class AudioTooLargeError(Exception):
+    """التسجيل أكبر من SPEECH_AUDIO_MAX_BYTES"""
+
+
+def max_audio_bytes():
+    return env_int("SPEECH_AUDIO_MAX_BYTES", 10 * 1024 * 1024)
+
+
+def audio_extension(mimetype):
+    return AUDIO_EXTENSIONS.get((mimetype or "").lower(), DEFAULT_EXTENSION)
+
+
+def _audio_dir():
+    upload_folder = (
+        current_app.config.get("UPLOAD_FOLDER", "uploads")
+        if has_app_context()
+        else "uploads"
+    )
+    return os.path.join(upload_folder, "speech")
+
+
+def save_audio_stream(stream, user_id, story_id, extension=DEFAULT_EXTENSION):
+    """
+    نسخ التسجيل من stream إلى مجلد uploads/speech على دفعات من CHUNK_SIZE
+    مع حساب البصمة أثناء النسخ، ثم إعادة تسمية الملف المؤقت (عملية ذرية)
+    Returns:
+    - {"path": المسار النسبي, "sha256", "size"} أو None إذا كان التسجيل فارغًا
+    Raises:
+    - AudioTooLargeError عند تجاوز الحد الأقصى (يحذف الملف المؤقت)
+    """
+    limit = max_audio_bytes()
+    audio_dir = _audio_dir()
+    os.makedirs(audio_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=audio_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as audio_file:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise AudioTooLargeError(
+                        f"Audio is larger than the {limit} bytes limit"
+                    )
+                digest.update(chunk)
+                audio_file.write(chunk)
+
+        if not size:
+            os.remove(tmp_path)
+            return None
+
+        content_hash = digest.hexdigest()
+        file_name = (
+            f"speech_{user_id}_{story_id}_"
+            f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{content_hash[:12]}"
+            f".{extension}"
+        )
+        os.replace(tmp_path, os.path.join(audio_dir, file_name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Make path relative to app root
+    return {
+        "path": os.path.join("uploads", "speech", file_name),
+        "sha256": content_hash,
+        "size": size,
+    }
+
+
+def save_audio_base64(audio_data, user_id, story_id):
+    """وضع التوافق: تسجيل base64 داخل JSON (مع بادئة data URL أو بدونها)"""
+    extension = DEFAULT_EXTENSION
+    if audio_data.startswith("data:"):
+        header, _, audio_data = audio_data.partition(",")
+        extension = audio_extension(header[5:].split(";")[0])
+
+    # حجم البيانات بعد فك الترميز معروف مسبقًا (3 بايت لكل 4 أحرف)
+    if len(audio_data) // 4 * 3 > max_audio_bytes():
+        raise AudioTooLargeError(
+            f"Audio is larger than the {max_audio_bytes()} bytes limit"
+        )
+
+    return save_audio_stream(
+        io.BytesIO(base64.b64decode(audio_data)), user_id, story_id, extension
+    )
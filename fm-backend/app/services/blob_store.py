@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import current_app, has_app_context
+
+# مخزن ملفات معنون بالمحتوى: كل ملف يحفظ باسم بصمة SHA-256 لمحتواه
+# داخل مجلدين فرعيين من أول أحرف البصمة (ab/cd/abcd...) لتوزيع الملفات
+
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+)
+
+
+def is_valid_hash(blob_hash):
+    return bool(blob_hash) and bool(HASH_PATTERN.match(blob_hash))
+
+
+def sniff_mimetype(header):
+    """تحديد نوع الملف من أول بايتات المحتوى"""
+    for signature, mimetype in _SIGNATURES:
+        if header.startswith(signature):
+            return mimetype
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    """تخزين المحتوى الثنائي على القرص مع كتابة ذرية وإزالة التكرار تلقائيًا"""
+
+    def __init__(self, root):
+        # مسار مطلق حتى يكتب الملف ويقرأ (send_file) من نفس المكان مهما كان مجلد التشغيل
+        self.root = os.path.abspath(root)
+
+    def path_for(self, blob_hash):
+        if not is_valid_hash(blob_hash):
+            raise ValueError(f"Invalid blob hash: {blob_hash}")
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def exists(self, blob_hash):
+        return os.path.isfile(self.path_for(blob_hash))
+
+    def put(self, data):
+        """حفظ المحتوى وإرجاع بصمته؛ المحتوى المكرر لا يكتب مرة أخرى"""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.path_for(blob_hash)
+        if os.path.isfile(path):
+            return blob_hash
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # الكتابة في ملف مؤقت بنفس المجلد ثم إعادة التسمية (عملية ذرية)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return blob_hash
+
+    def read(self, blob_hash):
+        with open(self.path_for(blob_hash), "rb") as blob:
+            return blob.read()
+
+    def mimetype(self, blob_hash):
+        with open(self.path_for(blob_hash), "rb") as blob:
+            return sniff_mimetype(blob.read(16))
+
+
+def get_blob_store():
+    """
+    مخزن الملفات المعرف في إعدادات التطبيق أو البيئة (BLOB_STORE_PATH)،
+    وإلا مجلد blobs داخل مجلد instance للتطبيق
+    """
+    if has_app_context():
+        root = current_app.config.get("BLOB_STORE_PATH") or os.environ.get(
+            "BLOB_STORE_PATH"
+        )
+        return BlobStore(root or os.path.join(current_app.instance_path, "blobs"))
+    return BlobStore(os.environ.get("BLOB_STORE_PATH", "blobs"))
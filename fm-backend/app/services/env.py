@@ -0,0 +1,25 @@
+import os
+
+# قراءة إعدادات رقمية من متغيرات البيئة مع قيمة افتراضية عند غيابها أو خطئها
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def worker_count():
+    """
+    عدد عمليات الخادم المعلن في WEB_CONCURRENCY (يقرأه gunicorn أيضًا)
+    الحالة المحفوظة في ذاكرة عملية واحدة لا تصلح عندما يكون أكبر من 1
+    """
+    return max(1, env_int("WEB_CONCURRENCY", 1))
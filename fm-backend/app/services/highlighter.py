@@ -0,0 +1,86 @@
+import re
+from functools import lru_cache
+
+from app.services.arabic_text import MARKS, letter_class, normalize_arabic
+from app.services.env import env_int
+
+# تمييز الكلمات المستهدفة في نص القصة بتمريرة واحدة:
+# تبنى شجرة حروف (trie) لكل مجموعة كلمات وتحول إلى تعبير نمطي واحد يُخزن
+# حسب مجموعة الكلمات، بدلاً من تعبيرين وتمريرتين كاملتين لكل كلمة
+
+# علامات التشكيل والتطويل التي قد تظهر بين حروف الكلمة في النص
+_OPTIONAL_MARKS = f"[{MARKS}]*"
+# الكلمة لا تبدأ بعد حرف أو علامة تشكيل ولا تنتهي قبل حرف (حدود الكلمة العربية)
+_START = rf"(?<![\w{MARKS}])"
+# التنوين مع ألف النصب (كتابًا) جزء من الكلمة
+_SUFFIX = "(?:\u064b\u0627|\u0627\u064b)?"
+_END = rf"(?![\w{MARKS}])"
+
+_END_OF_WORD = ""  # مفتاح نهاية الكلمة داخل الشجرة
+
+
+def _char_pattern(char):
+    if char == " ":
+        return r"\s+"
+    # الكلمات مطبعة، فالحرف يطابق كل أشكاله في النص (ا: أ إ آ، ه: ة ...)
+    return letter_class(char) + _OPTIONAL_MARKS
+
+
+def _trie_pattern(node):
+    """تحويل عقدة من شجرة الحروف إلى تعبير نمطي يفضل أطول تطابق"""
+    branches = [
+        _char_pattern(char) + _trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char != _END_OF_WORD
+    ]
+    if not branches:
+        return ""
+
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if _END_OF_WORD in node:
+        body = f"(?:{body})?"
+    return body
+
+
+@lru_cache(maxsize=env_int("HIGHLIGHT_PATTERN_CACHE", 256))
+def _compile(words):
+    """بناء التعبير النمطي لمجموعة كلمات (مرتبة وفريدة) وتخزينه"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[_END_OF_WORD] = True
+
+    return re.compile(_START + _trie_pattern(trie) + _SUFFIX + _END)
+
+
+def word_set_key(target_words):
+    """مفتاح مجموعة الكلمات: الكلمات المطبعة الصالحة بدون تكرار وبترتيب ثابت"""
+    words = {normalize_arabic(word) for word in target_words}
+    return tuple(sorted(word for word in words if len(word) >= 2))
+
+
+def highlight_words(text, target_words):
+    """
+    تمييز جميع الكلمات المستهدفة في النص بعلامات <mark> في تمريرة واحدة
+    يطابق الكلمة مع أو بدون تشكيل، ويفضل العبارة الأطول عند التداخل
+    """
+    if not text:
+        return text
+
+    key = word_set_key(target_words)
+    if not key:
+        return text
+
+    return _compile(key).sub(r"<mark>\g<0></mark>", text)
+
+
+def cache_stats():
+    info = _compile.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import jsonify, request
+from sqlalchemy import and_, or_, update
+
+from app.db import db
+from app.models.jobs import GenerationJob
+from app.services.env import env_int
+
+logger = logging.getLogger(__name__)
+
+# طابور مهام محلي داخل العملية: المهام تحفظ في جدول generation_jobs
+# وتنفذ على مجموعة محدودة من الخيوط دون الحاجة إلى وسيط خارجي.
+# عدة عمليات (عمال gunicorn) تشترك في نفس الجدول: كل مهمة تحجز بتحديث ذري
+# (queued -> running) مع معرف العامل، والعامل يجدد heartbeat_at لمهامه الجارية
+# حتى لا تعتبر مهامه متوقفة عند إعادة تشغيل عامل آخر
+
+
+class QueueFullError(Exception):
+    """الطابور ممتلئ ولا يمكن قبول مهام جديدة حاليًا"""
+
+
+class LocalJobQueue:
+    """تنفيذ المهام في الخلفية على ThreadPoolExecutor بحجم محدود"""
+
+    def __init__(
+        self, max_workers=4, max_pending=100, heartbeat_seconds=15, stale_seconds=120
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._handlers = {}
+        self._executor = None
+        self._app = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._heartbeat_thread = None
+        self._heartbeat_pid = None
+
+    @property
+    def worker_id(self):
+        """معرف العملية الحالية (يتغير بعد fork)"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        self._app = app
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="fm-jobs"
+            )
+        app.extensions["job_queue"] = self
+
+    def register(self, job_type, handler):
+        """
+        تسجيل دالة تنفيذ لنوع مهمة
+        handler(user_id, payload) -> (result_dict, status_code)
+        """
+        self._handlers[job_type] = handler
+
+    def enqueue(self, job_type, user_id, payload):
+        """حفظ المهمة وإرسالها للتنفيذ، وإرجاع سجل المهمة فورًا"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError("Job queue is full")
+            self._pending += 1
+
+        try:
+            job = GenerationJob(
+                id=str(uuid.uuid4()),
+                job_type=job_type,
+                user_id=user_id,
+                status="queued",
+                payload=json.dumps(payload, ensure_ascii=False),
+            )
+            db.session.add(job)
+            db.session.commit()
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def recover(self):
+        """
+        بعد إعادة تشغيل العملية: إنهاء المهام الجارية التي توقف عاملها عن تجديد
+        heartbeat_at، وإعادة جدولة المهام المنتظرة (الحجز الذري يمنع تنفيذها مرتين
+        إذا كانت عملية أخرى تنفذها أيضًا)
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.stale_seconds)
+        interrupted = db.session.execute(
+            update(GenerationJob)
+            .where(
+                GenerationJob.status == "running",
+                or_(
+                    GenerationJob.heartbeat_at < cutoff,
+                    and_(
+                        GenerationJob.heartbeat_at.is_(None),
+                        GenerationJob.started_at < cutoff,
+                    ),
+                ),
+            )
+            .values(
+                status="failed",
+                error="Interrupted by server restart",
+                finished_at=now,
+            )
+        ).rowcount
+
+        queued = [
+            job_id
+            for (job_id,) in db.session.query(GenerationJob.id).filter_by(
+                status="queued"
+            )
+        ]
+        db.session.commit()
+
+        for job_id in queued:
+            with self._lock:
+                self._pending += 1
+            self._executor.submit(self._run, job_id)
+
+        if interrupted or queued:
+            logger.info(
+                f"Job queue recovery: {len(queued)} requeued, {interrupted} interrupted"
+            )
+
+    def _run(self, job_id):
+        try:
+            with self._app.app_context():
+                self._execute(job_id)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _claim(self, job_id):
+        """حجز المهمة لهذه العملية؛ False إذا حجزتها عملية أخرى أو انتهت"""
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id, GenerationJob.status == "queued")
+            .values(
+                status="running",
+                worker=self.worker_id,
+                started_at=now,
+                heartbeat_at=now,
+            )
+        ).rowcount
+        db.session.commit()
+        return claimed == 1
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat_pid == os.getpid():
+                return
+            self._heartbeat_pid = os.getpid()
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, name="fm-jobs-heartbeat", daemon=True
+            )
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        pid = os.getpid()
+        while self._heartbeat_pid == pid:
+            time.sleep(self.heartbeat_seconds)
+            try:
+                with self._app.app_context():
+                    db.session.execute(
+                        update(GenerationJob)
+                        .where(
+                            GenerationJob.worker == self.worker_id,
+                            GenerationJob.status == "running",
+                        )
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {str(e)}")
+
+    def _execute(self, job_id):
+        if not self._claim(job_id):
+            return
+        self._ensure_heartbeat()
+        job = GenerationJob.query.get(job_id)
+
+        try:
+            handler = self._handlers[job.job_type]
+            payload = json.loads(job.payload) if job.payload else {}
+            result, status_code = handler(job.user_id, payload)
+
+            job.result = json.dumps(result, ensure_ascii=False)
+            job.status_code = status_code
+            job.status = "succeeded" if status_code < 400 else "failed"
+            if status_code >= 400:
+                job.error = result.get("message") or result.get("error")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            traceback.print_exc()
+            job = GenerationJob.query.get(job_id)
+            job.status = "failed"
+            job.error = str(e)
+
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "worker": self.worker_id,
+            "handlers": sorted(self._handlers),
+        }
+
+
+job_queue = LocalJobQueue(
+    max_workers=env_int("JOB_WORKERS", 4),
+    max_pending=env_int("JOB_MAX_PENDING", 100),
+    heartbeat_seconds=env_int("JOB_HEARTBEAT_SECONDS", 15),
+    stale_seconds=env_int("JOB_STALE_SECONDS", 120),
+)
+
+
+def wants_async(data):
+    """هل طلب العميل التنفيذ غير المتزامن (async في جسم الطلب أو في الرابط)"""
+    flag = request.args.get("async")
+    if flag is None and isinstance(data, dict):
+        flag = data.get("async")
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+def enqueue_response(job_type, user_id, payload):
+    """إضافة مهمة للطابور وإرجاع استجابة 202 بمعرف المهمة"""
+    try:
+        job = job_queue.enqueue(job_type, user_id, payload)
+    except QueueFullError:
+        return (
+            jsonify({"success": False, "message": "الخادم مشغول، حاول لاحقًا"}),
+            503,
+        )
+
+    return (
+        jsonify(
+            {
+                "success": True,
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/api/jobs/{job.id}",
+            }
+        ),
+        202,
+    )
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+
+import httpx
+import openai
+
+from app.services.env import env_float, env_int
+
+# عميل OpenAI مشترك لكل العملية بدلاً من إنشاء عميل جديد (ومجمع اتصالات جديد) مع كل طلب
+
+
+def load_pool_config():
+    """قراءة إعدادات مجمع الاتصالات من متغيرات البيئة"""
+    return {
+        "max_connections": env_int("OPENAI_MAX_CONNECTIONS", 20),
+        "max_keepalive_connections": env_int("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 10),
+        "keepalive_expiry": env_float("OPENAI_KEEPALIVE_EXPIRY", 60.0),
+        "connect_timeout": env_float("OPENAI_CONNECT_TIMEOUT", 10.0),
+        "default_timeout": env_float("OPENAI_TIMEOUT", 60.0),
+        "max_retries": env_int("OPENAI_MAX_RETRIES", 2),
+        # مهلة كل نوع من الاستدعاءات
+        "timeouts": {
+            "chat": env_float("OPENAI_CHAT_TIMEOUT", 60.0),
+            "image": env_float("OPENAI_IMAGE_TIMEOUT", 120.0),
+            "download": env_float("OPENAI_DOWNLOAD_TIMEOUT", 30.0),
+        },
+    }
+
+
+class PooledOpenAIClient:
+    """عميل OpenAI واحد آمن للاستخدام من عدة خيوط مع مجمع اتصالات قابل للضبط"""
+
+    def __init__(self, api_key, config=None):
+        self.config = config or load_pool_config()
+        self.created_at = time.time()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests_total": 0,
+            "responses_total": 0,
+            "errors_total": 0,
+        }
+
+        limits = httpx.Limits(
+            max_connections=self.config["max_connections"],
+            max_keepalive_connections=self.config["max_keepalive_connections"],
+            keepalive_expiry=self.config["keepalive_expiry"],
+        )
+        timeout = httpx.Timeout(
+            self.config["default_timeout"], connect=self.config["connect_timeout"]
+        )
+
+        # نفس مجمع الاتصالات يُستخدم لطلبات OpenAI ولتنزيل الصور
+        self.http_client = openai.DefaultHttpxClient(
+            limits=limits,
+            timeout=timeout,
+            event_hooks={
+                "request": [self._on_request],
+                "response": [self._on_response],
+            },
+        )
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            http_client=self.http_client,
+            timeout=timeout,
+            max_retries=self.config["max_retries"],
+        )
+
+    def _on_request(self, request):
+        with self._stats_lock:
+            self._stats["requests_total"] += 1
+
+    def _on_response(self, response):
+        with self._stats_lock:
+            self._stats["responses_total"] += 1
+            if response.status_code >= 400:
+                self._stats["errors_total"] += 1
+
+    def timeout_for(self, kind):
+        """مهلة الاستدعاء حسب نوعه (chat, image, download)"""
+        return self.config["timeouts"].get(kind, self.config["default_timeout"])
+
+    def download(self, url):
+        """تنزيل ملف (مثل صور DALL·E) عبر نفس مجمع الاتصالات"""
+        return self.http_client.get(url, timeout=self.timeout_for("download"))
+
+    def _connection_stats(self):
+        """
+        حالة اتصالات المجمع من httpcore، أو None إذا تغيرت البنية الداخلية
+        httpx لا يوفر واجهة عامة لحالة المجمع؛ البنية المقروءة هنا مختبرة مع
+        httpx 0.27/0.28 (النسخة مثبتة في requirements.txt)
+        """
+        try:
+            connections = list(self.http_client._transport._pool.connections)
+            idle = sum(1 for conn in connections if conn.is_idle())
+        except Exception:
+            return None
+
+        return {
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+        }
+
+    def stats(self):
+        """إحصائيات مجمع الاتصالات"""
+        with self._stats_lock:
+            result = dict(self._stats)
+
+        connections = self._connection_stats()
+        if connections is not None:
+            result.update(connections)
+        result["uptime_seconds"] = round(time.time() - self.created_at, 1)
+        result["config"] = {
+            "max_connections": self.config["max_connections"],
+            "max_keepalive_connections": self.config["max_keepalive_connections"],
+            "keepalive_expiry": self.config["keepalive_expiry"],
+            "max_retries": self.config["max_retries"],
+            "timeouts": dict(self.config["timeouts"]),
+        }
+        return result
+
+    def close(self):
+        self.http_client.close()
+
+
+_shared_client = None
+_shared_pid = None
+_shared_lock = threading.Lock()
+
+
+def get_pooled_client():
+    """إرجاع العميل المشترك للعملية الحالية وإنشاؤه عند أول استخدام"""
+    global _shared_client, _shared_pid
+
+    pid = os.getpid()
+    client = _shared_client
+    # لا نشارك الاتصالات بين العمليات بعد fork (مثل عمال gunicorn)
+    if client is not None and _shared_pid == pid:
+        return client
+
+    with _shared_lock:
+        if _shared_client is None or _shared_pid != pid:
+            api_key = os.environ.get("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("يجب تعيين OPENAI_API_KEY في متغيرات البيئة")
+
+            _shared_client = PooledOpenAIClient(api_key)
+            _shared_pid = pid
+
+        return _shared_client
+
+
+def reset_pooled_client():
+    """إغلاق العميل المشترك (عند الإيقاف أو تغيير الإعدادات)"""
+    global _shared_client, _shared_pid
+
+    with _shared_lock:
+        if _shared_client is not None and _shared_pid == os.getpid():
+            _shared_client.close()
+        _shared_client = None
+        _shared_pid = None
+
+
+def get_pool_stats():
+    """إحصائيات المجمع دون إنشاء عميل جديد"""
+    client = _shared_client
+    if client is None or _shared_pid != os.getpid():
+        return {"initialized": False}
+
+    stats = client.stats()
+    stats["initialized"] = True
+    return stats
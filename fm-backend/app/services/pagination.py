@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+# ترقيم الصفحات بالمفتاح (keyset) على (created_at, id) بترتيب تنازلي:
+# الصفحة التالية تبدأ بعد آخر عنصر في الصفحة الحالية بدلاً من OFFSET
+
+
+class InvalidCursorError(ValueError):
+    """مؤشر الصفحة غير صالح"""
+
+
+def encode_cursor(created_at, item_id):
+    raw = json.dumps([created_at.isoformat() if created_at else None, item_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """تحويل المؤشر إلى (created_at, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (
+            datetime.fromisoformat(created_at) if created_at else None,
+            int(item_id),
+        )
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(query, created_at_column, id_column, cursor=None, limit=20):
+    """
+    تطبيق ترتيب (created_at, id) تنازليًا والبدء بعد المؤشر
+    يعيد (الصفوف، المؤشر التالي أو None)؛ الصفوف يجب أن تحتوي created_at و id
+    """
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                created_at_column < created_at,
+                and_(created_at_column == created_at, id_column < item_id),
+            )
+        )
+
+    rows = (
+        query.order_by(created_at_column.desc(), id_column.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, next_cursor
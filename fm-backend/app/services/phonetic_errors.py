@@ -0,0 +1,122 @@
+from functools import lru_cache
+
+from app.services.arabic_text import strip_marks
+
+# تصنيف أخطاء النطق: محاذاة الكلمة الأصلية مع المنطوقة حرفًا بحرف (مسافة تحرير)
+# ثم البحث عن كل استبدال في جدول الحروف التي يخلط بينها المتعلمون، مع موضع
+# الحرف في الكلمة (بداية/وسط/نهاية)
+
+# الحرف الصحيح -> الحروف التي ينطق بها بدلاً منه
+CONFUSIONS = {
+    "ث": "ست",
+    "ذ": "دز",
+    "ظ": "ضز",
+    "ط": "ت",
+    "ض": "د",
+    "ص": "س",
+    "ق": "كء",
+    "ح": "ه",
+    "ع": "ء",
+}
+
+CONFUSION_PAIRS = frozenset(
+    (correct, substitute)
+    for correct, substitutes in CONFUSIONS.items()
+    for substitute in substitutes
+)
+
+# الاستبدال المعروف أرخص في المحاذاة حتى تفضله على حذف + إدراج
+_COST = 2
+_CONFUSION_COST = 1
+
+GENERAL = "general_pronunciation"
+LENGTH_MISMATCH = "length_mismatch"
+
+
+def _position(index, length):
+    if index == 0:
+        return "initial"
+    if index == length - 1:
+        return "final"
+    return "medial"
+
+
+def align_characters(original, spoken):
+    """
+    محاذاة حروف كلمتين بمسافة تحرير
+    Returns:
+    - قائمة الاستبدالات [(موضع الحرف في الأصل, الحرف الأصلي, الحرف المنطوق)]
+      بترتيب الكلمة
+    """
+    m, n = len(original), len(spoken)
+    previous = list(range(0, (n + 1) * _COST, _COST))
+    rows = [previous]
+    for i in range(1, m + 1):
+        char = original[i - 1]
+        current = [i * _COST] + [0] * n
+        for j in range(1, n + 1):
+            other = spoken[j - 1]
+            if char == other:
+                substitution = previous[j - 1]
+            elif (char, other) in CONFUSION_PAIRS:
+                substitution = previous[j - 1] + _CONFUSION_COST
+            else:
+                substitution = previous[j - 1] + _COST
+            current[j] = min(substitution, previous[j] + _COST, current[j - 1] + _COST)
+        rows.append(current)
+        previous = current
+
+    substitutions = []
+    i, j = m, n
+    while i > 0 and j > 0:
+        char, other = original[i - 1], spoken[j - 1]
+        cost = (
+            0
+            if char == other
+            else _CONFUSION_COST if (char, other) in CONFUSION_PAIRS else _COST
+        )
+        if rows[i][j] == rows[i - 1][j - 1] + cost:
+            if cost:
+                substitutions.append((i - 1, char, other))
+            i -= 1
+            j -= 1
+        elif rows[i][j] == rows[i - 1][j] + _COST:
+            i -= 1
+        else:
+            j -= 1
+
+    substitutions.reverse()
+    return substitutions
+
+
+@lru_cache(maxsize=16384)
+def classify_pair(original_word, spoken_word):
+    """
+    تصنيف خطأ واحد:
+    - substitution_<الصحيح>_<المنطوق>_<initial|medial|final> لأول استبدال معروف
+    - length_mismatch إذا اختلف الطول دون استبدال معروف
+    - general_pronunciation غير ذلك
+    المقارنة بدون تشكيل حتى لا تعد الحركات فرقًا في الطول أو تخفي الحرف
+    """
+    original = strip_marks(original_word)
+    spoken = strip_marks(spoken_word)
+
+    for index, char, other in align_characters(original, spoken):
+        if (char, other) in CONFUSION_PAIRS:
+            return f"substitution_{char}_{other}_{_position(index, len(original))}"
+
+    if len(original) != len(spoken):
+        return LENGTH_MISMATCH
+
+    return GENERAL
+
+
+def classify_errors(pairs):
+    """
+    تصنيف دفعة من الأخطاء [(الكلمة الأصلية, المنطوقة)] بنفس الترتيب؛
+    الأزواج المتكررة تحسب مرة واحدة
+    """
+    return [
+        classify_pair(original_word or "", spoken_word or "")
+        for original_word, spoken_word in pairs
+    ]
@@ -0,0 +1,360 @@
+import atexit
+import json
+import logging
+import math
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from app.db import db
+from app.models.user import LearningProgress
+from app.services.env import env_float, env_int, worker_count
+from app.services.progress_cache import invalidate_progress_snapshot
+
+logger = logging.getLogger(__name__)
+
+# تخزين مؤجل (write-behind) لتحديثات الموضع المتكررة في الدروس:
+# تحديثات current_step و last_position لنفس (user_id, lesson_id) تدمج في الذاكرة
+# وتكتب دفعة واحدة كل فترة أو عند امتلاء المخزن، بدلاً من commit لكل خطوة
+
+# الحقول التي يمكن تأجيلها (الإكمال يكتب فورًا لأنه يغير تقدم المستوى)
+BUFFERED_FIELDS = ("progress", "current_step", "total_steps", "last_position")
+
+# المخزن في ذاكرة العملية: مع عدة عمليات (WEB_CONCURRENCY > 1) قد يقرأ عامل آخر
+# موضعًا قديمًا ويضيع المؤجل إذا توقف العامل، لذلك يعطل التأجيل تلقائيًا
+
+
+def buffered_fields(data):
+    """
+    قيم الحقول المؤجلة بعد التحقق منها وتحويلها إلى أنواع أعمدتها
+    ترفع ValueError برسالة واضحة عند قيمة غير صالحة
+    """
+    fields = {"progress": _number(data.get("progress", 0), "progress", float)}
+    for field in ("current_step", "total_steps"):
+        if data.get(field) is not None:
+            fields[field] = _number(data[field], field, int)
+
+    last_position = data.get("last_position")
+    if isinstance(last_position, dict):
+        fields["last_position"] = json.dumps(last_position)
+    elif isinstance(last_position, str):
+        try:
+            json.loads(last_position)
+        except ValueError:
+            raise ValueError("last_position must be an object or a JSON string")
+        fields["last_position"] = last_position
+    elif last_position is not None:
+        raise ValueError("last_position must be an object or a JSON string")
+    return fields
+
+
+def _number(value, field, kind):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"{field} must be a number")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a number")
+    if not math.isfinite(number) or (kind is int and not number.is_integer()):
+        raise ValueError(f"{field} must be a {'whole ' if kind is int else ''}number")
+    return kind(number)
+
+
+class ProgressWriteBuffer:
+    """دمج تحديثات الموضع لكل (user_id, lesson_id) وكتابتها على دفعات"""
+
+    def __init__(
+        self, flush_interval=2.0, max_pending=500, max_attempts=5, enabled=True
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # عدد مرات محاولة كتابة تحديث قبل إسقاطه وتسجيله في السجل
+        self.max_attempts = max_attempts
+        self.enabled = enabled
+        self._pending = {}
+        self._lock = threading.Lock()
+        # الكتابات متسلسلة حتى لا تسبق دفعة قديمة دفعة أحدث لنفس الدرس
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._app = None
+        self._counters = {
+            "received": 0,
+            "flushed_updates": 0,
+            "rows_written": 0,
+            "flushes": 0,
+            "errors": 0,
+            "failed_rows": 0,
+            "dropped": 0,
+        }
+        self._latency = {"last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0}
+
+    def init_app(self, app):
+        self._app = app
+        app.extensions["progress_buffer"] = self
+
+        if self.enabled and worker_count() > 1:
+            logger.warning(
+                "Progress write buffer disabled: it needs a single worker process "
+                f"(WEB_CONCURRENCY={worker_count()})"
+            )
+            self.enabled = False
+
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._flush_loop, name="fm-progress-buffer", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def record(self, user_id, level_id, lesson_id, data):
+        """
+        إضافة تحديث موضع إلى المخزن، ودمجه مع أي تحديث سابق لنفس الدرس
+        يعيد الحالة المدمجة الحالية للحقول المؤجلة، وترفع ValueError لقيمة
+        غير صالحة حتى لا تدخل المخزن قيمة تفشل كتابتها لاحقًا
+        """
+        fields = buffered_fields(data)
+
+        key = (_as_id(user_id), _as_id(lesson_id))
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {
+                    "level_id": level_id,
+                    "fields": {},
+                    "count": 0,
+                    "attempts": 0,
+                }
+            entry["fields"].update(fields)
+            entry["count"] += 1
+            entry["level_id"] = level_id
+            entry["updated_at"] = datetime.utcnow()
+            self._counters["received"] += 1
+            merged = dict(entry["fields"])
+            full = len(self._pending) >= self.max_pending
+
+        if full:
+            self._wake.set()
+        return merged
+
+    def has_pending(self, user_id):
+        user_id = _as_id(user_id)
+        with self._lock:
+            return any(key[0] == user_id for key in self._pending)
+
+    def flush(self):
+        """كتابة كل التحديثات المؤجلة"""
+        return self._flush(lambda key: True)
+
+    def flush_user(self, user_id):
+        """كتابة تحديثات مستخدم واحد قبل قراءة تقدمه أو تعديله بشكل متزامن"""
+        if not self.has_pending(user_id):
+            return 0
+        user_id = _as_id(user_id)
+        return self._flush(lambda key: key[0] == user_id)
+
+    def _flush(self, selector):
+        with self._flush_lock:
+            with self._lock:
+                entries = {
+                    key: entry for key, entry in self._pending.items() if selector(key)
+                }
+                for key in entries:
+                    del self._pending[key]
+
+            if not entries:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                if self._app is not None:
+                    with self._app.app_context():
+                        failed = self._write(entries)
+                else:
+                    failed = self._write(entries)
+            except Exception as e:
+                logger.error(f"Progress buffer flush failed: {str(e)}")
+                traceback.print_exc()
+                failed = entries
+
+            written = len(entries) - len(failed)
+            if failed:
+                self._requeue(failed)
+
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                if failed:
+                    self._counters["errors"] += 1
+                    self._counters["failed_rows"] += len(failed)
+                if written:
+                    self._counters["flushes"] += 1
+                    self._counters["rows_written"] += written
+                    self._counters["flushed_updates"] += sum(
+                        entry["count"]
+                        for key, entry in entries.items()
+                        if key not in failed
+                    )
+                    self._latency["last_ms"] = elapsed
+                    self._latency["max_ms"] = max(self._latency["max_ms"], elapsed)
+                    self._latency["total_ms"] += elapsed
+            return written
+
+    def _write(self, entries):
+        """
+        كتابة الدفعة في معاملة واحدة، وإذا فشلت تكتب دفعة كل مستخدم في
+        نقطة حفظ (savepoint) مستقلة حتى لا يمنع سجل فاسد كتابة الباقين
+        يعيد التحديثات التي لم تكتب
+        """
+        try:
+            self._write_rows(entries)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(
+                f"Progress buffer batch write failed, retrying per user: {str(e)}"
+            )
+            failed = {}
+            by_user = {}
+            for key, entry in entries.items():
+                by_user.setdefault(key[0], {})[key] = entry
+            for user_id, user_entries in by_user.items():
+                try:
+                    with db.session.begin_nested():
+                        self._write_rows(user_entries)
+                except Exception as e:
+                    logger.error(
+                        f"Progress buffer write failed for user {user_id}: {str(e)}"
+                    )
+                    failed.update(user_entries)
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        else:
+            failed = {}
+
+        for user_id in {key[0] for key in entries if key not in failed}:
+            invalidate_progress_snapshot(user_id)
+        return failed
+
+    def _write_rows(self, entries):
+        user_ids = {key[0] for key in entries}
+        lesson_ids = {key[1] for key in entries}
+
+        existing = {}
+        for record_id, user_id, lesson_id in (
+            db.session.query(
+                LearningProgress.id,
+                LearningProgress.user_id,
+                LearningProgress.lesson_id,
+            )
+            .filter(
+                LearningProgress.user_id.in_(user_ids),
+                LearningProgress.lesson_id.in_(lesson_ids),
+            )
+            .order_by(LearningProgress.id)
+        ):
+            existing.setdefault((user_id, lesson_id), record_id)
+
+        updates = []
+        inserts = []
+        for key, entry in entries.items():
+            values = dict(entry["fields"], last_activity=entry["updated_at"])
+            if key in existing:
+                updates.append(dict(values, id=existing[key]))
+            else:
+                inserts.append(
+                    dict(
+                        values,
+                        user_id=key[0],
+                        level_id=entry["level_id"],
+                        lesson_id=key[1],
+                        is_locked=False,
+                        is_completed=False,
+                    )
+                )
+
+        # تجميع الصفوف حسب الحقول لأن التحديث الجماعي يتطلب نفس المفاتيح
+        for group in _group_by_keys(updates):
+            db.session.execute(update(LearningProgress), group)
+        for group in _group_by_keys(inserts):
+            db.session.execute(insert(LearningProgress), group)
+
+    def _requeue(self, entries):
+        """
+        إعادة تحديثات فشلت كتابتها دون الكتابة فوق تحديثات أحدث منها
+        والتحديث الذي فشل max_attempts مرة يسقط ويسجل بدل إعادته للأبد
+        """
+        with self._lock:
+            for key, entry in entries.items():
+                entry["attempts"] += 1
+                if entry["attempts"] >= self.max_attempts:
+                    logger.error(
+                        f"Dropping progress update for user {key[0]} lesson {key[1]} "
+                        f"after {entry['attempts']} failed writes: {entry['fields']}"
+                    )
+                    self._counters["dropped"] += 1
+                    continue
+                newer = self._pending.get(key)
+                if newer is None:
+                    self._pending[key] = entry
+                else:
+                    newer["fields"] = dict(entry["fields"], **newer["fields"])
+                    newer["count"] += entry["count"]
+                    newer["attempts"] = max(newer["attempts"], entry["attempts"])
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._counters)
+            result.update(self._latency)
+            result["pending"] = len(self._pending)
+
+        total_ms = result.pop("total_ms")
+        flushes = result["flushes"]
+        result["avg_ms"] = round(total_ms / flushes, 3) if flushes else 0.0
+        result["last_ms"] = round(result["last_ms"], 3)
+        result["max_ms"] = round(result["max_ms"], 3)
+        # عدد التحديثات المستلمة لكل صف مكتوب فعليًا
+        result["coalescing_ratio"] = (
+            round(result["flushed_updates"] / result["rows_written"], 2)
+            if result["rows_written"]
+            else 0.0
+        )
+        result["enabled"] = self.enabled
+        result["flush_interval"] = self.flush_interval
+        result["max_pending"] = self.max_pending
+        result["max_attempts"] = self.max_attempts
+        return result
+
+
+def _as_id(value):
+    """توحيد المعرفات القادمة من JSON (1 و "1") لمفتاح واحد"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _group_by_keys(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return list(groups.values())
+
+
+progress_buffer = ProgressWriteBuffer(
+    flush_interval=env_float("PROGRESS_BUFFER_INTERVAL", 2.0),
+    max_pending=env_int("PROGRESS_BUFFER_MAX_PENDING", 500),
+    max_attempts=env_int("PROGRESS_BUFFER_MAX_ATTEMPTS", 5),
+    enabled=bool(env_int("PROGRESS_BUFFER_ENABLED", 1)),
+)
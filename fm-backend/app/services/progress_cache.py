@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+
+from app.services.env import env_int
+from app.services.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# لقطة جاهزة من شجرة تقدم المستخدم (المستويات والدروس) تُبنى مرة واحدة
+# وتحذف عند أي تحديث للتقدم، وتُرسل مع ETag حتى يحصل العميل على 304.
+# كل حذف يغير "جيل" المستخدم، واللقطة التي بدأ بناؤها قبل الحذف لا تخزن بعده.
+# الطبقة المشتركة (SQLite) هي الافتراضية؛ الذاكرة فقط (PROGRESS_CACHE_SHARED=0)
+# تصلح لعملية واحدة لأن حذف عامل آخر لا يصل إلى لقطات هذه العملية
+
+_progress_cache = None
+_generations = None
+_progress_cache_lock = threading.Lock()
+
+
+class GenerationStore:
+    """
+    جيل تقدم كل مستخدم، منفصل عن ذاكرة اللقطات: لا مدة صلاحية ولا إخلاء،
+    لأن نسيان جيل يعيده إلى قيمته الأولى فتبدو لقطة قديمة صالحة
+    في الذاكرة، أو في جدول SQLite مشترك بين العمليات عند تحديد path
+    """
+
+    def __init__(self, path=None, table="progress_generations"):
+        self.path = path
+        self.table = table
+        self._memory = {}
+        self._lock = threading.Lock()
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} "
+                    "(key TEXT PRIMARY KEY, token TEXT NOT NULL)"
+                )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """الجيل الحالي، أو None لمستخدم لم يتغير تقدمه بعد"""
+        if not self.path:
+            with self._lock:
+                return self._memory.get(key)
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT token FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            # جيل مجهول: قيمة لن تطابق أي قراءة لاحقة فلا تخزن اللقطة
+            logger.error(f"Progress generation read failed: {str(e)}")
+            return uuid.uuid4().hex
+        return row[0] if row else None
+
+    def bump(self, key):
+        """تغيير الجيل إلى قيمة عشوائية جديدة"""
+        token = uuid.uuid4().hex
+        if not self.path:
+            with self._lock:
+                self._memory[key] = token
+            return token
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, token) "
+                    "VALUES (?, ?)",
+                    (key, token),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Progress generation write failed: {str(e)}")
+        return token
+
+
+def _progress_cache_path():
+    """مسار الطبقة المشتركة بين العمليات، أو None للذاكرة فقط"""
+    if not env_int("PROGRESS_CACHE_SHARED", 1):
+        return None
+    if has_app_context() and current_app.config.get("PROGRESS_CACHE_PATH"):
+        return current_app.config["PROGRESS_CACHE_PATH"]
+    return os.environ.get("PROGRESS_CACHE_PATH", "progress_cache.sqlite")
+
+
+def get_progress_cache():
+    """ذاكرة لقطات التقدم المشتركة في العملية"""
+    global _progress_cache
+
+    if _progress_cache is not None:
+        return _progress_cache
+
+    with _progress_cache_lock:
+        if _progress_cache is None:
+            path = _progress_cache_path()
+            _progress_cache = ResponseCache(
+                path,
+                ttl_seconds=env_int("PROGRESS_CACHE_TTL", 3600),
+                # مع الطبقة المشتركة لا نحتفظ بنسخ في الذاكرة حتى يرى كل عامل
+                # الحذف الذي تقوم به العمليات الأخرى فورًا
+                memory_entries=(
+                    0 if path else env_int("PROGRESS_CACHE_MEMORY_ENTRIES", 1024)
+                ),
+                max_disk_entries=env_int("PROGRESS_CACHE_MAX_ENTRIES", 10000),
+                max_disk_bytes=env_int("PROGRESS_CACHE_MAX_BYTES", 100 * 1024 * 1024),
+                table="progress_snapshots",
+            )
+        return _progress_cache
+
+
+def get_progress_generations():
+    """أجيال تقدم المستخدمين في نفس طبقة ذاكرة اللقطات (مشتركة أو ذاكرة فقط)"""
+    global _generations
+
+    if _generations is not None:
+        return _generations
+
+    cache = get_progress_cache()
+    with _progress_cache_lock:
+        if _generations is None:
+            _generations = GenerationStore(cache.path)
+        return _generations
+
+
+def _snapshot_key(user_id):
+    return f"progress:{str(user_id).strip()}"
+
+
+def _generation_key(user_id):
+    return f"progress-generation:{str(user_id).strip()}"
+
+
+def get_progress_snapshot(user_id):
+    """اللقطة المخزنة {"etag": ..., "data": ...} أو None"""
+    return get_progress_cache().get(_snapshot_key(user_id))
+
+
+def progress_generation(user_id):
+    """
+    جيل تقدم المستخدم الحالي، يقرأ قبل بناء لقطة جديدة ويمرر إلى
+    store_progress_snapshot (قيمة عشوائية تتغير مع كل حذف، أو None)
+    """
+    return get_progress_generations().get(_generation_key(user_id))
+
+
+def store_progress_snapshot(user_id, data, generation):
+    """
+    إرجاع لقطة جديدة مع ETag مشتق من محتواها، وتخزينها فقط إذا لم يتغير
+    جيل المستخدم منذ generation (أي لم يحذف تحديث لاحق اللقطة أثناء بنائها)
+    """
+    serialized = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    snapshot = {
+        "etag": hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:32],
+        "data": data,
+    }
+
+    cache = get_progress_cache()
+    if progress_generation(user_id) != generation:
+        return snapshot
+    cache.set(_snapshot_key(user_id), snapshot)
+    # حذف تم بين الفحص والتخزين: اللقطة قد تكون قديمة فنحذفها
+    if progress_generation(user_id) != generation:
+        cache.delete(_snapshot_key(user_id))
+    return snapshot
+
+
+def invalidate_progress_snapshot(user_id):
+    """حذف لقطة المستخدم بعد تعديل تقدمه (مع تغيير جيله أولاً)"""
+    if user_id is None:
+        return
+    get_progress_generations().bump(_generation_key(user_id))
+    get_progress_cache().delete(_snapshot_key(user_id))
+
+
+def get_progress_cache_stats():
+    if _progress_cache is None:
+        return {"initialized": False}
+
+    stats = _progress_cache.stats()
+    stats["initialized"] = True
+    stats["shared"] = bool(_progress_cache.path)
+    return stats
@@ -0,0 +1,80 @@
+import logging
+
+from sqlalchemy import func
+
+from app.db import db
+from app.models.user import LearningLevel, LearningProgress, Lesson
+
+logger = logging.getLogger(__name__)
+
+# مطابقة العدادات المخزنة (lesson_count و completed_lessons) مع الجداول الأصلية
+# تحدث العدادات عبر أحداث النماذج، وهذه الأداة تكشف أي انحراف وتصلحه
+
+
+def reconcile_counters(apply=True):
+    """
+    إعادة حساب العدادات من lessons و learning_progress ومقارنتها بالمخزن
+    Returns:
+    - تقرير بالانحرافات (و تصحيحها إذا كان apply=True)
+    """
+    report = {"levels_checked": 0, "progress_checked": 0, "drift": []}
+
+    lesson_counts = dict(
+        db.session.query(Lesson.level_id, func.count(Lesson.id))
+        .group_by(Lesson.level_id)
+        .all()
+    )
+    for level in LearningLevel.query.all():
+        report["levels_checked"] += 1
+        expected = lesson_counts.get(level.id, 0)
+        if level.lesson_count != expected:
+            report["drift"].append(
+                {
+                    "counter": "lesson_count",
+                    "level_id": level.id,
+                    "stored": level.lesson_count,
+                    "expected": expected,
+                }
+            )
+            level.lesson_count = expected
+
+    completed_counts = {
+        (user_id, level_id): count
+        for user_id, level_id, count in db.session.query(
+            LearningProgress.user_id,
+            LearningProgress.level_id,
+            func.count(LearningProgress.id),
+        )
+        .filter(
+            LearningProgress.lesson_id.isnot(None),
+            LearningProgress.is_completed == True,
+        )
+        .group_by(LearningProgress.user_id, LearningProgress.level_id)
+    }
+    for level_progress in LearningProgress.query.filter(
+        LearningProgress.lesson_id.is_(None)
+    ):
+        report["progress_checked"] += 1
+        expected = completed_counts.get(
+            (level_progress.user_id, level_progress.level_id), 0
+        )
+        if level_progress.completed_lessons != expected:
+            report["drift"].append(
+                {
+                    "counter": "completed_lessons",
+                    "user_id": level_progress.user_id,
+                    "level_id": level_progress.level_id,
+                    "stored": level_progress.completed_lessons,
+                    "expected": expected,
+                }
+            )
+            level_progress.completed_lessons = expected
+
+    if apply:
+        db.session.commit()
+    else:
+        db.session.rollback()
+
+    if report["drift"]:
+        logger.warning(f"Progress counters drift: {len(report['drift'])} rows")
+    return report
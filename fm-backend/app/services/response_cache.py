@@ -0,0 +1,296 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+
+from app.services.env import env_int
+
+logger = logging.getLogger(__name__)
+
+# ذاكرة تخزين مؤقت للاستجابات: طبقة LRU في الذاكرة وطبقة دائمة اختيارية في SQLite
+
+
+def make_story_cache_key(target_words, theme, age_group, difficulty, length):
+    """مفتاح ثابت لمدخلات القصة بغض النظر عن ترتيب الكلمات أو تكرارها"""
+    words = sorted({word.strip() for word in target_words if word and word.strip()})
+    payload = {
+        "words": words,
+        "theme": theme.strip() if theme else None,
+        "age_group": (age_group or "").strip().lower(),
+        "difficulty": (difficulty or "").strip().lower(),
+        "length": (length or "").strip().lower(),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    ذاكرة تخزين مؤقت بطبقتين مع مدة صلاحية (TTL) وإخلاء حسب الحجم
+    عند path=None تعمل في الذاكرة فقط
+    """
+
+    def __init__(
+        self,
+        path,
+        ttl_seconds=7 * 24 * 3600,
+        memory_entries=256,
+        max_disk_entries=5000,
+        max_disk_bytes=50 * 1024 * 1024,
+        table="response_cache",
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.table = table
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "disk_errors": 0,
+        }
+
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """)
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{self.table}_last_access "
+                f"ON {self.table} (last_access)"
+            )
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _memory_get(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _memory_delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+
+    def get(self, key):
+        """إرجاع القيمة المخزنة أو None"""
+        now = time.time()
+
+        value = self._memory_get(key, now)
+        if value is not None:
+            self._count("memory_hits")
+            return json.loads(value)
+
+        if not self.path:
+            self._count("misses")
+            return None
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row and row[1] > now:
+                    conn.execute(
+                        f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                        (now, key),
+                    )
+                elif row:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    row = None
+        except sqlite3.Error as e:
+            logger.error(f"Response cache read failed: {str(e)}")
+            self._count("disk_errors")
+            row = None
+
+        if not row:
+            self._count("misses")
+            return None
+
+        self._count("disk_hits")
+        self._memory_set(key, row[0], row[1])
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """تخزين قيمة قابلة للتحويل إلى JSON في الطبقتين"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        serialized = json.dumps(value, ensure_ascii=False)
+
+        self._memory_set(key, serialized, expires_at)
+        self._count("stores")
+
+        if not self.path:
+            return
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"""
+                    INSERT OR REPLACE INTO {self.table}
+                        (key, value, size, created_at, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, serialized, len(serialized), now, expires_at, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache write failed: {str(e)}")
+            self._count("disk_errors")
+
+    def delete(self, key):
+        """حذف قيمة من الطبقتين (عند تغير البيانات الأصلية)"""
+        self._memory_delete(key)
+        self._count("invalidations")
+
+        if not self.path:
+            return
+
+        try:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error(f"Response cache delete failed: {str(e)}")
+            self._count("disk_errors")
+
+    def note_bypass(self):
+        """تسجيل طلب تجاوز الذاكرة المؤقتة (force_fresh)"""
+        self._count("bypassed")
+
+    def _evict(self, conn, now):
+        evicted = conn.execute(
+            f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,)
+        ).rowcount
+
+        count, total_size = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()
+
+        # حذف الأقدم استخدامًا حتى نعود ضمن حدود العدد والحجم
+        if count > self.max_disk_entries or total_size > self.max_disk_bytes:
+            rows = conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY last_access ASC"
+            ).fetchall()
+            stale = []
+            for key, size in rows:
+                if count <= self.max_disk_entries and total_size <= self.max_disk_bytes:
+                    break
+                stale.append((key,))
+                count -= 1
+                total_size -= size
+            conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
+            evicted += len(stale)
+
+        if evicted:
+            self._count("evictions", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if not self.path:
+            return
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._counters)
+            result["memory_entries"] = len(self._memory)
+
+        hits = result["memory_hits"] + result["disk_hits"]
+        lookups = hits + result["misses"]
+        result["hit_ratio"] = round(hits / lookups, 3) if lookups else 0.0
+        return result
+
+
+_story_cache = None
+_story_cache_lock = threading.Lock()
+
+
+def _story_cache_path():
+    if has_app_context() and current_app.config.get("STORY_CACHE_PATH"):
+        return current_app.config["STORY_CACHE_PATH"]
+    return os.environ.get("STORY_CACHE_PATH", "story_cache.sqlite")
+
+
+def get_story_cache():
+    """ذاكرة القصص المؤقتة المشتركة في العملية"""
+    global _story_cache
+
+    if _story_cache is not None:
+        return _story_cache
+
+    with _story_cache_lock:
+        if _story_cache is None:
+            _story_cache = ResponseCache(
+                _story_cache_path(),
+                ttl_seconds=env_int("STORY_CACHE_TTL", 7 * 24 * 3600),
+                memory_entries=env_int("STORY_CACHE_MEMORY_ENTRIES", 256),
+                max_disk_entries=env_int("STORY_CACHE_MAX_ENTRIES", 5000),
+                max_disk_bytes=env_int("STORY_CACHE_MAX_BYTES", 50 * 1024 * 1024),
+                table="story_cache",
+            )
+        return _story_cache
+
+
+def get_story_cache_stats():
+    if _story_cache is None:
+        return {"initialized": False}
+
+    stats = _story_cache.stats()
+    stats["initialized"] = True
+    return stats
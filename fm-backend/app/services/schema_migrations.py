@@ -0,0 +1,474 @@
+import importlib
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.db import db
+
+logger = logging.getLogger(__name__)
+
+# ترحيلات المخطط المرقمة: كل ترحيل يطبق مرة واحدة ويسجل في جدول schema_migrations
+# وكل خطوة آمنة للتكرار (IF NOT EXISTS / فحص الأعمدة). الجداول الجديدة تحصل على
+# نفس الفهارس من النماذج، لذلك قاعدة البيانات التي ينشئها create_all تسجل كل
+# الترحيلات دون تشغيلها. بقية القواعد ترحل بـ migrations/schema_migrations.py
+# قبل النشر (أو عند البدء مع SCHEMA_UPGRADE_ON_START=1) لأن بعض الترحيلات تعيد
+# حساب بيانات كل المستخدمين. دوال الخطوات تستورد عند تطبيقها فقط
+
+
+def _columns(connection, table):
+    return {column["name"] for column in db.inspect(connection).get_columns(table)}
+
+
+def _step(module, name):
+    """خطوة ترحيل تستورد دالتها من module عند تطبيقها فقط"""
+
+    def migrate(connection):
+        return getattr(importlib.import_module(module), name)(connection)
+
+    migrate.__name__ = name
+    return migrate
+
+
+def _add_column(connection, table, column, ddl):
+    if column not in _columns(connection, table):
+        logger.info(f"Adding {table}.{column}")
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def add_story_image_blob_hash(connection):
+    _add_column(connection, "story_images", "blob_hash", "VARCHAR(64)")
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_story_images_blob_hash "
+            "ON story_images (blob_hash)"
+        )
+    )
+
+
+def add_progress_counters(connection):
+    _add_column(connection, "learning_levels", "lesson_count", "INTEGER DEFAULT 0")
+    _add_column(
+        connection, "learning_progress", "completed_lessons", "INTEGER DEFAULT 0"
+    )
+
+
+def add_hot_path_indexes(connection):
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_ai_generated_stories_user_created "
+        "ON ai_generated_stories (user_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_speech_activities_user_created "
+        "ON speech_activities (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_speech_error_records_user_word "
+        "ON speech_error_records (user_id, original_word)",
+    ):
+        connection.execute(text(statement))
+
+
+def _duplicate_progress_ids(connection):
+    """
+    معرفات سجلات التقدم المكررة لنفس المفتاح، مع الإبقاء على السجل الأكثر تقدمًا
+    (المكتمل أولاً، ثم الأعلى تقدمًا، ثم الأحدث نشاطًا)
+    """
+    groups = connection.execute(
+        text(
+            "SELECT user_id, level_id, lesson_id FROM learning_progress "
+            "GROUP BY user_id, level_id, lesson_id HAVING COUNT(*) > 1"
+        )
+    ).all()
+
+    duplicate_ids = []
+    for user_id, level_id, lesson_id in groups:
+        lesson_clause = (
+            "lesson_id IS NULL" if lesson_id is None else "lesson_id = :lesson_id"
+        )
+        rows = connection.execute(
+            text(
+                "SELECT id FROM learning_progress "
+                f"WHERE user_id = :user_id AND level_id = :level_id AND {lesson_clause} "
+                "ORDER BY is_completed DESC, progress DESC, "
+                "last_activity DESC, id ASC"
+            ),
+            {"user_id": user_id, "level_id": level_id, "lesson_id": lesson_id},
+        ).all()
+        duplicate_ids.extend(row.id for row in rows[1:])
+    return duplicate_ids
+
+
+def add_progress_unique_key(connection):
+    duplicate_ids = _duplicate_progress_ids(connection)
+    if duplicate_ids:
+        logger.warning(
+            f"Removing {len(duplicate_ids)} duplicate learning_progress rows"
+        )
+        connection.execute(
+            text("DELETE FROM learning_progress WHERE id = :id"),
+            [{"id": record_id} for record_id in duplicate_ids],
+        )
+
+    connection.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_learning_progress_key "
+            "ON learning_progress (user_id, level_id, lesson_id)"
+        )
+    )
+    # NULL لا يتكرر في UNIQUE، لذلك سجل المستوى يحتاج فهرسًا جزئيًا خاصًا
+    connection.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_learning_progress_level "
+            "ON learning_progress (user_id, level_id) WHERE lesson_id IS NULL"
+        )
+    )
+
+
+def add_error_normalized_word(connection, batch_size=1000):
+    from app.services.arabic_text import normalize_words
+
+    _add_column(connection, "speech_error_records", "normalized_word", "VARCHAR(100)")
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text(
+                "SELECT id, original_word FROM speech_error_records "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": batch_size},
+        ).all()
+        if not rows:
+            break
+        keys = normalize_words([row.original_word for row in rows])
+        connection.execute(
+            text(
+                "UPDATE speech_error_records SET normalized_word = :key WHERE id = :id"
+            ),
+            [{"id": row.id, "key": key[:100]} for row, key in zip(rows, keys)],
+        )
+        last_id = rows[-1].id
+
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_speech_error_records_user_normalized "
+            "ON speech_error_records (user_id, normalized_word)"
+        )
+    )
+
+
+def backfill_error_similarity(connection, batch_size=1000, recompute=False):
+    """
+    حساب similarity_score للسجلات القديمة على دفعات بترتيب id
+    recompute=True يعيد حساب كل السجلات (عند تغيير الخوارزمية)
+    Returns:
+    - عدد السجلات المحدثة
+    """
+    from app.services.speech_alignment import levenshtein_ratio
+
+    _add_column(connection, "speech_error_records", "similarity_score", "FLOAT")
+
+    pending = "" if recompute else "AND similarity_score IS NULL "
+    updated = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text(
+                "SELECT id, original_word, spoken_word FROM speech_error_records "
+                f"WHERE id > :last_id {pending}ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": batch_size},
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            text(
+                "UPDATE speech_error_records SET similarity_score = :score "
+                "WHERE id = :id"
+            ),
+            [
+                {
+                    "id": row.id,
+                    "score": levenshtein_ratio(
+                        row.original_word or "", row.spoken_word or ""
+                    ),
+                }
+                for row in rows
+            ],
+        )
+        updated += len(rows)
+        last_id = rows[-1].id
+
+    return updated
+
+
+def reclassify_speech_errors(connection, batch_size=1000, apply=True):
+    """
+    إعادة تصنيف error_category لكل السجلات بالمصنف الحالي على دفعات بترتيب id
+    (السجلات القديمة صنفت بالبحث عن الحروف في الكلمة دون موضع)
+    apply=False يحسب عدد السجلات التي سيتغير تصنيفها دون كتابة
+    Returns:
+    - {"checked": عدد السجلات, "changed": عدد التصنيفات المختلفة}
+    """
+    from app.services.phonetic_errors import classify_errors
+
+    checked = changed = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text(
+                "SELECT id, original_word, spoken_word, error_category "
+                "FROM speech_error_records WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": batch_size},
+        ).all()
+        if not rows:
+            break
+        categories = classify_errors(
+            (row.original_word, row.spoken_word) for row in rows
+        )
+        updates = [
+            {"id": row.id, "category": category}
+            for row, category in zip(rows, categories)
+            if row.error_category != category
+        ]
+        if updates and apply:
+            connection.execute(
+                text(
+                    "UPDATE speech_error_records SET error_category = :category "
+                    "WHERE id = :id"
+                ),
+                updates,
+            )
+        checked += len(rows)
+        changed += len(updates)
+        last_id = rows[-1].id
+
+    return {"checked": checked, "changed": changed}
+
+
+def add_job_worker_columns(connection):
+    _add_column(connection, "generation_jobs", "worker", "VARCHAR(100)")
+    _add_column(connection, "generation_jobs", "heartbeat_at", "DATETIME")
+
+
+def add_story_word_count(connection):
+    from app.services.story_index import backfill_story_word_counts
+
+    _add_column(connection, "ai_generated_stories", "word_count", "INTEGER")
+    backfill_story_word_counts(connection)
+
+
+MIGRATIONS = [
+    ("0001", "story_images.blob_hash column", add_story_image_blob_hash),
+    ("0002", "level progress counter columns", add_progress_counters),
+    ("0003", "composite indexes for hot lookups", add_hot_path_indexes),
+    ("0004", "unique learning_progress key", add_progress_unique_key),
+    (
+        "0005",
+        "speech stats rollup backfill",
+        _step("app.services.speech_stats", "rebuild_speech_rollup"),
+    ),
+    (
+        "0006",
+        "speech daily rollup backfill",
+        _step("app.services.speech_stats", "rebuild_speech_daily_rollup"),
+    ),
+    ("0007", "normalized speech error words", add_error_normalized_word),
+    (
+        "0008",
+        "story word index with shared normalization",
+        _step("app.services.story_index", "reindex_stories"),
+    ),
+    ("0009", "stored speech error similarity scores", backfill_error_similarity),
+    ("0010", "position-aware speech error categories", reclassify_speech_errors),
+    (
+        "0011",
+        "user word error stats backfill",
+        _step("app.services.word_error_stats", "rebuild_word_error_stats"),
+    ),
+    ("0012", "generation job worker and heartbeat", add_job_worker_columns),
+    ("0013", "story word counts for length matching", add_story_word_count),
+]
+
+# الاستعلامات الساخنة التي يجب أن تستخدم فهرسًا بدلاً من مسح الجدول كاملاً
+HOT_QUERIES = {
+    "learning_progress by key": (
+        "SELECT * FROM learning_progress "
+        "WHERE user_id = 1 AND level_id = 1 AND lesson_id = 1"
+    ),
+    "level progress row": (
+        "SELECT * FROM learning_progress "
+        "WHERE user_id = 1 AND level_id = 1 AND lesson_id IS NULL"
+    ),
+    "speech activities by date": (
+        "SELECT * FROM speech_activities WHERE user_id = 1 "
+        "AND created_at >= '2024-01-01' ORDER BY created_at DESC"
+    ),
+    "speech errors by word": (
+        "SELECT original_word, COUNT(*) FROM speech_error_records "
+        "WHERE user_id = 1 GROUP BY original_word"
+    ),
+    "top word errors": (
+        "SELECT * FROM user_word_error_stats WHERE user_id = 1 AND error_count > 0 "
+        "ORDER BY error_count DESC, normalized_word DESC LIMIT 10"
+    ),
+    "user stories page": (
+        "SELECT * FROM ai_generated_stories WHERE user_id = 1 "
+        "ORDER BY created_at DESC, id DESC LIMIT 21"
+    ),
+}
+
+
+def ensure_migrations_table(connection):
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(20) PRIMARY KEY, "
+            "description VARCHAR(200), "
+            "applied_at TIMESTAMP)"
+        )
+    )
+
+
+def applied_versions(connection):
+    ensure_migrations_table(connection)
+    return {
+        row.version
+        for row in connection.execute(text("SELECT version FROM schema_migrations"))
+    }
+
+
+def upgrade_schema():
+    """
+    تطبيق الترحيلات غير المطبقة بالترتيب، كل ترحيل في معاملة مستقلة
+    Returns:
+    - أرقام الترحيلات التي طبقت
+    """
+    with db.engine.begin() as connection:
+        done = applied_versions(connection)
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with db.engine.begin() as connection:
+            # عملية أخرى قد تكون طبقت الترحيل منذ القراءة الأولى
+            if version in applied_versions(connection):
+                continue
+            logger.info(f"Applying schema migration {version}: {description}")
+            migrate(connection)
+            connection.execute(
+                text(
+                    "INSERT INTO schema_migrations "
+                    "(version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                {
+                    "version": version,
+                    "description": description,
+                    "applied_at": datetime.utcnow(),
+                },
+            )
+        applied.append(version)
+
+    if applied:
+        from app.services.progress_counters import reconcile_counters
+
+        # الأعمدة الجديدة تبدأ بصفر وحذف السجلات المكررة يغير عدد الدروس المكتملة
+        reconcile_counters()
+    return applied
+
+
+def database_is_empty():
+    """لا توجد أي جداول بعد (تستدعى قبل db.create_all)"""
+    return not db.inspect(db.engine).get_table_names()
+
+
+def stamp_migrations():
+    """تسجيل كل الترحيلات كمطبقة دون تشغيلها (لقاعدة أنشأها create_all للتو)"""
+    with db.engine.begin() as connection:
+        done = applied_versions(connection)
+        rows = [
+            {
+                "version": version,
+                "description": description,
+                "applied_at": datetime.utcnow(),
+            }
+            for version, description, _ in MIGRATIONS
+            if version not in done
+        ]
+        if rows:
+            connection.execute(
+                text(
+                    "INSERT INTO schema_migrations "
+                    "(version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                rows,
+            )
+
+
+def upgrade_on_start(created, apply):
+    """
+    الترحيلات عند بدء التطبيق
+    - created: قاعدة جديدة أنشأها create_all بكل الأعمدة والفهارس، فتسجل فقط
+    - apply (SCHEMA_UPGRADE_ON_START): تطبيق الترحيلات المعلقة الآن
+    - غير ذلك: تحذير بالترحيلات المعلقة دون تشغيل أي إعادة حساب
+    Returns:
+    - أرقام الترحيلات التي طبقت
+    """
+    if created:
+        stamp_migrations()
+        return []
+    if apply:
+        return upgrade_schema()
+
+    pending = [version for version, _, applied in migration_status() if not applied]
+    if pending:
+        logger.warning(
+            f"Pending schema migrations {pending}: run "
+            "'python migrations/schema_migrations.py upgrade' "
+            "or start with SCHEMA_UPGRADE_ON_START=1"
+        )
+    return []
+
+
+def migration_status():
+    """[(version, description, applied)] لكل ترحيل معروف"""
+    with db.engine.begin() as connection:
+        done = applied_versions(connection)
+    return [
+        (version, description, version in done)
+        for version, description, _ in MIGRATIONS
+    ]
+
+
+def plan_uses_index(plan):
+    """
+    هل كل وصول للجداول في خطة التنفيذ بحث عبر فهرس (SEARCH)
+    SCAN مسح كامل حتى مع USING COVERING INDEX (يقرأ الفهرس كله)
+    """
+    return any(step.startswith("SEARCH") for step in plan) and not any(
+        step.startswith("SCAN") for step in plan
+    )
+
+
+def explain_hot_queries():
+    """
+    خطة التنفيذ (EXPLAIN QUERY PLAN) لكل استعلام ساخن على SQLite
+    Returns:
+    - {اسم الاستعلام: {"uses_index": bool, "scans": [خطوات المسح], "plan": [خطوات]}}
+    """
+    if db.engine.dialect.name != "sqlite":
+        return {}
+
+    plans = {}
+    with db.engine.connect() as connection:
+        for name, sql in HOT_QUERIES.items():
+            plan = [
+                row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+            ]
+            plans[name] = {
+                "uses_index": plan_uses_index(plan),
+                "scans": [step for step in plan if step.startswith("SCAN")],
+                "plan": plan,
+            }
+    return plans
@@ -0,0 +1,227 @@
+from functools import lru_cache
+
+from app.services.arabic_text import tokenize
+
+# تقييم القراءة على الخادم: تطبيع النص العربي، ومحاذاة كلمات النص الأصلي مع
+# النص المتعرف عليه (DP مسافة التحرير)، وحساب الدقة والأخطاء في مرور واحد.
+# تشابه الكلمات والمحاذاة منقولان من SpeechRecognition.tsx، والواجهة تعرض نتيجة
+# الخادم (/save أو /score) ولا تحسب الدقة بنفسها إلا إذا تعذر الوصول إليه
+
+# كلمة ناقصة في القراءة (نفس القيمة التي ترسلها الواجهة)
+MISSING_WORD = "مفقود"
+
+# حروف متقاربة صوتيًا (استبدالها أرخص من الاستبدال العادي)
+SIMILAR_GROUPS = (
+    ("ت", "ط"),
+    ("د", "ض"),
+    ("س", "ص"),
+    ("ذ", "ز", "ظ"),
+    ("ح", "ه"),
+    ("ع", "ء"),
+    ("ق", "ك"),
+)
+LESS_SIMILAR_PAIRS = (
+    ("س", "ش"),
+    ("ل", "ن"),
+    ("ب", "ت"),
+    ("ج", "خ"),
+    ("ر", "ز"),
+)
+
+INSERTION_COST = 2
+DELETION_COST = 2
+SUBSTITUTION_COST = 3
+SIMILAR_SUBSTITUTION_COST = 1
+LESS_SIMILAR_SUBSTITUTION_COST = 2
+LENGTH_PENALTY = 5  # نسبة مئوية لكل حرف فرق في الطول
+
+CORRECT_THRESHOLD = 95
+MINOR_THRESHOLD = 75
+
+_SUBSTITUTION_COSTS = {}
+for _pairs, _cost in (
+    (LESS_SIMILAR_PAIRS, LESS_SIMILAR_SUBSTITUTION_COST),
+    (SIMILAR_GROUPS, SIMILAR_SUBSTITUTION_COST),
+):
+    for _group in _pairs:
+        for _a in _group:
+            for _b in _group:
+                if _a != _b:
+                    _SUBSTITUTION_COSTS[(_a, _b)] = _cost
+
+
+@lru_cache(maxsize=65536)
+def word_similarity(first, second):
+    """
+    تشابه نصين (0-100) بمسافة تحرير تراعي الحروف المتقاربة صوتيًا،
+    مع خصم إضافي لفرق الطول
+    """
+    if first == second:
+        return 100.0
+    if not first or not second:
+        return 0.0
+
+    costs = _SUBSTITUTION_COSTS
+    m, n = len(first), len(second)
+    previous = [j * INSERTION_COST for j in range(n + 1)]
+    for i in range(1, m + 1):
+        char = first[i - 1]
+        current = [i * DELETION_COST] + [0] * n
+        for j in range(1, n + 1):
+            other = second[j - 1]
+            if char == other:
+                current[j] = previous[j - 1]
+            else:
+                current[j] = min(
+                    previous[j] + DELETION_COST,
+                    current[j - 1] + INSERTION_COST,
+                    previous[j - 1] + costs.get((char, other), SUBSTITUTION_COST),
+                )
+        previous = current
+
+    max_distance = max(m, n) * SUBSTITUTION_COST
+    similarity = max(0.0, (max_distance - previous[n]) / max_distance * 100)
+    return max(0.0, min(100.0, similarity - abs(m - n) * LENGTH_PENALTY))
+
+
+def levenshtein_ratio(first, second):
+    """
+    نسبة تشابه نصين (0-100) بمسافة الإدراج/الحذف (نفس مقياس Levenshtein.ratio):
+    2 * LCS / مجموع الطولين. طول أطول تتابع مشترك يحسب بخوارزمية bit-parallel
+    (Hyyrö) على أعداد Python الصحيحة، أي عملية واحدة لكل حرف من النص الثاني
+    """
+    if first == second:
+        return 100.0
+    if not first or not second:
+        return 0.0
+
+    masks = {}
+    for index, char in enumerate(first):
+        masks[char] = masks.get(char, 0) | (1 << index)
+
+    full = (1 << len(first)) - 1
+    row = full
+    for char in second:
+        matches = row & masks.get(char, 0)
+        row = ((row + matches) | (row - matches)) & full
+
+    common = len(first) - bin(row).count("1")
+    return common * 200 / (len(first) + len(second))
+
+
+def align_words(original_words, recognized_words):
+    """
+    محاذاة كلمات النص الأصلي مع الكلمات المتعرف عليها
+    Returns:
+    - قائمة {"word", "type": correct/minor/severe, "matched", "similarity"}
+      بترتيب النص الأصلي (الكلمات الزائدة في القراءة تهمل)
+    """
+    m, n = len(original_words), len(recognized_words)
+    similarity = [
+        [word_similarity(word, other) for other in recognized_words]
+        for word in original_words
+    ]
+
+    # 0 = قطري (تطابق/استبدال)، 1 = أعلى (كلمة ناقصة)، 2 = يسار (كلمة زائدة)
+    dp = [[0.0] * (n + 1) for _ in range(m + 1)]
+    moves = [bytearray(n + 1) for _ in range(m + 1)]
+    for i in range(1, m + 1):
+        dp[i][0] = i
+        moves[i][0] = 1
+    for j in range(1, n + 1):
+        dp[0][j] = j
+        moves[0][j] = 2
+
+    for i in range(1, m + 1):
+        row, above, scores = dp[i], dp[i - 1], similarity[i - 1]
+        for j in range(1, n + 1):
+            score = scores[j - 1]
+            match = above[j - 1] + (
+                0 if score >= CORRECT_THRESHOLD else 0.5 if score >= 80 else 1
+            )
+            delete = above[j] + 1
+            insert = row[j - 1] + 1
+            best = min(match, delete, insert)
+            row[j] = best
+            moves[i][j] = 0 if best == match else 1 if best == delete else 2
+
+    words = []
+    i, j = m, n
+    while i > 0 or j > 0:
+        move = moves[i][j]
+        if i > 0 and j > 0 and move == 0:
+            score = similarity[i - 1][j - 1]
+            if score >= CORRECT_THRESHOLD:
+                error_type = "correct"
+            elif score >= MINOR_THRESHOLD:
+                error_type = "minor"
+            else:
+                error_type = "severe"
+            words.append(
+                {
+                    "word": original_words[i - 1],
+                    "type": error_type,
+                    "matched": recognized_words[j - 1],
+                    "similarity": round(score, 2),
+                }
+            )
+            i -= 1
+            j -= 1
+        elif i > 0 and move == 1:
+            words.append(
+                {
+                    "word": original_words[i - 1],
+                    "type": "severe",
+                    "matched": MISSING_WORD,
+                    "similarity": 0.0,
+                }
+            )
+            i -= 1
+        else:
+            j -= 1
+
+    words.reverse()
+    return words
+
+
+def score_submission(original_text, recognized_text):
+    """
+    تقييم قراءة واحدة
+    الدقة هي متوسط تشابه كلمات النص الأصلي مع ما قوبلت به، موزونًا بطول الكلمة
+    (الكلمة الناقصة صفر)، فتحسب من المحاذاة نفسها دون DP على النص كاملاً
+    Returns:
+    - {"accuracy", "words": المحاذاة كاملة, "errors": أخطاء بصيغة SpeechErrorRecord}
+    """
+    words = align_words(tokenize(original_text), tokenize(recognized_text))
+
+    total_length = sum(len(word["word"]) for word in words)
+    accuracy = (
+        sum(len(word["word"]) * word["similarity"] for word in words) / total_length
+        if total_length
+        else 0.0
+    )
+    errors = [
+        {
+            "original_word": word["word"],
+            "spoken_word": word["matched"],
+            "error_type": word["type"],
+        }
+        for word in words
+        if word["type"] != "correct"
+    ]
+
+    return {"accuracy": round(accuracy, 2), "words": words, "errors": errors}
+
+
+def score_batch(submissions):
+    """
+    تقييم عدة قراءات؛ تشابه أزواج الكلمات محفوظ في ذاكرة word_similarity
+    لذلك الكلمات المتكررة بين القراءات (نفس القصة غالبًا) تحسب مرة واحدة
+    """
+    return [
+        score_submission(
+            submission.get("original_text", ""),
+            submission.get("recognized_text", ""),
+        )
+        for submission in submissions
+    ]
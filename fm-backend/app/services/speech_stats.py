@@ -0,0 +1,450 @@
+import json
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, event, func, insert, select, update
+
+from app.db import db
+from app.models.user import SpeechActivity, SpeechDailyRollup, SpeechStatsRollup
+from app.services.env import env_int
+
+logger = logging.getLogger(__name__)
+
+# إحصائيات القراءة (/api/speech/stats) من استعلام تجميعي واحد، أو من جدول
+# speech_stats_rollup الذي يحدث مع كل نشاط جديد حتى يبقى زمن الاستجابة ثابتًا
+# مهما طال سجل المستخدم
+
+# عدد الأنشطة الأولى/الأخيرة المستخدمة في حساب اتجاه التحسن
+TREND_WINDOW = 5
+
+# فترات تجميع منحنى الدقة في /api/speech/analytics
+TREND_BUCKETS = ("day", "week", "month")
+
+EMPTY_STATS = {
+    "total_activities": 0,
+    "average_accuracy": 0,
+    "highest_accuracy": 0,
+    "improvement_trend": 0,
+    "most_recent_accuracy": 0,
+}
+
+
+def rollup_enabled():
+    return bool(env_int("SPEECH_STATS_ROLLUP", 1))
+
+
+def _format_stats(total, average, highest, first_avg, recent_avg, most_recent):
+    if not total:
+        return dict(EMPTY_STATS)
+    return {
+        "total_activities": total,
+        "average_accuracy": round(average or 0, 2),
+        "highest_accuracy": round(highest or 0, 2),
+        "improvement_trend": round((recent_avg or 0) - (first_avg or 0), 2),
+        "most_recent_accuracy": round(most_recent or 0, 2),
+    }
+
+
+def _ranked_activities(*filters, partition_by=None):
+    """الأنشطة مع ترتيبها من الأقدم ومن الأحدث (داخل كل مجموعة إن وجدت)"""
+    return (
+        select(
+            SpeechActivity.user_id,
+            SpeechActivity.story_id,
+            SpeechActivity.id,
+            SpeechActivity.created_at,
+            SpeechActivity.accuracy,
+            func.row_number()
+            .over(
+                partition_by=partition_by,
+                order_by=(SpeechActivity.created_at.asc(), SpeechActivity.id.asc()),
+            )
+            .label("first_rank"),
+            func.row_number()
+            .over(
+                partition_by=partition_by,
+                order_by=(SpeechActivity.created_at.desc(), SpeechActivity.id.desc()),
+            )
+            .label("recent_rank"),
+        )
+        .where(*filters)
+        .subquery()
+    )
+
+
+def query_speech_stats(user_id, story_id=None):
+    """حساب الإحصائيات باستعلام واحد مع تطبيق فلتر القصة على كل القيم"""
+    filters = [SpeechActivity.user_id == user_id]
+    if story_id:
+        filters.append(SpeechActivity.story_id == story_id)
+    ranked = _ranked_activities(*filters)
+
+    row = db.session.execute(
+        select(
+            func.count(),
+            func.avg(ranked.c.accuracy),
+            func.max(ranked.c.accuracy),
+            func.avg(case((ranked.c.first_rank <= TREND_WINDOW, ranked.c.accuracy))),
+            func.avg(case((ranked.c.recent_rank <= TREND_WINDOW, ranked.c.accuracy))),
+            func.max(case((ranked.c.recent_rank == 1, ranked.c.accuracy))),
+        )
+    ).one()
+    return _format_stats(*row)
+
+
+def rollup_speech_stats(user_id, story_id=None):
+    """
+    الإحصائيات من speech_stats_rollup (صف لكل قصة قرأها المستخدم)
+    Returns:
+    - الإحصائيات، أو None إذا لم يكن للمستخدم أي صف
+    """
+    query = SpeechStatsRollup.query.filter_by(user_id=user_id)
+    if story_id:
+        query = query.filter_by(story_id=story_id)
+    rollups = query.all()
+    if not rollups:
+        return None
+
+    total = sum(rollup.activity_count or 0 for rollup in rollups)
+    accuracy_sum = sum(rollup.accuracy_sum or 0 for rollup in rollups)
+    highest = max(rollup.highest_accuracy or 0 for rollup in rollups)
+
+    # أول/آخر خمسة أنشطة للمستخدم موجودة حتمًا ضمن أول/آخر خمسة لكل قصة
+    first = sorted(
+        entry for rollup in rollups for entry in _load(rollup.first_accuracies)
+    )[:TREND_WINDOW]
+    recent = sorted(
+        (entry for rollup in rollups for entry in _load(rollup.recent_accuracies)),
+        reverse=True,
+    )[:TREND_WINDOW]
+
+    return _format_stats(
+        total,
+        accuracy_sum / total if total else 0,
+        highest,
+        _average(first),
+        _average(recent),
+        recent[0][2] if recent else 0,
+    )
+
+
+def load_speech_stats(user_id, story_id=None):
+    if rollup_enabled():
+        stats = rollup_speech_stats(user_id, story_id)
+        if stats is not None:
+            return stats
+    return query_speech_stats(user_id, story_id)
+
+
+def _load(value):
+    return [tuple(entry) for entry in json.loads(value)] if value else []
+
+
+def _average(entries):
+    return sum(entry[2] for entry in entries) / len(entries) if entries else 0
+
+
+def _entry(created_at, activity_id, accuracy):
+    return (
+        created_at.isoformat() if created_at else "",
+        activity_id,
+        float(accuracy or 0),
+    )
+
+
+def _add_to_rollup(connection, activity):
+    """إضافة نشاط جديد إلى صف (المستخدم، القصة) في نفس المعاملة"""
+    table = SpeechStatsRollup.__table__
+    entry = _entry(
+        activity.created_at or datetime.utcnow(), activity.id, activity.accuracy
+    )
+    key = (table.c.user_id == activity.user_id) & (
+        table.c.story_id == str(activity.story_id)
+    )
+    row = connection.execute(
+        select(table.c.first_accuracies, table.c.recent_accuracies).where(key)
+    ).first()
+
+    if row is None:
+        connection.execute(
+            insert(table).values(
+                user_id=activity.user_id,
+                story_id=str(activity.story_id),
+                activity_count=1,
+                accuracy_sum=entry[2],
+                highest_accuracy=entry[2],
+                first_accuracies=json.dumps([entry]),
+                recent_accuracies=json.dumps([entry]),
+            )
+        )
+        return
+
+    first = sorted(_load(row.first_accuracies) + [entry])[:TREND_WINDOW]
+    recent = sorted(_load(row.recent_accuracies) + [entry], reverse=True)[:TREND_WINDOW]
+    connection.execute(
+        update(table)
+        .where(key)
+        .values(
+            activity_count=func.coalesce(table.c.activity_count, 0) + 1,
+            accuracy_sum=func.coalesce(table.c.accuracy_sum, 0) + entry[2],
+            highest_accuracy=case(
+                (
+                    func.coalesce(table.c.highest_accuracy, 0) < entry[2],
+                    entry[2],
+                ),
+                else_=table.c.highest_accuracy,
+            ),
+            first_accuracies=json.dumps(first),
+            recent_accuracies=json.dumps(recent),
+        )
+    )
+
+
+def _add_to_daily_rollup(connection, activity):
+    """إضافة النشاط إلى مجموع يومه في speech_daily_rollup"""
+    table = SpeechDailyRollup.__table__
+    accuracy = float(activity.accuracy or 0)
+    day = (activity.created_at or datetime.utcnow()).date()
+    key = (
+        (table.c.user_id == activity.user_id)
+        & (table.c.day == day)
+        & (table.c.story_id == str(activity.story_id))
+    )
+
+    result = connection.execute(
+        update(table)
+        .where(key)
+        .values(
+            activity_count=func.coalesce(table.c.activity_count, 0) + 1,
+            accuracy_sum=func.coalesce(table.c.accuracy_sum, 0) + accuracy,
+            min_accuracy=case(
+                (func.coalesce(table.c.min_accuracy, accuracy) > accuracy, accuracy),
+                else_=func.coalesce(table.c.min_accuracy, accuracy),
+            ),
+            max_accuracy=case(
+                (func.coalesce(table.c.max_accuracy, accuracy) < accuracy, accuracy),
+                else_=func.coalesce(table.c.max_accuracy, accuracy),
+            ),
+        )
+    )
+    if result.rowcount == 0:
+        connection.execute(
+            insert(table).values(
+                user_id=activity.user_id,
+                day=day,
+                story_id=str(activity.story_id),
+                activity_count=1,
+                accuracy_sum=accuracy,
+                min_accuracy=accuracy,
+                max_accuracy=accuracy,
+            )
+        )
+
+
+@event.listens_for(SpeechActivity, "after_insert")
+def _speech_activity_inserted(mapper, connection, target):
+    _add_to_rollup(connection, target)
+    _add_to_daily_rollup(connection, target)
+
+
+def bucket_start(day, bucket):
+    """بداية الفترة التي يقع فيها اليوم (الأسبوع يبدأ يوم الاثنين)"""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def load_accuracy_trend(user_id, from_day=None, to_day=None, bucket="day"):
+    """
+    منحنى الدقة من speech_daily_rollup مجمعًا حسب اليوم أو الأسبوع أو الشهر
+    Returns:
+    - (النقاط مرتبة حسب التاريخ، عدد الأنشطة، مجموع الدقة)
+    """
+    table = SpeechDailyRollup
+    query = db.session.query(
+        table.day,
+        func.sum(table.activity_count),
+        func.sum(table.accuracy_sum),
+        func.min(table.min_accuracy),
+        func.max(table.max_accuracy),
+    ).filter(table.user_id == user_id)
+    if from_day:
+        query = query.filter(table.day >= from_day)
+    if to_day:
+        query = query.filter(table.day <= to_day)
+
+    buckets = {}
+    for day, count, accuracy_sum, lowest, highest in query.group_by(table.day):
+        start = bucket_start(day, bucket)
+        current = buckets.get(start)
+        if current is None:
+            buckets[start] = [count, accuracy_sum, lowest, highest]
+        else:
+            current[0] += count
+            current[1] += accuracy_sum
+            current[2] = min(current[2], lowest)
+            current[3] = max(current[3], highest)
+
+    trend = [
+        {
+            "date": start.isoformat(),
+            "accuracy": round(accuracy_sum / count, 2) if count else 0,
+            "count": count,
+            "min_accuracy": lowest,
+            "max_accuracy": highest,
+        }
+        for start, (count, accuracy_sum, lowest, highest) in sorted(buckets.items())
+    ]
+    total = sum(point["count"] for point in trend)
+    accuracy_total = sum(values[1] for values in buckets.values())
+    return trend, total, accuracy_total
+
+
+def edge_accuracies(user_id, from_day=None, to_day=None):
+    """
+    متوسط دقة أول وآخر TREND_WINDOW أنشطة في الفترة (استعلامان محدودان عبر الفهرس)
+    """
+    query = db.session.query(SpeechActivity.accuracy).filter(
+        SpeechActivity.user_id == user_id
+    )
+    if from_day:
+        query = query.filter(
+            SpeechActivity.created_at >= datetime.combine(from_day, datetime.min.time())
+        )
+    if to_day:
+        query = query.filter(
+            SpeechActivity.created_at
+            < datetime.combine(to_day + timedelta(days=1), datetime.min.time())
+        )
+
+    first = [
+        row.accuracy or 0
+        for row in query.order_by(
+            SpeechActivity.created_at.asc(), SpeechActivity.id.asc()
+        ).limit(TREND_WINDOW)
+    ]
+    last = [
+        row.accuracy or 0
+        for row in query.order_by(
+            SpeechActivity.created_at.desc(), SpeechActivity.id.desc()
+        ).limit(TREND_WINDOW)
+    ]
+    return (
+        sum(first) / len(first) if first else 0,
+        sum(last) / len(last) if last else 0,
+    )
+
+
+def rebuild_speech_rollup(connection):
+    """
+    إعادة بناء speech_stats_rollup بالكامل من speech_activities
+    Returns:
+    - عدد الصفوف المكتوبة
+    """
+    table = SpeechStatsRollup.__table__
+    activities = SpeechActivity.__table__
+
+    rollups = {}
+    for user_id, story_id, count, accuracy_sum, highest in connection.execute(
+        select(
+            activities.c.user_id,
+            activities.c.story_id,
+            func.count(),
+            func.sum(activities.c.accuracy),
+            func.max(activities.c.accuracy),
+        ).group_by(activities.c.user_id, activities.c.story_id)
+    ):
+        rollups[(user_id, story_id)] = {
+            "user_id": user_id,
+            "story_id": story_id,
+            "activity_count": count,
+            "accuracy_sum": accuracy_sum or 0,
+            "highest_accuracy": highest or 0,
+            "first": [],
+            "recent": [],
+        }
+
+    ranked = _ranked_activities(
+        partition_by=(SpeechActivity.user_id, SpeechActivity.story_id)
+    )
+    for row in connection.execute(
+        select(ranked).where(
+            (ranked.c.first_rank <= TREND_WINDOW)
+            | (ranked.c.recent_rank <= TREND_WINDOW)
+        )
+    ):
+        rollup = rollups[(row.user_id, row.story_id)]
+        entry = _entry(row.created_at, row.id, row.accuracy)
+        if row.first_rank <= TREND_WINDOW:
+            rollup["first"].append(entry)
+        if row.recent_rank <= TREND_WINDOW:
+            rollup["recent"].append(entry)
+
+    rows = [
+        {
+            "user_id": rollup["user_id"],
+            "story_id": rollup["story_id"],
+            "activity_count": rollup["activity_count"],
+            "accuracy_sum": rollup["accuracy_sum"],
+            "highest_accuracy": rollup["highest_accuracy"],
+            "first_accuracies": json.dumps(sorted(rollup["first"])),
+            "recent_accuracies": json.dumps(sorted(rollup["recent"], reverse=True)),
+        }
+        for rollup in rollups.values()
+    ]
+
+    connection.execute(table.delete())
+    if rows:
+        connection.execute(insert(table), rows)
+    logger.info(f"Rebuilt speech stats rollup: {len(rows)} rows")
+    return len(rows)
+
+
+def rebuild_speech_daily_rollup(connection):
+    """
+    إعادة بناء speech_daily_rollup بالكامل من speech_activities
+    Returns:
+    - عدد الصفوف المكتوبة
+    """
+    table = SpeechDailyRollup.__table__
+    activities = SpeechActivity.__table__
+    day = func.date(activities.c.created_at)
+
+    rows = [
+        {
+            "user_id": user_id,
+            "day": (
+                date.fromisoformat(str(row_day)[:10])
+                if not isinstance(row_day, date)
+                else row_day
+            ),
+            "story_id": story_id,
+            "activity_count": count,
+            "accuracy_sum": accuracy_sum or 0,
+            "min_accuracy": lowest,
+            "max_accuracy": highest,
+        }
+        for user_id, row_day, story_id, count, accuracy_sum, lowest, highest in (
+            connection.execute(
+                select(
+                    activities.c.user_id,
+                    day,
+                    activities.c.story_id,
+                    func.count(),
+                    func.sum(activities.c.accuracy),
+                    func.min(activities.c.accuracy),
+                    func.max(activities.c.accuracy),
+                )
+                .where(activities.c.created_at.isnot(None))
+                .group_by(activities.c.user_id, day, activities.c.story_id)
+            )
+        )
+    ]
+
+    connection.execute(table.delete())
+    if rows:
+        connection.execute(insert(table), rows)
+    logger.info(f"Rebuilt speech daily rollup: {len(rows)} rows")
+    return len(rows)
@@ -0,0 +1,208 @@
+import json
+import logging
+
+from sqlalchemy import bindparam, func, insert, select
+
+from app.db import db
+from app.models.user import SHORT_STORY_MAX_WORDS, AIGeneratedStory, StoryWordIndex
+from app.services.arabic_text import normalize_word, normalize_words
+from app.services.env import env_float
+
+logger = logging.getLogger(__name__)
+
+# فهرس معكوس للقصص المحفوظة يسمح بإعادة استخدام قصة تغطي كلمات المستخدم
+# بدلاً من طلب قصة جديدة من OpenAI
+
+# الحد الأدنى لنسبة الكلمات المستهدفة الموجودة في القصة لإعادة استخدامها
+MIN_REUSE_COVERAGE = env_float("STORY_REUSE_MIN_COVERAGE", 0.6)
+
+
+def _story_words(story):
+    """الكلمات المطبعة في نص القصة وكلماتها المستهدفة"""
+    try:
+        target_words = json.loads(story.target_words or "[]")
+    except ValueError:
+        target_words = []
+
+    targets = set(normalize_words(target_words))
+    words = set(normalize_words(story.content.split())) | targets
+    # الكلمات القصيرة جدًا لا تفيد في المطابقة وتضخم الفهرس
+    return {word for word in words if len(word) > 2}, targets
+
+
+def index_story(story, commit=True):
+    """إضافة (أو إعادة بناء) كلمات قصة واحدة في الفهرس"""
+    words, targets = _story_words(story)
+
+    StoryWordIndex.query.filter_by(story_id=story.id).delete()
+    db.session.bulk_insert_mappings(
+        StoryWordIndex,
+        [
+            {"word": word[:100], "story_id": story.id, "is_target": word in targets}
+            for word in words
+        ],
+    )
+
+    if commit:
+        db.session.commit()
+
+
+def rebuild_index(batch_size=200):
+    """إعادة بناء الفهرس بالكامل من جدول القصص على دفعات"""
+    StoryWordIndex.query.delete()
+    db.session.commit()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        stories = (
+            AIGeneratedStory.query.filter(AIGeneratedStory.id > last_id)
+            .order_by(AIGeneratedStory.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not stories:
+            break
+
+        for story in stories:
+            index_story(story, commit=False)
+        db.session.commit()
+
+        indexed += len(stories)
+        last_id = stories[-1].id
+
+    logger.info(f"Story word index rebuilt for {indexed} stories")
+    return indexed
+
+
+def backfill_story_word_counts(connection, batch_size=1000):
+    """
+    حساب word_count للقصص المحفوظة قبل إضافة العمود على دفعات بترتيب id
+    Returns:
+    - عدد القصص المحدثة
+    """
+    stories = AIGeneratedStory.__table__
+    updated = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(stories.c.id, stories.c.content)
+            .where(stories.c.id > last_id, stories.c.word_count.is_(None))
+            .order_by(stories.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            stories.update()
+            .where(stories.c.id == bindparam("story_id"))
+            .values(word_count=bindparam("count")),
+            [
+                {"story_id": row.id, "count": len((row.content or "").split())}
+                for row in rows
+            ],
+        )
+        updated += len(rows)
+        last_id = rows[-1].id
+    return updated
+
+
+def reindex_stories(connection, batch_size=5000):
+    """
+    إعادة بناء الفهرس كاملاً ضمن اتصال قائم (ترحيل المخطط بعد تغيير التطبيع)
+    Returns:
+    - عدد صفوف الفهرس المكتوبة
+    """
+    stories = AIGeneratedStory.__table__
+    word_index = StoryWordIndex.__table__
+
+    connection.execute(word_index.delete())
+    written = 0
+    rows = []
+    for story in connection.execute(
+        select(stories.c.id, stories.c.content, stories.c.target_words)
+    ):
+        words, targets = _story_words(story)
+        rows.extend(
+            {"word": word[:100], "story_id": story.id, "is_target": word in targets}
+            for word in words
+        )
+        if len(rows) >= batch_size:
+            connection.execute(insert(word_index), rows)
+            written += len(rows)
+            rows = []
+
+    if rows:
+        connection.execute(insert(word_index), rows)
+        written += len(rows)
+    return written
+
+
+def find_covering_story(
+    target_words,
+    theme=None,
+    difficulty=None,
+    age_group=None,
+    length=None,
+    exclude_user_id=None,
+    min_coverage=None,
+):
+    """
+    البحث عن قصة محفوظة تغطي أكبر عدد من الكلمات المستهدفة
+    الشروط (الموضوع والصعوبة والفئة العمرية والطول) تطبق في الاستعلام نفسه،
+    فالقصة المختارة هي الأفضل تغطية بين القصص المطابقة لها
+
+    Returns:
+    - (القصة، نسبة التغطية، الكلمات المغطاة) أو None إذا كانت التغطية أقل من الحد
+    """
+    if min_coverage is None:
+        min_coverage = MIN_REUSE_COVERAGE
+
+    normalized = {}
+    for word in target_words:
+        key = normalize_word(word)
+        if len(key) > 2:
+            normalized.setdefault(key, word)
+    if not normalized:
+        return None
+
+    hits = func.count(StoryWordIndex.word).label("hits")
+    query = (
+        db.session.query(StoryWordIndex.story_id, hits)
+        .join(AIGeneratedStory, AIGeneratedStory.id == StoryWordIndex.story_id)
+        .filter(StoryWordIndex.word.in_(list(normalized)))
+    )
+    if theme:
+        query = query.filter(AIGeneratedStory.theme == theme)
+    if difficulty:
+        query = query.filter(AIGeneratedStory.difficulty == difficulty)
+    if age_group:
+        query = query.filter(AIGeneratedStory.age_group == age_group)
+    if length == "short":
+        query = query.filter(AIGeneratedStory.word_count < SHORT_STORY_MAX_WORDS)
+    elif length:
+        query = query.filter(AIGeneratedStory.word_count >= SHORT_STORY_MAX_WORDS)
+    if exclude_user_id is not None:
+        query = query.filter(AIGeneratedStory.user_id != exclude_user_id)
+
+    best = (
+        query.group_by(StoryWordIndex.story_id)
+        .order_by(hits.desc(), StoryWordIndex.story_id.desc())
+        .first()
+    )
+    if not best:
+        return None
+
+    coverage = best.hits / len(normalized)
+    if coverage < min_coverage:
+        return None
+
+    story = AIGeneratedStory.query.get(best.story_id)
+    matched = [
+        normalized[row.word]
+        for row in StoryWordIndex.query.filter(
+            StoryWordIndex.story_id == best.story_id,
+            StoryWordIndex.word.in_(list(normalized)),
+        )
+    ]
+    return story, coverage, matched
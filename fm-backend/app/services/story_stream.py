@@ -0,0 +1,128 @@
+import json
+import re
+
+# أدوات بث القصة أثناء توليدها: استخراج story_text من JSON غير مكتمل
+# وتمييز الكلمات المستهدفة على دفعات وتنسيق أحداث Server-Sent Events
+
+_STORY_KEY = re.compile(r'"story_text"\s*:\s*"')
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+# الحدود التي يمكن بعدها تمييز الجزء المكتمل من النص بأمان
+_SAFE_BOUNDARY = re.compile(r'[\s،.؟!:؛"()\[\]{}…—–\-]')
+
+
+class StoryTextExtractor:
+    """
+    استخراج قيمة story_text تدريجيًا من استجابة JSON تصل على أجزاء
+    كل استدعاء لـ feed يعيد النص الجديد الذي اكتمل فك ترميزه فقط
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = None  # موضع بداية القيمة داخل المخزن بعد العثور على المفتاح
+        self.done = False
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return ""
+
+        self._buffer += chunk
+        if self._pos is None:
+            match = _STORY_KEY.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        out = []
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            char = buf[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+
+            # تسلسل هروب: ننتظر وصول بقيته قبل فك ترميزه
+            if i + 1 >= len(buf):
+                break
+            code = buf[i + 1]
+            if code in _SIMPLE_ESCAPES:
+                out.append(_SIMPLE_ESCAPES[code])
+                i += 2
+                continue
+            if code != "u":
+                # تسلسل غير صالح: نتركه كما هو
+                out.append(code)
+                i += 2
+                continue
+
+            if i + 6 > len(buf):
+                break
+            try:
+                first = int(buf[i + 2 : i + 6], 16)
+            except ValueError:
+                out.append(buf[i : i + 6])
+                i += 6
+                continue
+
+            # زوج بديل (surrogate pair) مثل الرموز التعبيرية يحتاج تسلسلين
+            length = 12 if 0xD800 <= first <= 0xDBFF else 6
+            if i + length > len(buf):
+                break
+            try:
+                out.append(json.loads(f'"{buf[i:i + length]}"'))
+            except ValueError:
+                out.append(buf[i : i + length])
+            i += length
+
+        self._pos = i
+        return "".join(out)
+
+
+class IncrementalHighlighter:
+    """
+    تطبيق دالة التمييز على النص المتدفق: يحتفظ بآخر كلمة غير مكتملة
+    حتى يصل حد كلمة، حتى لا تُقسم كلمة مستهدفة بين دفعتين
+    """
+
+    def __init__(self, highlight):
+        self._highlight = highlight
+        self._pending = ""
+
+    def feed(self, text):
+        """يعيد (النص الخام، النص المميز) للجزء المكتمل حتى الآن"""
+        self._pending += text
+        last = None
+        for last in _SAFE_BOUNDARY.finditer(self._pending):
+            pass
+        if last is None:
+            return "", ""
+
+        ready = self._pending[: last.end()]
+        self._pending = self._pending[last.end() :]
+        return ready, self._highlight(ready)
+
+    def flush(self):
+        ready, self._pending = self._pending, ""
+        if not ready:
+            return "", ""
+        return ready, self._highlight(ready)
+
+
+def format_sse(event, data):
+    """تنسيق حدث Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
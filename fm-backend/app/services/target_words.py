@@ -0,0 +1,205 @@
+import heapq
+import math
+import os
+import random
+import threading
+from datetime import datetime
+
+from flask import current_app, has_app_context
+
+from app.models.user import SpeechActivity
+from app.services.arabic_text import filter_valid_words, is_valid_word, normalize_word
+from app.services.env import env_float, env_int
+from app.services.response_cache import ResponseCache
+from app.services.word_error_stats import top_word_errors
+
+# الكلمات المرشحة للتمرين (القصص، التمارين، /target-words) من مكان واحد:
+# أخطاء النطق الأكثر تكرارًا وحداثة، ثم كلمات آخر الأنشطة إذا قلت الأخطاء.
+# القائمة تحسب مرة لكل مستخدم وتحذف من الذاكرة عند تسجيل نشاط أو أخطاء جديدة.
+# الطبقة المشتركة (SQLite) هي الافتراضية حتى يصل الحذف إلى كل العمليات؛
+# الذاكرة فقط (TARGET_WORDS_CACHE_SHARED=0) تصلح لعملية واحدة
+
+# أقل عدد من كلمات الأخطاء قبل الاستعانة بكلمات آخر الأنشطة
+MIN_ERROR_WORDS = 5
+RECENT_ACTIVITIES = 5
+
+# وزن كلمات الأنشطة مقارنة بخطأ واحد في نفس اليوم
+RECENT_WORD_WEIGHT = 0.5
+
+DEFAULT_WORDS = [
+    "مدرسة",
+    "كتاب",
+    "قلم",
+    "طالب",
+    "معلم",
+    "حديقة",
+    "منزل",
+    "سيارة",
+    "طريق",
+    "صديق",
+]
+
+_candidate_cache = None
+_candidate_cache_lock = threading.Lock()
+
+
+def _candidate_cache_path():
+    """مسار الطبقة المشتركة بين العمليات، أو None للذاكرة فقط"""
+    if not env_int("TARGET_WORDS_CACHE_SHARED", 1):
+        return None
+    if has_app_context() and current_app.config.get("TARGET_WORDS_CACHE_PATH"):
+        return current_app.config["TARGET_WORDS_CACHE_PATH"]
+    return os.environ.get("TARGET_WORDS_CACHE_PATH", "target_words_cache.sqlite")
+
+
+def get_candidate_cache():
+    """ذاكرة الكلمات المرشحة المشتركة في العملية"""
+    global _candidate_cache
+
+    if _candidate_cache is not None:
+        return _candidate_cache
+
+    with _candidate_cache_lock:
+        if _candidate_cache is None:
+            path = _candidate_cache_path()
+            _candidate_cache = ResponseCache(
+                path,
+                ttl_seconds=env_int("TARGET_WORDS_CACHE_TTL", 3600),
+                memory_entries=(
+                    0 if path else env_int("TARGET_WORDS_CACHE_MEMORY_ENTRIES", 1024)
+                ),
+                max_disk_entries=env_int("TARGET_WORDS_CACHE_MAX_ENTRIES", 10000),
+                table="target_word_candidates",
+            )
+        return _candidate_cache
+
+
+def _candidates_key(user_id):
+    return f"target-words:{str(user_id).strip()}"
+
+
+def _recency(seen, now):
+    """نصف الوزن كل TARGET_WORDS_HALF_LIFE_DAYS يومًا منذ آخر ظهور"""
+    if seen is None:
+        return 1.0
+    half_life = max(env_float("TARGET_WORDS_HALF_LIFE_DAYS", 14.0), 0.01)
+    age_days = max((now - seen).total_seconds(), 0) / 86400
+    return 0.5 ** (age_days / half_life)
+
+
+def _build_candidates(user_id):
+    now = datetime.utcnow()
+    limit = env_int("TARGET_WORD_CANDIDATES", 30)
+
+    # أخطاء النطق: الوزن = عدد الأخطاء × حداثة آخر خطأ
+    candidates = [
+        {
+            "word": error["original_word"],
+            "category": error["error_category"],
+            "count": error["error_count"],
+            "weight": round(
+                error["error_count"] * _recency(error["last_seen"], now), 4
+            ),
+            "source": "errors",
+        }
+        for error in top_word_errors(user_id, limit=limit)
+        if is_valid_word(error["original_word"])
+    ]
+
+    # إذا كان لدينا أقل من 5 كلمات، استخدم بعض الكلمات من أنشطة النطق السابقة
+    if len(candidates) < MIN_ERROR_WORDS:
+        seen = {normalize_word(candidate["word"]) for candidate in candidates}
+        recent_activities = (
+            SpeechActivity.query.with_entities(
+                SpeechActivity.original_text, SpeechActivity.created_at
+            )
+            .filter_by(user_id=user_id)
+            .order_by(SpeechActivity.created_at.desc())
+            .limit(RECENT_ACTIVITIES)
+        )
+        for activity in recent_activities:
+            if not activity.original_text:
+                continue
+            weight = round(RECENT_WORD_WEIGHT * _recency(activity.created_at, now), 4)
+            for word in filter_valid_words(activity.original_text.split()):
+                key = normalize_word(word)
+                if key not in seen:
+                    seen.add(key)
+                    candidates.append(
+                        {
+                            "word": word,
+                            "category": "general",
+                            "count": 1,
+                            "weight": weight,
+                            "source": "recent",
+                        }
+                    )
+
+    candidates.sort(key=lambda candidate: candidate["weight"], reverse=True)
+    return candidates
+
+
+def target_word_candidates(user_id):
+    """
+    الكلمات المرشحة للمستخدم مرتبة حسب الوزن (بدون الكلمات الافتراضية)
+    Returns:
+    - قائمة {"word", "category", "count", "weight", "source": errors/recent}
+    """
+    cache = get_candidate_cache()
+    key = _candidates_key(user_id)
+    candidates = cache.get(key)
+    if candidates is None:
+        candidates = _build_candidates(user_id)
+        cache.set(key, candidates)
+    return candidates
+
+
+def invalidate_target_words(user_id):
+    """حذف الكلمات المرشحة المخزنة بعد تسجيل نشاط أو أخطاء جديدة للمستخدم"""
+    if user_id is None:
+        return
+    get_candidate_cache().delete(_candidates_key(user_id))
+
+
+def default_candidates(count=None):
+    """كلمات افتراضية للتدريب عندما لا توجد كلمات مرشحة"""
+    return [
+        {
+            "word": word,
+            "category": "default",
+            "count": 1,
+            "weight": 0,
+            "source": "default",
+        }
+        for word in DEFAULT_WORDS[:count]
+    ]
+
+
+def pick_weighted(candidates, count):
+    """
+    اختيار count كلمات عشوائيًا دون تكرار، باحتمال يتناسب مع الوزن
+    (Efraimidis-Spirakis: مفتاح u^(1/w) لكل كلمة ثم أعلى count مفاتيح)،
+    بترتيب عشوائي. المفتاح يحسب كلوغاريتم log(u)/w لأن u^(1/w) يصبح صفرًا
+    للأوزان الصغيرة جدًا فتتساوى كل الكلمات الافتراضية (وزنها 0)
+    """
+    if len(candidates) <= count:
+        selected = list(candidates)
+    else:
+        selected = heapq.nlargest(
+            count,
+            candidates,
+            key=lambda candidate: math.log(1.0 - random.random())
+            / max(candidate["weight"], 1e-6),
+        )
+    random.shuffle(selected)
+    return selected
+
+
+def get_candidate_cache_stats():
+    if _candidate_cache is None:
+        return {"initialized": False}
+
+    stats = _candidate_cache.stats()
+    stats["initialized"] = True
+    stats["shared"] = bool(_candidate_cache.path)
+    return stats
@@ -0,0 +1,217 @@
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, event, insert, select, update
+
+from app.db import db
+from app.models.user import SpeechErrorRecord, UserWordErrorStats
+from app.services.arabic_text import normalize_word
+
+logger = logging.getLogger(__name__)
+
+# عدادات أخطاء النطق لكل (مستخدم، كلمة مطبعة) في جدول user_word_error_stats.
+# تحدث مع كل إدراج في speech_error_records، فتقرأ قوائم "أكثر الكلمات خطأً"
+# أعلى K صفوف عبر الفهرس بدلاً من GROUP BY على كل سجلات المستخدم
+
+# الأعمدة التي تكفي لتحديث العدادات (تعاد من INSERT ... RETURNING في الإدراج الجماعي)
+ERROR_COLUMNS = (
+    SpeechErrorRecord.id,
+    SpeechErrorRecord.user_id,
+    SpeechErrorRecord.normalized_word,
+    SpeechErrorRecord.original_word,
+    SpeechErrorRecord.spoken_word,
+    SpeechErrorRecord.error_type,
+    SpeechErrorRecord.error_category,
+    SpeechErrorRecord.similarity_score,
+    SpeechErrorRecord.created_at,
+)
+
+
+def _empty_stats(user_id, key, original_word):
+    return {
+        "user_id": user_id,
+        "normalized_word": key,
+        "original_word": original_word,
+        "error_count": 0,
+        "minor_count": 0,
+        "severe_count": 0,
+        "similarity_sum": 0.0,
+        "categories": {},
+        "last_spoken_word": None,
+        "last_seen": None,
+    }
+
+
+def _add_error(stats, error):
+    stats["error_count"] += 1
+    if error.error_type == "minor":
+        stats["minor_count"] += 1
+    elif error.error_type == "severe":
+        stats["severe_count"] += 1
+    stats["similarity_sum"] += error.similarity_score or 0
+    category = error.error_category or "general_pronunciation"
+    stats["categories"][category] = stats["categories"].get(category, 0) + 1
+    stats["original_word"] = min(stats["original_word"], error.original_word)
+    seen = error.created_at or datetime.utcnow()
+    if stats["last_seen"] is None or seen >= stats["last_seen"]:
+        stats["last_seen"] = seen
+        stats["last_spoken_word"] = error.spoken_word
+
+
+def _error_key(error):
+    return error.normalized_word or normalize_word(error.original_word)[:100]
+
+
+def _stored(stats):
+    return dict(stats, categories=json.dumps(stats["categories"], ensure_ascii=False))
+
+
+def add_word_errors(connection, errors):
+    """
+    تحديث العدادات بدفعة من الأخطاء المدرجة (كائنات SpeechErrorRecord أو صفوف
+    بنفس أسماء الأعمدة): قراءة الصفوف الموجودة باستعلام واحد لكل مستخدم، ثم
+    UPDATE و INSERT جماعيان
+    """
+    table = UserWordErrorStats.__table__
+
+    grouped = {}
+    for error in errors:
+        grouped.setdefault(error.user_id, []).append(error)
+
+    for user_id, user_errors in grouped.items():
+        keys = {_error_key(error) for error in user_errors}
+        existing = {
+            row.normalized_word: dict(
+                row._mapping, categories=json.loads(row.categories or "{}")
+            )
+            for row in connection.execute(
+                select(table).where(
+                    table.c.user_id == user_id, table.c.normalized_word.in_(keys)
+                )
+            )
+        }
+
+        changed = {}
+        for error in user_errors:
+            key = _error_key(error)
+            stats = changed.get(key) or existing.get(key)
+            if stats is None:
+                stats = _empty_stats(user_id, key, error.original_word)
+            changed[key] = stats
+            _add_error(stats, error)
+
+        updates = [_stored(changed[key]) for key in changed if key in existing]
+        inserts = [_stored(changed[key]) for key in changed if key not in existing]
+        if updates:
+            connection.execute(
+                update(table).where(
+                    table.c.user_id == bindparam("b_user_id"),
+                    table.c.normalized_word == bindparam("b_normalized_word"),
+                ),
+                [
+                    {
+                        **{
+                            column: value
+                            for column, value in stats.items()
+                            if column not in ("user_id", "normalized_word")
+                        },
+                        "b_user_id": stats["user_id"],
+                        "b_normalized_word": stats["normalized_word"],
+                    }
+                    for stats in updates
+                ],
+            )
+        if inserts:
+            connection.execute(insert(table), inserts)
+
+
+@event.listens_for(SpeechErrorRecord, "after_insert")
+def _speech_error_inserted(mapper, connection, target):
+    # الإدراج الجماعي (insert_error_records) لا يطلق هذا الحدث ويستدعي
+    # add_word_errors مباشرة
+    add_word_errors(connection, [target])
+
+
+def _dominant(counts, default=None):
+    return max(counts.items(), key=lambda item: item[1])[0] if counts else default
+
+
+def top_word_errors(user_id, limit=10, error_type=None):
+    """
+    أكثر كلمات المستخدم خطأً من user_word_error_stats (أعلى K عبر الفهرس)
+    error_type ("minor"/"severe") يرتب ويعد أخطاء هذا النوع فقط
+    Returns:
+    - قائمة {"original_word", "normalized_word", "error_count", "error_type",
+      "error_category", "spoken_word", "similarity_score", "last_seen"}
+    """
+    stats = UserWordErrorStats
+    count = {
+        "minor": stats.minor_count,
+        "severe": stats.severe_count,
+    }.get(error_type, stats.error_count)
+
+    rows = (
+        db.session.query(stats)
+        .filter(stats.user_id == user_id, count > 0)
+        .order_by(count.desc(), stats.normalized_word.desc())
+        .limit(limit)
+        .all()
+    )
+
+    words = []
+    for row in rows:
+        categories = json.loads(row.categories or "{}")
+        words.append(
+            {
+                "original_word": row.original_word,
+                "normalized_word": row.normalized_word,
+                "error_count": getattr(row, count.key),
+                "error_type": error_type
+                or ("severe" if row.severe_count >= row.minor_count else "minor"),
+                "error_category": _dominant(categories, "general_pronunciation"),
+                "spoken_word": row.last_spoken_word,
+                "similarity_score": (
+                    round(row.similarity_sum / row.error_count, 2)
+                    if row.error_count
+                    else None
+                ),
+                "last_seen": row.last_seen,
+            }
+        )
+    return words
+
+
+def rebuild_word_error_stats(connection, batch_size=5000):
+    """
+    إعادة بناء user_word_error_stats بالكامل من speech_error_records
+    Returns:
+    - عدد الصفوف المكتوبة
+    """
+    table = UserWordErrorStats.__table__
+    records = SpeechErrorRecord.__table__
+
+    totals = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(*(records.c[column.key] for column in ERROR_COLUMNS))
+            .where(records.c.id > last_id)
+            .order_by(records.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for error in rows:
+            key = (error.user_id, _error_key(error))
+            stats = totals.get(key)
+            if stats is None:
+                stats = totals[key] = _empty_stats(*key, error.original_word)
+            _add_error(stats, error)
+        last_id = rows[-1].id
+
+    connection.execute(delete(table))
+    if totals:
+        connection.execute(insert(table), [_stored(stats) for stats in totals.values()])
+    logger.info(f"Rebuilt {len(totals)} user word error stats rows")
+    return len(totals)
@@ -0,0 +1,74 @@
+import os
+import re
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.arabic_text import filter_valid_words, normalize_words
+from timing import compare
+
+# قياس مصغر لوحدة تطبيع النص العربي مقابل التطبيق السابق
+# (قائمة كلمات شائعة بالبحث الخطي وتعبيرات regex لكل كلمة)
+
+_LEGACY_STOPWORDS = (
+    "في على من إلى عن بـ لـ كـ ب ل و ثم أو أم إن إذا هو هي هم هن أنت أنتم أنتن أنا"
+    " نحن هذا هذه ذلك تلك هؤلاء أولئك التي الذي اللذان اللتان الذين اللواتي ما ماذا"
+    " متى أين كيف لماذا لم لن لا ليس كان كانت كانوا يكون تكون بين حول عند حتى منذ"
+    " خلال عبر فوق تحت أمام خلف قبل بعد"
+).split()
+_LEGACY_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u0640]")
+_LEGACY_NON_WORD = re.compile(r"[^\w]+")
+
+
+def _legacy_is_valid_word(word):
+    """التطبيق السابق في ai_service.py و stories.py للمقارنة في القياس فقط"""
+    word = word.strip()
+    if not word:
+        return False
+    if re.match(r'^[،.؟!:؛""\'()[\]{}…—–-]+$', word):
+        return False
+    if word in list(_LEGACY_STOPWORDS):
+        return False
+    if len(word) <= 2:
+        return False
+    return True
+
+
+def _legacy_normalize(word):
+    """التطبيع السابق في story_index.py للمقارنة في القياس فقط"""
+    if not word:
+        return ""
+    word = _LEGACY_DIACRITICS.sub("", word)
+    return _LEGACY_NON_WORD.sub("", word).strip()
+
+
+def _legacy_pipeline(words):
+    return [_legacy_normalize(word) for word in words if _legacy_is_valid_word(word)]
+
+
+def _pipeline(words):
+    return normalize_words(filter_valid_words(words))
+
+
+def benchmark(repeat=50, paragraphs=200):
+    """
+    قياس سريع لتصفية وتطبيع كلمات قصة مصطنعة
+    python benchmarks/arabic_text.py
+    """
+    sentence = (
+        "ذَهَبَ الطّالِبُ إلى المَدْرَسَةِ، وقرأ كتابًا عن البحر مع صديقه في "
+        "الحديقة قبل أن يعود إلى بيته. "
+    )
+    words = (sentence * paragraphs).split()
+
+    print(f"{len(words)} words per call")
+    return compare(
+        (("legacy", _legacy_pipeline), ("translate", _pipeline)),
+        words,
+        repeat=repeat,
+    )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,70 @@
+import os
+import re
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.highlighter import highlight_words
+from timing import compare
+
+# قياس مصغر لمحرك التمييز بتمريرة واحدة مقابل التطبيق السابق في AIService
+
+
+def _legacy_highlight(text, target_words):
+    """التطبيق السابق (تعبيران وتمريرتان لكل كلمة) للمقارنة في القياس فقط"""
+    highlighted_text = text
+    for word in sorted(target_words, key=len, reverse=True):
+        if not word or len(word.strip()) < 2:
+            continue
+        escaped_word = re.escape(word.strip())
+        arabic_boundaries = r'[،.؟!:؛""\'()[\]{}\s\n…—–\-]'
+        pattern = rf"(^|{arabic_boundaries})({escaped_word})($|{arabic_boundaries})"
+        highlighted_text = re.sub(pattern, r"\1<mark>\2</mark>\3", highlighted_text)
+        word_form_pattern = rf"(\b)({escaped_word}[ً-ْ]*)(\b)"
+        highlighted_text = re.sub(
+            word_form_pattern, r"\1<mark>\2</mark>\3", highlighted_text
+        )
+    return highlighted_text
+
+
+def benchmark(repeat=200, word_count=15, paragraphs=20):
+    """
+    قياس سريع للتطبيق الجديد مقابل السابق على قصة مصطنعة
+    python benchmarks/highlighter.py
+    """
+    words = [
+        "مدرسة",
+        "كتاب",
+        "قلم",
+        "طالب",
+        "معلم",
+        "حديقة",
+        "شجرة",
+        "سماء",
+        "مكتبة",
+        "صديق",
+        "رحلة",
+        "بحر",
+        "جبل",
+        "نهر",
+        "مدينة",
+        "سيارة",
+        "طائرة",
+        "قطار",
+    ][:word_count]
+    sentence = (
+        "ذهب الطالبُ إلى المدرسة، وقرأ كتابًا عن البحر والجبل مع صديقه في الحديقة. "
+    )
+    text = sentence * paragraphs + " ".join(words)
+
+    return compare(
+        (("legacy", _legacy_highlight), ("single_pass", highlight_words)),
+        text,
+        words,
+        repeat=repeat,
+    )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,24 @@
+import time
+
+# أداة التوقيت المشتركة بين سكربتات القياس في هذا المجلد
+
+
+def compare(implementations, *args, repeat=50):
+    """
+    تشغيل كل تطبيق repeat مرة على نفس المدخلات وطباعة متوسط زمن الاستدعاء،
+    ثم نسبة تسريع آخر تطبيق مقارنة بالأول (التطبيق السابق أولاً)
+    Returns:
+    - {الاسم: ملي ثانية لكل استدعاء}
+    """
+    results = {}
+    for name, func in implementations:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func(*args)
+        results[name] = (time.perf_counter() - started) / repeat * 1000
+
+    for name, ms in results.items():
+        print(f"{name:12s} {ms:8.3f} ms/call")
+    baseline, candidate = implementations[0][0], implementations[-1][0]
+    print(f"speedup      {results[baseline] / results[candidate]:8.1f}x")
+    return results
@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.db import db
+from app.services.schema_migrations import backfill_error_similarity
+
+app = create_app()
+
+
+def backfill_similarity_scores(batch_size=1000, recompute=False):
+    """
+    Store similarity_score for speech error records that do not have one yet
+    (or for every record with --recompute), one batch per round trip
+    """
+    with app.app_context():
+        with db.engine.begin() as connection:
+            updated = backfill_error_similarity(
+                connection, batch_size=batch_size, recompute=recompute
+            )
+        print(f"Similarity score stored for {updated} speech error records")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backfill speech_error_records.similarity_score"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Records per UPDATE batch"
+    )
+    parser.add_argument(
+        "--recompute",
+        action="store_true",
+        help="Recompute the score for every record, not only missing ones",
+    )
+    args = parser.parse_args()
+    backfill_similarity_scores(batch_size=args.batch_size, recompute=args.recompute)
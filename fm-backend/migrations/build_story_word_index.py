@@ -0,0 +1,25 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.db import db
+from app.services.story_index import rebuild_index
+
+app = create_app()
+
+
+def build_story_word_index():
+    """
+    Create the story_word_index table and index all saved stories
+    """
+    with app.app_context():
+        db.create_all()
+        indexed = rebuild_index()
+        print(f"Story word index built for {indexed} stories")
+
+
+if __name__ == "__main__":
+    build_story_word_index()
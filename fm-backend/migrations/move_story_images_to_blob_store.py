@@ -0,0 +1,79 @@
+import argparse
+import base64
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import text
+
+from app import create_app
+from app.db import db
+from app.models.user import StoryImage
+from app.services.blob_store import get_blob_store
+
+
+def move_story_images(batch_size=50, vacuum=False, app=None):
+    """
+    Move base64 image_data out of the story_images table into the blob store
+    Each batch is committed separately so the tool can be stopped and resumed
+    Returns (moved, failed)
+    """
+    app = app or create_app()
+    with app.app_context():
+        store = get_blob_store()
+
+        moved = 0
+        failed = 0
+        last_id = 0
+        while True:
+            images = (
+                StoryImage.query.filter(
+                    StoryImage.id > last_id,
+                    StoryImage.blob_hash.is_(None),
+                    StoryImage.image_data != "",
+                )
+                .order_by(StoryImage.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not images:
+                break
+
+            for image in images:
+                try:
+                    image.blob_hash = store.put(base64.b64decode(image.image_data))
+                    image.image_data = ""
+                    moved += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"Skipping story image {image.id}: {str(e)}")
+
+            db.session.commit()
+            last_id = images[-1].id
+            print(f"Moved {moved} images so far...")
+
+        print(f"Done: {moved} images moved, {failed} skipped")
+
+        if vacuum and db.engine.dialect.name == "sqlite":
+            # SQLite لا يعيد المساحة المحررة للقرص إلا بعد VACUUM
+            print("Running VACUUM...")
+            with db.engine.connect() as connection:
+                connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+                    text("VACUUM")
+                )
+
+        return moved, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move story images from the database to the blob store"
+    )
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument(
+        "--vacuum", action="store_true", help="Reclaim database space afterwards"
+    )
+    args = parser.parse_args()
+    move_story_images(batch_size=args.batch_size, vacuum=args.vacuum)
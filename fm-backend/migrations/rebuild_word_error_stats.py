@@ -0,0 +1,25 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.db import db
+from app.services.word_error_stats import rebuild_word_error_stats
+
+app = create_app()
+
+
+def rebuild():
+    """
+    Rebuild user_word_error_stats from speech_error_records
+    """
+    with app.app_context():
+        with db.engine.begin() as connection:
+            rows = rebuild_word_error_stats(connection)
+        print(f"User word error stats rebuilt: {rows} rows")
+
+
+if __name__ == "__main__":
+    rebuild()
@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.db import db
+from app.services.schema_migrations import reclassify_speech_errors
+from app.services.word_error_stats import rebuild_word_error_stats
+
+app = create_app()
+
+
+def reclassify(batch_size=1000, dry_run=False):
+    """
+    Recompute error_category for every speech error record with the
+    alignment-based phonetic classifier
+    """
+    with app.app_context():
+        with db.engine.begin() as connection:
+            report = reclassify_speech_errors(
+                connection, batch_size=batch_size, apply=not dry_run
+            )
+            # The per-word category histograms follow the new categories
+            if report["changed"] and not dry_run:
+                rebuild_word_error_stats(connection)
+
+        action = "would change" if dry_run else "changed"
+        print(
+            f"Checked {report['checked']} speech error records: "
+            f"{report['changed']} categories {action}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reclassify speech_error_records.error_category"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Records per batch"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only count changes, do not write"
+    )
+    args = parser.parse_args()
+    reclassify(batch_size=args.batch_size, dry_run=args.dry_run)
@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.services.progress_counters import reconcile_counters
+
+app = create_app()
+
+
+def reconcile_progress_counters(dry_run=False):
+    """
+    Rebuild lesson_count and completed_lessons from the source tables
+    and print every counter that had drifted
+    """
+    with app.app_context():
+        report = reconcile_counters(apply=not dry_run)
+
+        for drift in report["drift"]:
+            print(f"Drift: {drift}")
+
+        action = "found" if dry_run else "fixed"
+        print(
+            f"Checked {report['levels_checked']} levels and "
+            f"{report['progress_checked']} level progress rows: "
+            f"{len(report['drift'])} counters {action}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reconcile denormalized learning progress counters"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report drift, do not fix it"
+    )
+    args = parser.parse_args()
+    reconcile_progress_counters(dry_run=args.dry_run)
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.services.schema_migrations import (
+    explain_hot_queries,
+    migration_status,
+    upgrade_schema,
+)
+
+# تطبيق الترحيلات المعلقة قبل النشر (create_app لا يطبقها إلا مع
+# SCHEMA_UPGRADE_ON_START)، وعرض حالتها وخطط تنفيذ الاستعلامات الساخنة.
+# التطبيق هنا يرحل عند إنشائه لأن بدء التطبيق يحتاج المخطط الحالي
+app = create_app({"SCHEMA_UPGRADE_ON_START": True})
+
+
+def upgrade():
+    with app.app_context():
+        applied = app.extensions["schema_migrations"] + upgrade_schema()
+        print(f"Done: {len(applied)} migrations applied {applied}")
+
+
+def status():
+    with app.app_context():
+        for version, description, applied in migration_status():
+            state = "applied" if applied else "pending"
+            print(f"{version} [{state}] {description}")
+
+
+def explain():
+    """
+    Print the query plan of every hot query
+    Returns the names of the queries that still scan the whole table
+    """
+    with app.app_context():
+        plans = explain_hot_queries()
+
+    if not plans:
+        print("EXPLAIN QUERY PLAN is only available on SQLite")
+        return []
+
+    scans = []
+    for name, result in plans.items():
+        if not result["uses_index"]:
+            scans.append(name)
+        print(f"{name}: {'index' if result['uses_index'] else 'FULL SCAN'}")
+        for step in result["plan"]:
+            print(f"    {step}")
+    return scans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versioned schema migrations")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="upgrade",
+        choices=["upgrade", "status", "explain"],
+        help="upgrade (default), list migration status, or show hot query plans",
+    )
+    args = parser.parse_args()
+
+    if args.command == "status":
+        status()
+    elif args.command == "explain":
+        # Non-zero exit code when a hot query is still a full table scan
+        sys.exit(1 if explain() else 0)
+    else:
+        upgrade()
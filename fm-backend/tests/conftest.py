@@ -0,0 +1,25 @@
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """إنشاء تطبيق بقاعدة بيانات ومسارات تخزين مستقلة داخل مجلد مؤقت"""
+
+    def factory(name="app"):
+        path = tmp_path / name
+        path.mkdir()
+        return create_app(
+            {
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path / 'app.sqlite'}",
+                "UPLOAD_FOLDER": str(path / "uploads"),
+                "STORY_CACHE_PATH": str(path / "story_cache.sqlite"),
+                "BLOB_STORE_PATH": str(path / "blobs"),
+                "PROGRESS_CACHE_PATH": str(path / "progress_cache.sqlite"),
+                "TARGET_WORDS_CACHE_PATH": str(path / "target_words_cache.sqlite"),
+            }
+        )
+
+    return factory
@@ -0,0 +1,151 @@
+"""
+مخزن الصور المعنون بالمحتوى: الكتابة وإزالة التكرار، ومسار التخزين الافتراضي،
+وخدمة الملفات مع ETag (304) والنطاقات (206)، وأداة نقل الصور القديمة
+"""
+
+import base64
+import json
+import os
+
+import pytest
+
+from app.db import db
+from app.models.user import AIGeneratedStory, StoryImage, User
+from app.services.blob_store import BlobStore, get_blob_store, sniff_mimetype
+from migrations.move_story_images_to_blob_store import move_story_images
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"image-bytes" * 100
+
+
+def test_put_is_content_addressed_and_deduplicated(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    blob_hash = store.put(PNG)
+
+    assert store.put(PNG) == blob_hash
+    path = store.path_for(blob_hash)
+    assert path == os.path.join(
+        str(tmp_path / "blobs"), blob_hash[:2], blob_hash[2:4], blob_hash
+    )
+    assert store.read(blob_hash) == PNG
+    assert store.mimetype(blob_hash) == "image/png"
+    # لا ملفات مؤقتة متبقية بعد الكتابة الذرية
+    assert os.listdir(os.path.dirname(path)) == [blob_hash]
+
+
+def test_invalid_hash_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        BlobStore(tmp_path).path_for("../../etc/passwd")
+
+
+def test_sniff_mimetype():
+    assert sniff_mimetype(b"\xff\xd8\xff\xe0") == "image/jpeg"
+    assert sniff_mimetype(b"RIFF\x00\x00\x00\x00WEBP") == "image/webp"
+    assert sniff_mimetype(b"plain") == "application/octet-stream"
+
+
+def test_default_store_is_absolute_inside_instance(make_app, monkeypatch):
+    app = make_app()
+    app.config["BLOB_STORE_PATH"] = None
+    monkeypatch.delenv("BLOB_STORE_PATH", raising=False)
+    with app.app_context():
+        assert get_blob_store().root == os.path.join(app.instance_path, "blobs")
+
+
+def test_relative_path_is_served_from_where_it_was_written(
+    make_app, tmp_path, monkeypatch
+):
+    app = make_app()
+    app.config["BLOB_STORE_PATH"] = "relative-blobs"
+    monkeypatch.chdir(tmp_path)
+    with app.app_context():
+        blob_hash = get_blob_store().put(PNG)
+
+    response = app.test_client().get(f"/api/images/blob/{blob_hash}")
+    assert response.status_code == 200
+    assert response.data == PNG
+
+
+@pytest.fixture
+def blob_app(make_app):
+    app = make_app()
+    with app.app_context():
+        app.config["BLOB_HASH"] = get_blob_store().put(PNG)
+    return app
+
+
+def test_blob_is_served_as_immutable_with_etag(blob_app):
+    blob_hash = blob_app.config["BLOB_HASH"]
+    client = blob_app.test_client()
+
+    response = client.get(f"/api/images/blob/{blob_hash}")
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    assert response.get_etag()[0] == blob_hash
+    assert response.cache_control.immutable
+    assert response.cache_control.public
+
+    response = client.get(
+        f"/api/images/blob/{blob_hash}", headers={"If-None-Match": f'"{blob_hash}"'}
+    )
+    assert response.status_code == 304
+    assert not response.data
+
+
+def test_blob_range_request(blob_app):
+    blob_hash = blob_app.config["BLOB_HASH"]
+    response = blob_app.test_client().get(
+        f"/api/images/blob/{blob_hash}", headers={"Range": "bytes=0-7"}
+    )
+    assert response.status_code == 206
+    assert response.data == PNG[:8]
+
+
+def test_invalid_and_missing_blobs(blob_app):
+    client = blob_app.test_client()
+    assert client.get("/api/images/blob/not-a-hash").status_code == 400
+    assert client.get(f"/api/images/blob/{'0' * 64}").status_code == 404
+
+
+def test_move_story_images_to_blob_store(make_app):
+    app = make_app()
+    with app.app_context():
+        user = User(username="owner", email="owner@example.com")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.flush()
+        story = AIGeneratedStory(
+            user_id=user.id,
+            title="قصة",
+            content="نص القصة",
+            highlighted_content="نص القصة",
+            theme="الطبيعة",
+            difficulty="intermediate",
+            target_words=json.dumps([]),
+            vocabulary="[]",
+            questions="[]",
+        )
+        db.session.add(story)
+        db.session.flush()
+        db.session.add_all(
+            [
+                StoryImage(
+                    story_id=story.id,
+                    image_data=base64.b64encode(PNG).decode(),
+                    position=0,
+                ),
+                StoryImage(story_id=story.id, image_data="not base64!", position=1),
+            ]
+        )
+        db.session.commit()
+
+    assert move_story_images(batch_size=1, app=app) == (1, 1)
+
+    with app.app_context():
+        moved, skipped = StoryImage.query.order_by(StoryImage.position).all()
+        assert moved.image_data == ""
+        assert get_blob_store().read(moved.blob_hash) == PNG
+        assert skipped.blob_hash is None
+        assert moved.to_dict()["image_url"] == f"/api/images/blob/{moved.blob_hash}"
+
+    # تشغيل الأداة مرة أخرى لا يعيد نقل الصور المنقولة
+    assert move_story_images(app=app) == (0, 1)
@@ -0,0 +1,72 @@
+"""
+الاستعلامات الساخنة تمسح الجداول كاملة قبل الترحيلات وتبحث عبر الفهارس بعدها
+"""
+
+from sqlalchemy import text
+
+from app.db import db
+from app.services.schema_migrations import (
+    explain_hot_queries,
+    plan_uses_index,
+    upgrade_schema,
+)
+
+# الفهارس التي تضيفها الترحيلات 0001 و 0003 و 0004 و 0007
+MIGRATION_INDEXES = (
+    "ix_story_images_blob_hash",
+    "ix_ai_generated_stories_user_created",
+    "ix_speech_activities_user_created",
+    "ix_speech_error_records_user_word",
+    "uq_learning_progress_key",
+    "ix_speech_error_records_user_normalized",
+)
+
+# الاستعلامات التي لا يخدمها فهرس آخر من create_all بدون هذه الفهارس
+SCANNED_BEFORE_MIGRATIONS = (
+    "speech activities by date",
+    "speech errors by word",
+    "user stories page",
+)
+
+
+def _reset_to_unmigrated(app):
+    """حذف فهارس الترحيلات وسجلها كأن قاعدة البيانات لم ترحل بعد"""
+    with app.app_context(), db.engine.begin() as connection:
+        for index in MIGRATION_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        connection.execute(text("DELETE FROM schema_migrations"))
+
+
+def test_full_scan_with_covering_index_is_not_indexed():
+    assert not plan_uses_index(
+        [
+            "SCAN speech_error_records USING COVERING INDEX ix_speech_error_records_user_word"
+        ]
+    )
+    assert plan_uses_index(
+        [
+            "SEARCH speech_activities USING INDEX ix_speech_activities_user_created (user_id=?)"
+        ]
+    )
+    assert not plan_uses_index(
+        ["SEARCH users USING INTEGER PRIMARY KEY (rowid=?)", "SCAN speech_activities"]
+    )
+
+
+def test_hot_queries_scan_before_and_search_after_migrations(make_app):
+    app = make_app()
+    _reset_to_unmigrated(app)
+
+    with app.app_context():
+        before = explain_hot_queries()
+    for name in SCANNED_BEFORE_MIGRATIONS:
+        assert not before[name]["uses_index"], before[name]["plan"]
+        assert before[name]["scans"], before[name]["plan"]
+
+    with app.app_context():
+        upgrade_schema()
+        after = explain_hot_queries()
+    for name, result in after.items():
+        assert result["uses_index"], (name, result["plan"])
+        assert not result["scans"], (name, result["plan"])
+        assert any(step.startswith("SEARCH") for step in result["plan"])
@@ -0,0 +1,129 @@
+"""
+تحديث تقدم الدروس فرديًا أو دفعة: إنشاء سجل المستوى الناقص، وحساب اكتماله،
+ومكافأة المستخدم مرة واحدة بنفس القاعدة في المسارين
+"""
+
+import pytest
+
+from app.db import db
+from app.models.user import LearningLevel, LearningProgress, Lesson, User
+
+
+@pytest.fixture
+def level_app(make_app):
+    app = make_app()
+    with app.app_context():
+        level = LearningLevel.query.filter_by(order=2).first()
+        lessons = [
+            Lesson(
+                title=f"درس {order}",
+                description="درس اختبار",
+                content="محتوى",
+                order=order,
+                level_id=level.id,
+            )
+            for order in (1, 2)
+        ]
+        user = User(username="learner", email="learner@example.com")
+        user.set_password("secret")
+        db.session.add_all([*lessons, user])
+        db.session.commit()
+        app.config["IDS"] = {
+            "user": user.id,
+            "level": level.id,
+            "lessons": [lesson.id for lesson in lessons],
+        }
+    return app
+
+
+def _complete_one(app, lesson_id, batch):
+    ids = app.config["IDS"]
+    update = {"level_id": ids["level"], "lesson_id": lesson_id, "progress": 100}
+    client = app.test_client()
+    if batch:
+        return client.post(
+            "/api/progress/lesson/batch",
+            json={"user_id": ids["user"], "updates": [dict(update, completed=True)]},
+        )
+    return client.post(
+        "/api/progress/lesson/update",
+        json=dict(update, user_id=ids["user"], completed=True),
+    )
+
+
+def _level_state(app):
+    ids = app.config["IDS"]
+    with app.app_context():
+        level_progress = LearningProgress.query.filter_by(
+            user_id=ids["user"], level_id=ids["level"], lesson_id=None
+        ).one()
+        user = User.query.get(ids["user"])
+        return level_progress.to_dict(), level_progress.completed_lessons, user
+
+
+@pytest.mark.parametrize("batch", [False, True], ids=["single", "batch"])
+def test_missing_level_row_is_created_and_completed(level_app, batch):
+    first, second = level_app.config["IDS"]["lessons"]
+
+    response = _complete_one(level_app, first, batch)
+    assert response.status_code == 200, response.get_json()
+    level, completed, user = _level_state(level_app)
+    assert completed == 1
+    assert level["progress"] == 50.0
+    assert not level["is_completed"]
+    assert user.total_stars == 0
+
+    response = _complete_one(level_app, second, batch)
+    assert response.status_code == 200, response.get_json()
+    level, completed, user = _level_state(level_app)
+    assert completed == 2
+    assert level["progress"] == 100.0
+    assert level["is_completed"]
+    assert user.total_stars == 1
+    assert user.completed_lessons == 1
+
+
+@pytest.mark.parametrize("batch", [False, True], ids=["single", "batch"])
+def test_completed_level_is_rewarded_once(level_app, batch):
+    for lesson_id in level_app.config["IDS"]["lessons"]:
+        _complete_one(level_app, lesson_id, batch)
+    # إعادة إكمال درس في مستوى مكتمل لا تمنح نجمة أخرى
+    response = _complete_one(level_app, level_app.config["IDS"]["lessons"][0], batch)
+    assert response.status_code == 200
+    assert _level_state(level_app)[2].total_stars == 1
+
+
+def test_batch_returns_created_level(level_app):
+    ids = level_app.config["IDS"]
+    response = level_app.test_client().post(
+        "/api/progress/lesson/batch",
+        json={
+            "user_id": ids["user"],
+            "updates": [
+                {
+                    "level_id": str(ids["level"]),
+                    "lesson_id": str(lesson_id),
+                    "completed": True,
+                }
+                for lesson_id in ids["lessons"]
+            ],
+        },
+    )
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()["data"]
+    assert [level["level_id"] for level in data["levels"]] == [ids["level"]]
+    assert data["levels"][0]["is_completed"]
+    assert data["user"]["total_stars"] == 1
+
+
+def test_batch_rejects_unknown_level(level_app):
+    ids = level_app.config["IDS"]
+    response = level_app.test_client().post(
+        "/api/progress/lesson/batch",
+        json={
+            "user_id": ids["user"],
+            "updates": [{"level_id": 9999, "lesson_id": ids["lessons"][0]}],
+        },
+    )
+    assert response.status_code == 404
+    assert response.get_json()["level_ids"] == [9999]
@@ -0,0 +1,198 @@
+"""
+المخزن المؤجل لتحديثات موضع الدروس: الدمج، والكتابة الفورية عند الإكمال،
+وعزل التحديث الفاسد، وقراءة المستخدم لآخر موضع كتبه
+"""
+
+import pytest
+
+from app.db import db
+from app.models.user import LearningLevel, LearningProgress, Lesson, User
+from app.services.progress_buffer import ProgressWriteBuffer, progress_buffer
+
+
+@pytest.fixture
+def lesson_app(make_app):
+    app = make_app()
+    with app.app_context():
+        level = LearningLevel.query.order_by(LearningLevel.order).first()
+        lesson = Lesson(
+            title="درس",
+            description="درس اختبار",
+            content="محتوى",
+            order=1,
+            level_id=level.id,
+        )
+        users = [
+            User(username=name, email=f"{name}@example.com") for name in ("a", "b")
+        ]
+        for user in users:
+            user.set_password("secret")
+        db.session.add_all([lesson, *users])
+        db.session.commit()
+        app.config["IDS"] = {
+            "level": level.id,
+            "lesson": lesson.id,
+            "users": [user.id for user in users],
+        }
+    return app
+
+
+@pytest.fixture
+def buffer(lesson_app):
+    # مخزن مستقل بفترة طويلة حتى لا يكتب الخيط الخلفي أثناء الاختبار
+    buffer = ProgressWriteBuffer(flush_interval=3600, max_attempts=2)
+    buffer.init_app(lesson_app)
+    return buffer
+
+
+def _lesson_record(app, user_id):
+    with app.app_context():
+        return LearningProgress.query.filter_by(
+            user_id=user_id, lesson_id=app.config["IDS"]["lesson"]
+        ).first()
+
+
+def test_updates_to_one_lesson_are_coalesced(lesson_app, buffer):
+    ids = lesson_app.config["IDS"]
+    user_id = ids["users"][0]
+    for step in range(1, 4):
+        buffer.record(
+            user_id,
+            ids["level"],
+            ids["lesson"],
+            {
+                "progress": step * 10,
+                "current_step": step,
+                "last_position": {"step": step},
+            },
+        )
+
+    assert buffer.flush() == 1
+    stats = buffer.stats()
+    assert stats["rows_written"] == 1
+    assert stats["flushed_updates"] == 3
+    assert stats["pending"] == 0
+
+    record = _lesson_record(lesson_app, user_id)
+    assert record.current_step == 3
+    assert record.progress == 30.0
+    assert record.last_position == '{"step": 3}'
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"progress": {"x": 1}},
+        {"progress": "abc"},
+        {"progress": True},
+        {"progress": 10, "current_step": 1.5},
+        {"progress": 10, "last_position": ["not", "an", "object"]},
+        {"progress": 10, "last_position": "{not json"},
+    ],
+)
+def test_invalid_fields_are_rejected(lesson_app, buffer, data):
+    ids = lesson_app.config["IDS"]
+    with pytest.raises(ValueError):
+        buffer.record(ids["users"][0], ids["level"], ids["lesson"], data)
+    assert buffer.stats()["pending"] == 0
+
+
+def test_numeric_strings_are_converted(lesson_app, buffer):
+    ids = lesson_app.config["IDS"]
+    fields = buffer.record(
+        ids["users"][0],
+        ids["level"],
+        ids["lesson"],
+        {"progress": "12.5", "current_step": "2"},
+    )
+    assert fields == {"progress": 12.5, "current_step": 2}
+
+
+def test_poison_entry_does_not_block_other_users(lesson_app, buffer):
+    ids = lesson_app.config["IDS"]
+    good_user, bad_user = ids["users"]
+    buffer.record(good_user, ids["level"], ids["lesson"], {"progress": 40})
+    buffer.record(bad_user, ids["level"], ids["lesson"], {"progress": 10})
+    # قيمة وصلت إلى المخزن دون تحقق (مثل بيانات مخزن أقدم)
+    buffer._pending[(bad_user, ids["lesson"])]["fields"]["progress"] = {"x": 1}
+
+    assert buffer.flush() == 1
+    assert _lesson_record(lesson_app, good_user).progress == 40.0
+    assert _lesson_record(lesson_app, bad_user) is None
+    stats = buffer.stats()
+    assert stats["pending"] == 1
+    assert stats["failed_rows"] == 1
+
+    # بعد max_attempts محاولة يسقط التحديث بدل إعادته للأبد
+    assert buffer.flush() == 0
+    stats = buffer.stats()
+    assert stats["pending"] == 0
+    assert stats["dropped"] == 1
+
+
+def test_multiple_workers_disable_buffering(lesson_app, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    buffer = ProgressWriteBuffer(flush_interval=3600)
+    buffer.init_app(lesson_app)
+    assert not buffer.enabled
+
+
+def _post_lesson_update(app, user_id, **fields):
+    ids = app.config["IDS"]
+    return app.test_client().post(
+        "/api/progress/lesson/update",
+        json=dict(
+            fields, user_id=user_id, level_id=ids["level"], lesson_id=ids["lesson"]
+        ),
+    )
+
+
+def test_invalid_buffered_update_returns_400(lesson_app):
+    user_id = lesson_app.config["IDS"]["users"][0]
+    response = _post_lesson_update(lesson_app, user_id, progress={"x": 1})
+    assert response.status_code == 400
+    assert not progress_buffer.has_pending(user_id)
+
+
+def test_completed_update_flushes_pending_positions(lesson_app):
+    user_id = lesson_app.config["IDS"]["users"][0]
+    response = _post_lesson_update(lesson_app, user_id, progress=50, current_step=4)
+    assert response.get_json()["buffered"]
+    assert progress_buffer.has_pending(user_id)
+
+    response = _post_lesson_update(lesson_app, user_id, progress=100, completed=True)
+    assert response.status_code == 200
+    assert not response.get_json().get("buffered")
+    assert not progress_buffer.has_pending(user_id)
+
+    record = _lesson_record(lesson_app, user_id)
+    assert record.is_completed
+    assert record.current_step == 4
+    assert record.progress == 100.0
+
+
+def test_reads_see_buffered_positions(lesson_app):
+    ids = lesson_app.config["IDS"]
+    user_id = ids["users"][0]
+    client = lesson_app.test_client()
+    client.get(f"/api/progress/user/{user_id}")
+
+    response = _post_lesson_update(
+        lesson_app, user_id, progress=60, current_step=3, last_position={"page": 7}
+    )
+    assert response.get_json()["buffered"]
+
+    levels = client.get(f"/api/progress/user/{user_id}").get_json()
+    lesson = next(
+        lesson
+        for level in levels
+        for lesson in level["lessons"]
+        if lesson["lesson_id"] == ids["lesson"]
+    )
+    assert lesson["current_step"] == 3
+    assert lesson["last_position"] == {"page": 7}
+
+    lesson = client.get(
+        f"/api/progress/lesson/{ids['lesson']}/user/{user_id}"
+    ).get_json()
+    assert lesson["progress"] == 60.0
@@ -0,0 +1,73 @@
+"""
+أجيال لقطات التقدم: منفصلة عن ذاكرة اللقطات فلا يعيدها الإخلاء إلى قيمتها
+الأولى، ولا تدخل في إحصائيات الإصابة، وتتشارك بين العمليات في الطبقة المشتركة
+"""
+
+import pytest
+
+from app.services import progress_cache
+from app.services.progress_cache import (
+    GenerationStore,
+    get_progress_cache,
+    invalidate_progress_snapshot,
+    progress_generation,
+    store_progress_snapshot,
+)
+from app.services.response_cache import ResponseCache
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    """ذاكرة لقطات في الذاكرة تتسع للقطتين فقط"""
+    monkeypatch.setattr(
+        progress_cache, "_progress_cache", ResponseCache(None, memory_entries=2)
+    )
+    monkeypatch.setattr(progress_cache, "_generations", GenerationStore())
+    return get_progress_cache()
+
+
+def test_eviction_does_not_revive_an_old_snapshot(small_cache):
+    # بناء لقطة يبدأ، ثم يحدث تحديث قبل تخزينها
+    generation = progress_generation(1)
+    invalidate_progress_snapshot(1)
+
+    # لقطات مستخدمين آخرين تملأ الذاكرة وتخرج ما قبلها
+    for user_id in range(2, 10):
+        store_progress_snapshot(
+            user_id, {"user": user_id}, progress_generation(user_id)
+        )
+
+    store_progress_snapshot(1, {"stale": True}, generation)
+    assert progress_cache.get_progress_snapshot(1) is None
+
+
+def test_only_snapshot_lookups_are_counted(small_cache):
+    for _ in range(3):
+        progress_generation(1)
+        invalidate_progress_snapshot(1)
+    progress_cache.get_progress_snapshot(1)
+
+    stats = small_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["stores"] == 0
+
+
+def test_shared_generations_are_seen_by_other_processes(tmp_path):
+    path = str(tmp_path / "progress_cache.sqlite")
+    first, second = GenerationStore(path), GenerationStore(path)
+
+    assert first.get("progress-generation:1") is None
+    token = second.bump("progress-generation:1")
+    assert first.get("progress-generation:1") == token
+
+
+def test_shared_tier_is_the_default(make_app, monkeypatch):
+    monkeypatch.delenv("PROGRESS_CACHE_SHARED", raising=False)
+    app = make_app()
+    with app.app_context():
+        assert (
+            progress_cache._progress_cache_path() == app.config["PROGRESS_CACHE_PATH"]
+        )
+    monkeypatch.setenv("PROGRESS_CACHE_SHARED", "0")
+    with app.app_context():
+        assert progress_cache._progress_cache_path() is None
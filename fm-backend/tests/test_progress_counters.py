@@ -0,0 +1,148 @@
+"""
+عدادات المستويات (lesson_count و completed_lessons) تحدث مع تغير الدروس
+وسجلات التقدم في نفس المعاملة، وتبقى مطابقة لما يحسبه reconcile_counters
+"""
+
+import pytest
+
+from app.db import db
+from app.models.user import LearningLevel, LearningProgress, Lesson, User
+from app.services.progress_counters import reconcile_counters
+
+
+@pytest.fixture
+def counters_app(make_app):
+    app = make_app()
+    with app.app_context():
+        first, second = LearningLevel.query.order_by(LearningLevel.order).limit(2)
+        users = [User(username=name, email=f"{name}@example.com") for name in "ab"]
+        for user in users:
+            user.set_password("secret")
+        db.session.add_all(users)
+        db.session.commit()
+        app.config["IDS"] = {
+            "levels": (first.id, second.id),
+            "users": [user.id for user in users],
+        }
+    return app
+
+
+def _add_lesson(level_id, order=1):
+    lesson = Lesson(
+        title=f"درس {order}",
+        description="درس اختبار",
+        content="محتوى",
+        order=order,
+        level_id=level_id,
+    )
+    db.session.add(lesson)
+    db.session.commit()
+    return lesson
+
+
+def _progress(user_id, level_id, lesson_id=None, is_completed=False):
+    record = LearningProgress(
+        user_id=user_id,
+        level_id=level_id,
+        lesson_id=lesson_id,
+        is_locked=False,
+        is_completed=is_completed,
+    )
+    db.session.add(record)
+    db.session.commit()
+    return record
+
+
+def _completed(user_id, level_id):
+    return (
+        LearningProgress.query.filter_by(
+            user_id=user_id, level_id=level_id, lesson_id=None
+        )
+        .one()
+        .completed_lessons
+    )
+
+
+def _lesson_count(level_id):
+    return db.session.get(LearningLevel, level_id).lesson_count
+
+
+def _assert_no_drift():
+    report = reconcile_counters(apply=False)
+    assert report["drift"] == []
+
+
+def test_lesson_count_follows_inserts_and_deletes(counters_app):
+    level_id = counters_app.config["IDS"]["levels"][0]
+    with counters_app.app_context():
+        lessons = [_add_lesson(level_id, order) for order in (1, 2)]
+        assert _lesson_count(level_id) == 2
+
+        db.session.delete(lessons[0])
+        db.session.commit()
+        db.session.expire_all()
+        assert _lesson_count(level_id) == 1
+        _assert_no_drift()
+
+
+def test_completed_lessons_follow_completion(counters_app):
+    level_id = counters_app.config["IDS"]["levels"][0]
+    user_id = counters_app.config["IDS"]["users"][0]
+    with counters_app.app_context():
+        lesson = _add_lesson(level_id)
+        _progress(user_id, level_id)
+        record = _progress(user_id, level_id, lesson.id)
+        assert _completed(user_id, level_id) == 0
+
+        record.is_completed = True
+        db.session.commit()
+        db.session.expire_all()
+        assert _completed(user_id, level_id) == 1
+
+        record.is_completed = False
+        db.session.commit()
+        db.session.expire_all()
+        assert _completed(user_id, level_id) == 0
+        _assert_no_drift()
+
+
+def test_level_row_created_after_completion_starts_counted(counters_app):
+    level_id = counters_app.config["IDS"]["levels"][0]
+    user_id = counters_app.config["IDS"]["users"][0]
+    with counters_app.app_context():
+        for order in (1, 2):
+            lesson = _add_lesson(level_id, order)
+            _progress(user_id, level_id, lesson.id, is_completed=True)
+        _progress(user_id, level_id)
+        assert _completed(user_id, level_id) == 2
+        _assert_no_drift()
+
+
+def test_moving_a_lesson_moves_its_completed_counts(counters_app):
+    old_level, new_level = counters_app.config["IDS"]["levels"]
+    finished, started = counters_app.config["IDS"]["users"]
+    with counters_app.app_context():
+        lesson = _add_lesson(old_level)
+        _add_lesson(new_level)
+        for user_id in (finished, started):
+            _progress(user_id, old_level)
+            _progress(user_id, new_level)
+        _progress(finished, old_level, lesson.id, is_completed=True)
+        _progress(started, old_level, lesson.id)
+        assert _completed(finished, old_level) == 1
+
+        lesson.level_id = new_level
+        db.session.commit()
+        db.session.expire_all()
+
+        assert _lesson_count(old_level) == 0
+        assert _lesson_count(new_level) == 2
+        assert _completed(finished, old_level) == 0
+        assert _completed(finished, new_level) == 1
+        assert _completed(started, new_level) == 0
+        # سجلات تقدم الدرس تنتقل معه إلى المستوى الجديد
+        assert {
+            record.level_id
+            for record in LearningProgress.query.filter_by(lesson_id=lesson.id)
+        } == {new_level}
+        _assert_no_drift()
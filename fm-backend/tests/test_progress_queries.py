@@ -0,0 +1,92 @@
+"""
+عدد استعلامات GET /api/progress/user/<id> ثابت مهما زاد عدد الدروس،
+سواء كانت سجلات التقدم موجودة أو أنشئت دفعة واحدة في نفس الطلب
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.db import db
+from app.models.user import LearningLevel, Lesson, User
+from app.services.progress_cache import invalidate_progress_snapshot
+
+
+def _seed_lessons(app, lesson_count):
+    with app.app_context():
+        levels = LearningLevel.query.order_by(LearningLevel.order).all()
+        db.session.add_all(
+            Lesson(
+                title=f"درس {i + 1}",
+                description="درس اختبار",
+                content="محتوى",
+                order=i // len(levels) + 1,
+                level_id=levels[i % len(levels)].id,
+            )
+            for i in range(lesson_count)
+        )
+        db.session.commit()
+
+
+def _new_user(app, name):
+    with app.app_context():
+        user = User(username=name, email=f"{name}@example.com")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def _count_progress_queries(app, user_id):
+    """عدد العبارات المنفذة في طلب واحد بدون لقطة مخزنة"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        invalidate_progress_snapshot(user_id)
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            response = app.test_client().get(f"/api/progress/user/{user_id}")
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+@pytest.fixture
+def progress_apps(make_app):
+    apps = {}
+    for lesson_count in (30, 120):
+        apps[lesson_count] = make_app(f"lessons-{lesson_count}")
+        _seed_lessons(apps[lesson_count], lesson_count)
+    return apps
+
+
+def _lesson_total(data):
+    return sum(len(level["lessons"]) for level in data)
+
+
+def test_query_count_constant_as_lessons_grow(progress_apps):
+    counts = {}
+    for lesson_count, app in progress_apps.items():
+        user_id = _new_user(app, "reader")
+        # الطلب الأول ينشئ السجلات الناقصة، والثاني يقرأ سجلات موجودة فقط
+        _count_progress_queries(app, user_id)
+        counts[lesson_count], data = _count_progress_queries(app, user_id)
+        assert _lesson_total(data) == lesson_count
+
+    assert counts[30] == counts[120]
+
+
+def test_backfill_query_count_constant_as_lessons_grow(progress_apps):
+    counts = {}
+    for lesson_count, app in progress_apps.items():
+        user_id = _new_user(app, "newcomer")
+        # مستخدم بلا سجلات تقدم: كل السجلات تنشأ بإدراج جماعي واحد
+        counts[lesson_count], data = _count_progress_queries(app, user_id)
+        assert _lesson_total(data) == lesson_count
+
+    assert counts[30] == counts[120]
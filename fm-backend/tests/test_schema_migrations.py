@@ -0,0 +1,64 @@
+"""
+بدء التطبيق لا يشغل إعادة حساب الترحيلات: القاعدة الجديدة تسجل كمرحلة،
+والقاعدة القائمة ترحل فقط مع SCHEMA_UPGRADE_ON_START
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from app import create_app
+from app.db import db
+from app.services.schema_migrations import MIGRATIONS, migration_status
+
+
+def _config(path, **overrides):
+    return dict(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path / 'app.sqlite'}",
+            "UPLOAD_FOLDER": str(path / "uploads"),
+            "STORY_CACHE_PATH": str(path / "story_cache.sqlite"),
+            "BLOB_STORE_PATH": str(path / "blobs"),
+            "PROGRESS_CACHE_PATH": str(path / "progress_cache.sqlite"),
+            "TARGET_WORDS_CACHE_PATH": str(path / "target_words_cache.sqlite"),
+        },
+        **overrides,
+    )
+
+
+def _forget(app, version):
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(
+            text("DELETE FROM schema_migrations WHERE version = :version"),
+            {"version": version},
+        )
+
+
+def _pending(app):
+    with app.app_context():
+        return [version for version, _, applied in migration_status() if not applied]
+
+
+def test_new_database_is_stamped_without_running_migrations(make_app):
+    app = make_app()
+    assert app.extensions["schema_migrations"] == []
+    assert _pending(app) == []
+
+
+def test_existing_database_is_not_upgraded_on_start_by_default(
+    tmp_path, monkeypatch, caplog
+):
+    monkeypatch.delenv("SCHEMA_UPGRADE_ON_START", raising=False)
+    version = MIGRATIONS[-1][0]
+    _forget(create_app(_config(tmp_path)), version)
+
+    with caplog.at_level(logging.WARNING):
+        app = create_app(_config(tmp_path))
+    assert app.extensions["schema_migrations"] == []
+    assert _pending(app) == [version]
+    assert "Pending schema migrations" in caplog.text
+
+    app = create_app(_config(tmp_path, SCHEMA_UPGRADE_ON_START=True))
+    assert app.extensions["schema_migrations"] == [version]
+    assert _pending(app) == []
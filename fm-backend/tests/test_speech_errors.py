@@ -0,0 +1,54 @@
+"""
+معرف النشاط في POST /api/speech/errors يقبل النص الرقمي كما كان قبل التحقق المسبق
+"""
+
+import pytest
+
+from app.db import db
+from app.models.user import SpeechActivity, User
+
+
+@pytest.fixture
+def speech_app(make_app):
+    app = make_app()
+    with app.app_context():
+        user = User(username="reader", email="reader@example.com")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.flush()
+        activity = SpeechActivity(
+            user_id=user.id, story_id="story", original_text="ذهب الولد"
+        )
+        db.session.add(activity)
+        db.session.commit()
+        app.config["IDS"] = (user.id, activity.id)
+    return app
+
+
+def _post_errors(app, activity_id):
+    user_id, _ = app.config["IDS"]
+    return app.test_client().post(
+        "/api/speech/errors",
+        json={
+            "user_id": user_id,
+            "activity_id": activity_id,
+            "errors": [
+                {"original_word": "ذهب", "spoken_word": "زهب", "error_type": "minor"}
+            ],
+        },
+    )
+
+
+def test_numeric_string_activity_id_is_accepted(speech_app):
+    _, activity_id = speech_app.config["IDS"]
+    for value in (activity_id, str(activity_id)):
+        response = _post_errors(speech_app, value)
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()["data"]["count"] == 1
+
+
+@pytest.mark.parametrize("value", [True, "abc", None, 1.5, [1]])
+def test_invalid_activity_id_is_rejected(speech_app, value):
+    response = _post_errors(speech_app, value)
+    assert response.status_code == 400
+    assert response.get_json()["invalid"] == ["activities[0]: missing activity_id"]
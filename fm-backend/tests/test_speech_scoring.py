@@ -0,0 +1,159 @@
+"""
+تقييم القراءة على الخادم: قيم ثابتة محسوبة يدويًا بقواعد SpeechRecognition.tsx
+(calculateWordSimilarity و findWordErrors) حتى تبقى المحاذاة مطابقة للواجهة،
+ونقطتا /score و /save تعيدان نفس التقييم، وتصنيف الأخطاء بمحاذاة الحروف
+"""
+
+import pytest
+
+from app.db import db
+from app.models.user import SpeechErrorRecord, User
+from app.services.phonetic_errors import classify_errors, classify_pair
+from app.services.speech_alignment import (
+    MISSING_WORD,
+    levenshtein_ratio,
+    score_batch,
+    score_submission,
+    word_similarity,
+)
+
+
+@pytest.mark.parametrize(
+    "first, second, expected",
+    [
+        ("قلم", "قلم", 100.0),
+        # ق/ك متقاربان: تكلفة 1 من 9
+        ("قلم", "كلم", 8 / 9 * 100),
+        # س/ش أقل تقاربًا: تكلفة 2 من 9
+        ("سمك", "شمك", 7 / 9 * 100),
+        # حذف حرف: تكلفة 2 من 12، ثم خصم 5 لفرق الطول
+        ("كتاب", "كتب", 10 / 12 * 100 - 5),
+        ("قلم", "", 0.0),
+    ],
+)
+def test_word_similarity_matches_browser_formula(first, second, expected):
+    assert word_similarity(first, second) == pytest.approx(expected)
+
+
+def test_levenshtein_ratio():
+    assert levenshtein_ratio("كتاب", "كتاب") == 100.0
+    # أطول تتابع مشترك حرفان من ثلاثة
+    assert levenshtein_ratio("قلم", "قلب") == pytest.approx(2 * 200 / 6)
+    assert levenshtein_ratio("", "قلم") == 0.0
+
+
+def _alignment(result):
+    return [(word["word"], word["type"], word["matched"]) for word in result["words"]]
+
+
+def test_exact_reading():
+    result = score_submission("ذَهَبَ الولدُ إلى المدرسة", "ذهب الولد الى المدرسه")
+    assert result["accuracy"] == 100.0
+    assert result["errors"] == []
+    assert {word["type"] for word in result["words"]} == {"correct"}
+
+
+def test_substitution_and_missing_word():
+    result = score_submission("ذهب الولد الى المدرسة", "زهب الى المدرسة")
+
+    assert _alignment(result) == [
+        ("ذهب", "minor", "زهب"),
+        ("الولد", "severe", MISSING_WORD),
+        ("الي", "correct", "الي"),
+        ("المدرسه", "correct", "المدرسه"),
+    ]
+    # متوسط التشابه موزونًا بطول الكلمة (الكلمة الناقصة صفر)
+    expected = (3 * 8 / 9 * 100 + 5 * 0 + 3 * 100 + 7 * 100) / 18
+    assert result["accuracy"] == pytest.approx(expected, abs=0.01)
+    assert result["errors"] == [
+        {"original_word": "ذهب", "spoken_word": "زهب", "error_type": "minor"},
+        {"original_word": "الولد", "spoken_word": MISSING_WORD, "error_type": "severe"},
+    ]
+
+
+def test_extra_words_are_ignored():
+    result = score_submission("الولد يقرأ", "الولد الصغير يقرأ")
+    assert _alignment(result) == [
+        ("الولد", "correct", "الولد"),
+        ("يقرا", "correct", "يقرا"),
+    ]
+    assert result["accuracy"] == 100.0
+
+
+def test_empty_reading_is_all_missing():
+    result = score_submission("الولد يقرأ", "")
+    assert result["accuracy"] == 0.0
+    assert [word["type"] for word in result["words"]] == ["severe", "severe"]
+
+
+def test_batch_matches_single_scores():
+    submissions = [
+        {"original_text": "ذهب الولد", "recognized_text": "زهب الولد"},
+        {"original_text": "قلم", "recognized_text": "كلم"},
+    ]
+    assert score_batch(submissions) == [
+        score_submission(item["original_text"], item["recognized_text"])
+        for item in submissions
+    ]
+
+
+@pytest.fixture
+def speech_app(make_app):
+    app = make_app()
+    with app.app_context():
+        user = User(username="reader", email="reader@example.com")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.commit()
+        app.config["IDS"] = user.id
+    return app
+
+
+def test_score_and_save_return_the_same_result(speech_app):
+    client = speech_app.test_client()
+    texts = {
+        "original_text": "ذهب الولد الى المدرسة",
+        "recognized_text": "زهب الى المدرسة",
+    }
+
+    scored = client.post("/api/speech/score", json=texts).get_json()["data"]
+    assert scored == score_submission(texts["original_text"], texts["recognized_text"])
+
+    # بدون دقة من العميل يقيم /save القراءة ويسجل أخطاءها مرة واحدة
+    response = client.post(
+        "/api/speech/save",
+        json=dict(texts, user_id=speech_app.config["IDS"], story_id="story"),
+    )
+    assert response.status_code == 200, response.get_json()
+    saved = response.get_json()["data"]
+    assert saved["accuracy"] == scored["accuracy"]
+    assert saved["words"] == scored["words"]
+    with speech_app.app_context():
+        assert SpeechErrorRecord.query.count() == len(scored["errors"])
+
+
+@pytest.mark.parametrize(
+    "original, spoken, expected",
+    [
+        ("ذهب", "زهب", "substitution_ذ_ز_initial"),
+        ("قلم", "كلم", "substitution_ق_ك_initial"),
+        ("بحر", "بهر", "substitution_ح_ه_medial"),
+        ("حديث", "حديس", "substitution_ث_س_final"),
+        # التشكيل لا يغير الموضع ولا الطول
+        ("ذَهَبَ", "زهب", "substitution_ذ_ز_initial"),
+        # الاستبدال المعروف يظهر حتى مع حرف ناقص
+        ("ثعلب", "سلب", "substitution_ث_س_initial"),
+        ("كتاب", "كتب", "length_mismatch"),
+        ("باب", "بات", "general_pronunciation"),
+    ],
+)
+def test_classify_pair(original, spoken, expected):
+    assert classify_pair(original, spoken) == expected
+
+
+def test_classify_errors_keeps_order_and_accepts_missing_words():
+    assert classify_errors([("قلم", "كلم"), ("كتاب", None), ("باب", "بات")]) == [
+        "substitution_ق_ك_initial",
+        "length_mismatch",
+        "general_pronunciation",
+    ]
@@ -0,0 +1,96 @@
+"""
+إعادة استخدام القصص المحفوظة: الطول شرط في استعلام الفهرس نفسه،
+وإعادة الاستخدام مفعلة افتراضيًا
+"""
+
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app.db import db
+from app.models.user import AIGeneratedStory, User
+from app.services.schema_migrations import add_story_word_count
+from app.services.story_index import find_covering_story, index_story
+
+WORDS = ["مدرسة", "حديقة", "شجرة", "سماء", "قمر"]
+
+
+def _add_story(owner_id, words, filler_words):
+    content = " ".join(words + ["كلمة"] * filler_words)
+    story = AIGeneratedStory(
+        user_id=owner_id,
+        title="قصة",
+        content=content,
+        highlighted_content=content,
+        theme="الطبيعة",
+        difficulty="intermediate",
+        age_group="children",
+        target_words=json.dumps(words, ensure_ascii=False),
+        vocabulary="[]",
+        questions="[]",
+    )
+    db.session.add(story)
+    db.session.commit()
+    index_story(story)
+    return story.id
+
+
+@pytest.fixture
+def stories_app(make_app):
+    app = make_app()
+    with app.app_context():
+        owner, reader = (
+            User(username=name, email=f"{name}@example.com")
+            for name in ("owner", "reader")
+        )
+        for user in (owner, reader):
+            user.set_password("secret")
+        db.session.add_all([owner, reader])
+        db.session.commit()
+        app.config["IDS"] = {
+            "reader": reader.id,
+            # القصة المتوسطة تغطي كل الكلمات، والقصيرة تغطي 4 من 5 (فوق الحد)
+            "medium": _add_story(owner.id, WORDS, 250),
+            "short": _add_story(owner.id, WORDS[:4], 20),
+        }
+    return app
+
+
+def test_length_is_filtered_before_picking_the_best_story(stories_app):
+    ids = stories_app.config["IDS"]
+    with stories_app.app_context():
+        story, coverage, _ = find_covering_story(WORDS, length="short")
+        assert story.id == ids["short"]
+        assert coverage == 0.8
+
+        story, coverage, _ = find_covering_story(WORDS, length="medium")
+        assert story.id == ids["medium"]
+        assert story.length == "medium"
+        assert coverage == 1.0
+
+
+def test_word_count_migration_backfills_existing_stories(stories_app):
+    ids = stories_app.config["IDS"]
+    with stories_app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(
+                text("UPDATE ai_generated_stories SET word_count = NULL")
+            )
+            add_story_word_count(connection)
+        assert db.session.get(AIGeneratedStory, ids["short"]).word_count == 24
+
+
+def test_reuse_is_on_by_default(stories_app):
+    ids = stories_app.config["IDS"]
+    response = stories_app.test_client().post(
+        f"/api/stories/generate/{ids['reader']}",
+        json={
+            "custom_words": [
+                {"word": word, "category": "custom", "count": 1} for word in WORDS
+            ],
+            "length": "short",
+        },
+    )
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["reused_story_id"] == ids["short"]
@@ -0,0 +1,104 @@
+"""
+الكلمات المرشحة للتمرين: الاختيار الموزون دون تكرار، وحذف القائمة المخزنة
+عند تسجيل أخطاء جديدة بحيث يراه أي عامل يقرأ من الطبقة المشتركة
+"""
+
+import random
+from collections import Counter
+
+import pytest
+
+from app.db import db
+from app.models.user import SpeechActivity, User
+from app.services import target_words
+from app.services.response_cache import ResponseCache
+from app.services.target_words import pick_weighted, target_word_candidates
+
+
+def _candidate(word, weight):
+    return {"word": word, "weight": weight}
+
+
+def test_pick_weighted_returns_distinct_words():
+    random.seed(7)
+    candidates = [_candidate(f"كلمة{i}", i + 1) for i in range(10)]
+    for _ in range(50):
+        selected = pick_weighted(candidates, 4)
+        words = [candidate["word"] for candidate in selected]
+        assert len(words) == 4
+        assert len(set(words)) == 4
+
+
+def test_pick_weighted_returns_all_when_too_few():
+    candidates = [_candidate("قلم", 1), _candidate("كتاب", 2)]
+    selected = pick_weighted(candidates, 5)
+    assert sorted(c["word"] for c in selected) == ["قلم", "كتاب"]
+
+
+def test_pick_weighted_prefers_heavier_words():
+    random.seed(11)
+    candidates = [_candidate("ثقيلة", 9.0), _candidate("خفيفة", 1.0)]
+    counts = Counter(pick_weighted(candidates, 1)[0]["word"] for _ in range(2000))
+    # الاحتمال المتوقع 0.9 للكلمة الأثقل
+    assert 0.85 < counts["ثقيلة"] / 2000 < 0.95
+
+
+def test_zero_weight_words_can_still_be_picked():
+    random.seed(3)
+    candidates = [_candidate("صفر", 0), _candidate("واحد", 0)]
+    seen = {pick_weighted(candidates, 1)[0]["word"] for _ in range(100)}
+    assert seen == {"صفر", "واحد"}
+
+
+@pytest.fixture
+def words_app(make_app, monkeypatch):
+    monkeypatch.delenv("TARGET_WORDS_CACHE_SHARED", raising=False)
+    # ذاكرة جديدة بمسار هذا التطبيق بدل ذاكرة اختبار سابق
+    monkeypatch.setattr(target_words, "_candidate_cache", None)
+    app = make_app()
+    with app.app_context():
+        user = User(username="reader", email="reader@example.com")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.flush()
+        activity = SpeechActivity(
+            user_id=user.id, story_id="story", original_text="ذهب الولد"
+        )
+        db.session.add(activity)
+        db.session.commit()
+        app.config["IDS"] = (user.id, activity.id)
+    return app
+
+
+def test_new_errors_invalidate_candidates_in_every_process(words_app):
+    user_id, activity_id = words_app.config["IDS"]
+    with words_app.app_context():
+        before = target_word_candidates(user_id)
+    assert {c["source"] for c in before} == {"recent"}
+
+    # عامل آخر يقرأ من نفس ملف SQLite
+    other = ResponseCache(
+        words_app.config["TARGET_WORDS_CACHE_PATH"],
+        memory_entries=0,
+        table="target_word_candidates",
+    )
+    key = target_words._candidates_key(user_id)
+    assert other.get(key) == before
+
+    response = words_app.test_client().post(
+        "/api/speech/errors",
+        json={
+            "user_id": user_id,
+            "activity_id": activity_id,
+            "errors": [
+                {"original_word": "ذهب", "spoken_word": "زهب", "error_type": "minor"}
+            ],
+        },
+    )
+    assert response.status_code == 200, response.get_json()
+    assert other.get(key) is None
+
+    with words_app.app_context():
+        after = target_word_candidates(user_id)
+    assert after[0]["word"] == "ذهب"
+    assert after[0]["source"] == "errors"
@@ -7,7 +7,7 @@ import { Button } from "@/components/ui/button";
 import { Progress } from "@/components/ui/progress";
 import * as LucideIcons from "lucide-react";
 import { toast } from 'sonner';
-import { arabicStories, loadAIGeneratedStories } from '@/lib/data/stories';
+import { arabicStories, loadAIGeneratedStories, loadAIStoryDetails } from '@/lib/data/stories';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { ScrollArea } from "@/components/ui/scroll-area";
 import { RadioGroup, RadioGroupItem } from "@/components/ui/radio-group";
@@ -45,6 +45,8 @@ export default function StoriesLearningPage() {
     const [showSpeech, setShowSpeech] = useState(false);
     const [speechAccuracy, setSpeechAccuracy] = useState(0);
     const [isLoading, setIsLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [isLoadingMore, setIsLoadingMore] = useState(false);
     const router = useRouter();
     const speechService = new SpeechService();
 
@@ -52,7 +54,8 @@ export default function StoriesLearningPage() {
     useEffect(() => {
         async function loadStories() {
             try {
-                await loadAIGeneratedStories();
+                const page = await loadAIGeneratedStories();
+                setNextCursor(page.nextCursor);
                 setIsLoading(false);
             } catch (error) {
                 console.error('Error loading AI stories:', error);
@@ -63,6 +66,18 @@ export default function StoriesLearningPage() {
         loadStories();
     }, []);
 
+    // Fetch the next page of AI stories (keyset cursor from the previous page)
+    const loadMoreStories = async () => {
+        if (!nextCursor || isLoadingMore) return;
+        setIsLoadingMore(true);
+        try {
+            const page = await loadAIGeneratedStories(nextCursor);
+            setNextCursor(page.nextCursor);
+        } finally {
+            setIsLoadingMore(false);
+        }
+    };
+
     // Load progress from server
     useEffect(() => {
         const loadProgress = async () => {
@@ -170,6 +185,10 @@ export default function StoriesLearningPage() {
         };
     }, [progress]);
 
+    const openStory = async (story: typeof arabicStories[number]) => {
+        setSelectedStory(await loadAIStoryDetails(story));
+    };
+
     const markAsRead = () => {
         setProgress(prev => ({
             ...prev,
@@ -382,7 +401,7 @@ export default function StoriesLearningPage() {
                                             : ''
                                             }`}
                                         onClick={() => {
-                                            setSelectedStory(story);
+                                            openStory(story);
                                             setShowVocabulary(false);
                                             setShowQuestions(false);
                                             setSelectedAnswers({});
@@ -440,6 +459,19 @@ export default function StoriesLearningPage() {
                                     </Button>
                                 </motion.div>
                             ))}
+                            {nextCursor && (
+                                <Button
+                                    variant="ghost"
+                                    className="w-full font-arabic"
+                                    disabled={isLoadingMore}
+                                    onClick={loadMoreStories}
+                                >
+                                    {isLoadingMore ? (
+                                        <RefreshCw className="h-4 w-4 animate-spin ml-2" />
+                                    ) : null}
+                                    تحميل المزيد من القصص
+                                </Button>
+                            )}
                         </div>
                     )}
                 </Card>
@@ -719,7 +751,7 @@ export default function StoriesLearningPage() {
                                 variant="outline"
                                 onClick={() => {
                                     // Reset story progress for review
-                                    setSelectedStory(arabicStories[0]);
+                                    openStory(arabicStories[0]);
                                     setShowVocabulary(false);
                                     setShowQuestions(false);
                                     setSelectedAnswers({});
@@ -31,8 +31,6 @@ export function SpeechRecognition({
     const [accuracy, setAccuracy] = useState(0);
     const [highlightedText, setHighlightedText] = useState<React.ReactNode>(null);
     const [audioBlob, setAudioBlob] = useState<Blob | null>(null);
-    const [errorWords, setErrorWords] = useState<Array<{ word: string; type: 'severe' | 'minor' | 'correct'; matched?: string }>>([]);
-    const [activityId, setActivityId] = useState<number | null>(null);
 
     const recognitionRef = useRef<any>(null);
     const mediaRecorderRef = useRef<MediaRecorder | null>(null);
@@ -103,8 +101,6 @@ export function SpeechRecognition({
             setRecordingTime(0);
             audioChunksRef.current = [];
             setAudioBlob(null);
-            setActivityId(null);
-            setErrorWords([]);
 
             // Request microphone access
             const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
@@ -166,8 +162,7 @@ export function SpeechRecognition({
 
         // Process the results
         setTimeout(() => {
-            processResults();
-            setIsProcessing(false);
+            processResults().finally(() => setIsProcessing(false));
         }, 1000);
     };
 
@@ -179,120 +174,71 @@ export function SpeechRecognition({
         }
     };
 
-    const processResults = () => {
+    const processResults = async () => {
         if (!recognizedText) {
             toast.error("لم يتم التعرف على أي كلام. حاول مرة أخرى.");
             return;
         }
 
-        // Normalize and compare texts
-        const normalizedOriginal = normalizeArabicText(originalText);
-        const normalizedRecognized = normalizeArabicText(recognizedText);
-
-        // Calculate final accuracy
-        const finalAccuracy = calculateWordSimilarity(normalizedOriginal, normalizedRecognized);
-        setAccuracy(finalAccuracy);
-
-        // Find word-level differences
-        const errors = findWordErrors(normalizedOriginal, normalizedRecognized);
-        setErrorWords(errors);
-
-        // Create highlighted text
-        setHighlightedText(generateHighlightedText(originalText, errors));
-
-        // Call onComplete with results
-        onComplete({
-            accuracy: finalAccuracy,
-            recognizedText,
-            errors
-        });
-
-        // Save activity and get the activity ID
+        // The server scores the reading (same engine as saved activities and stats).
+        // Signed-in users save and score in one request, and the server records the errors.
         const userData = localStorage.getItem('user');
+        let score: { accuracy: number; words: Array<{ word: string; type: 'severe' | 'minor' | 'correct'; matched: string }> } | null = null;
+
         if (userData) {
             const user = JSON.parse(userData);
             // Determine story ID from the URL path
             const pathSegments = window.location.pathname.split('/');
             const storyId = pathSegments[pathSegments.length - 1] || 'default-story';
 
-            // Save activity
-            handleSaveActivity(user.id, storyId, finalAccuracy);
-        }
-    };
-
-    // Save the errors to the database after activity is saved
-    useEffect(() => {
-        const saveErrorsToDatabase = async () => {
-            if (activityId && errorWords.length > 0) {
-                try {
-                    // Extract userId from localStorage
-                    const userData = localStorage.getItem('user');
-                    if (!userData) return;
-
-                    const user = JSON.parse(userData);
-                    const userId = user.id;
-
-                    // Format errors for API - only include severe and minor errors (not correct words)
-                    const formattedErrors = errorWords
-                        .filter(error => (error.type === 'severe' || error.type === 'minor') && error.matched)
-                        .map(error => ({
-                            original_word: error.word,
-                            spoken_word: error.matched || '',
-                            error_type: error.type as 'severe' | 'minor', // Ensure type is correct
-                            error_category: speechService.current.classifyArabicError(error.word, error.matched || '')
-                        }));
-
-                    if (formattedErrors.length > 0) {
-                        await speechService.current.saveSpeechErrors({
-                            user_id: userId,
-                            activity_id: activityId,
-                            errors: formattedErrors
-                        });
-                        console.log('Speech errors saved successfully');
-                    }
-                } catch (error) {
-                    console.error('Error saving speech errors:', error);
-                }
-            }
-        };
-
-        saveErrorsToDatabase();
-    }, [activityId, errorWords]);
-
-    // Update the onComplete handler to save activity and set activityId
-    const handleSaveActivity = async (userId: number, storyId: string, accuracy: number) => {
-        try {
-            let audioData = undefined;
-            if (audioBlob) {
-                audioData = await speechService.current.blobToBase64(audioBlob);
-            }
-
             const response = await speechService.current.saveSpeechActivity({
-                user_id: userId,
+                user_id: user.id,
                 story_id: storyId,
                 original_text: originalText,
                 recognized_text: recognizedText,
-                accuracy: accuracy,
-                audio_data: audioData
+                audio: audioBlob || undefined
             });
-
-            if (response.success && response.data) {
-                setActivityId(response.data.activity_id);
-                return response.data.activity_id;
+            if (response.success && response.data?.words) {
+                score = { accuracy: response.data.accuracy, words: response.data.words };
             }
-        } catch (error) {
-            console.error('Error saving speech activity:', error);
+        } else {
+            score = await speechService.current.scoreSpeech(originalText, recognizedText);
         }
-        return null;
+
+        let finalAccuracy: number;
+        let errors: Array<{ word: string; type: 'severe' | 'minor' | 'correct'; matched?: string }>;
+        if (score) {
+            finalAccuracy = score.accuracy;
+            errors = score.words.map(({ word, type, matched }) => ({ word, type, matched }));
+        } else {
+            // Server unreachable: show a local estimate, nothing is saved
+            toast.error("تعذر تقييم القراءة على الخادم، النتيجة تقديرية.");
+            const normalizedOriginal = normalizeArabicText(originalText);
+            const normalizedRecognized = normalizeArabicText(recognizedText);
+            finalAccuracy = calculateWordSimilarity(normalizedOriginal, normalizedRecognized);
+            errors = findWordErrors(normalizedOriginal, normalizedRecognized);
+        }
+
+        setAccuracy(finalAccuracy);
+
+        // Create highlighted text
+        setHighlightedText(generateHighlightedText(originalText, errors));
+
+        // Call onComplete with results
+        onComplete({
+            accuracy: finalAccuracy,
+            recognizedText,
+            errors
+        });
     };
 
     // Arabic text normalization
     const normalizeArabicText = (text: string) => {
         return text
-            .replace(/[َُِْ~ٍّ]/g, '') // Remove tashkeel (diacritics)
-            .replace(/[أإآ]/g, 'ا') // Normalize alif variations more comprehensively
+            .replace(/[َُِْ~ٍّـ]/g, '') // Remove tashkeel (diacritics) and tatweel
+            .replace(/[أإآٱ]/g, 'ا') // Normalize alif variations more comprehensively
             .replace(/[ؤ]/g, 'و') // Normalize waw with hamza
-            .replace(/[ئ]/g, 'ي') // Normalize yaa with hamza
+            .replace(/[ئى]/g, 'ي') // Normalize yaa with hamza and alif maqsura (as the server does)
             .replace(/[ة]/g, 'ه') // Normalize ta marbouta
             .replace(/\s+/g, ' ') // Normalize whitespace
             .trim();
@@ -18,6 +18,9 @@ interface ArabicStory {
     isAIGenerated?: boolean;
     highlightedContent?: string;
     targetWords?: string[];
+    imageCount?: number;
+    // AI stories are listed as summaries; the body is fetched when opened
+    isSummary?: boolean;
 }
 
 // Default built-in stories
@@ -312,24 +315,39 @@ function getUserIdFromLocalStorage(): number | null {
     return null;
 }
 
-// Function to load AI-generated stories from the backend
-export async function loadAIGeneratedStories(): Promise<ArabicStory[]> {
+// Number of AI stories fetched per page of the story list
+export const AI_STORIES_PAGE_SIZE = 20;
+
+export interface AIStoriesPage {
+    stories: ArabicStory[];
+    // Pass to loadAIGeneratedStories to fetch the next page (null on the last page)
+    nextCursor: string | null;
+}
+
+// Function to load one page of AI-generated stories from the backend.
+// Without a cursor the first page replaces the AI stories in arabicStories;
+// with the nextCursor of the previous page the next page is appended to them.
+export async function loadAIGeneratedStories(cursor: string | null = null): Promise<AIStoriesPage> {
     try {
         const userId = getUserIdFromLocalStorage();
         if (!userId) {
             console.warn('User not logged in, cannot load stories');
-            return [];
+            return { stories: [], nextCursor: null };
         }
 
-        const response = await fetch(`http://localhost:5000/api/stories/ai-stories/${userId}`);
+        // The list endpoint only returns summaries; the body, vocabulary and
+        // questions are loaded by loadAIStoryDetails when a story is opened
+        const params = new URLSearchParams({ limit: String(AI_STORIES_PAGE_SIZE) });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`http://localhost:5000/api/stories/ai-stories/${userId}?${params}`);
         const data = await response.json();
 
-        if (data.success && data.stories) {
-            // Convert backend stories to ArabicStory format
+        if (data.success) {
+            // Convert backend story summaries to ArabicStory format
             const stories: ArabicStory[] = data.stories.map((storyData: any) => {
-                // Extract difficulty from metadata
+                // Extract difficulty
                 let difficulty: 'easy' | 'medium' | 'hard';
-                switch (storyData.story.metadata.difficulty) {
+                switch (storyData.difficulty) {
                     case 'beginner':
                         difficulty = 'easy';
                         break;
@@ -342,29 +360,36 @@ export async function loadAIGeneratedStories(): Promise<ArabicStory[]> {
 
                 return {
                     id: `ai-story-${storyData.id}`,
-                    title: storyData.story.theme || 'قصة منشأة بالذكاء الاصطناعي',
-                    content: storyData.story.text,
+                    title: storyData.theme || 'قصة منشأة بالذكاء الاصطناعي',
+                    content: '',
                     difficulty: difficulty,
-                    moral: storyData.moral || 'تحسين مهارات النطق والقراءة',
-                    vocabulary: storyData.vocabulary || [],
-                    questions: storyData.questions || [],
+                    moral: 'تحسين مهارات النطق والقراءة',
+                    vocabulary: [],
+                    questions: [],
                     isAIGenerated: true,
-                    highlightedContent: storyData.story.highlighted_text,
-                    targetWords: storyData.story.target_words
+                    imageCount: storyData.image_count || 0,
+                    isSummary: true
                 };
             });
 
-            // Add to the stories array (replacing any existing AI stories)
+            // The first page replaces any existing AI stories; later pages go
+            // after the AI stories already loaded and before the built-in ones
+            const aiStories = cursor ? arabicStories.filter(story => story.isAIGenerated) : [];
+            const loadedIds = new Set(aiStories.map(story => story.id));
             const nonAiStories = arabicStories.filter(story => !story.isAIGenerated);
             arabicStories.length = 0; // Clear the array
-            arabicStories.push(...stories, ...nonAiStories);
+            arabicStories.push(
+                ...aiStories,
+                ...stories.filter(story => !loadedIds.has(story.id)),
+                ...nonAiStories
+            );
 
-            return stories;
+            return { stories, nextCursor: data.next_cursor || null };
         }
-        return [];
+        return { stories: [], nextCursor: null };
     } catch (error) {
         console.error('Error loading AI stories:', error);
-        return [];
+        return { stories: [], nextCursor: null };
     }
 }
 
@@ -411,4 +436,18 @@ export async function getAIStoryById(storyId: string): Promise<ArabicStory | nul
         console.error('Error loading AI story:', error);
         return null;
     }
-} 
\ No newline at end of file
+} 
+
+// Function to load the full story for an AI story summary from the list
+export async function loadAIStoryDetails(story: ArabicStory): Promise<ArabicStory> {
+    if (!story.isSummary) return story;
+
+    const fullStory = await getAIStoryById(story.id);
+    if (!fullStory) return story;
+
+    // Replace the summary so the story is only fetched once
+    const loaded = { ...fullStory, imageCount: story.imageCount };
+    const index = arabicStories.findIndex(item => item.id === story.id);
+    if (index !== -1) arabicStories[index] = loaded;
+    return loaded;
+}
@@ -3,8 +3,22 @@ interface SpeechActivityData {
     story_id: string;
     original_text: string;
     recognized_text: string;
+    accuracy?: number; // Omit to let the server score the reading and record its errors
+    audio_data?: string; // Base64 encoded audio data (legacy JSON upload)
+    audio?: Blob; // Recording sent as a multipart file part (streamed to disk by the server)
+}
+
+interface ScoredWord {
+    word: string;
+    type: 'severe' | 'minor' | 'correct';
+    matched: string;
+    similarity: number;
+}
+
+interface SpeechScore {
     accuracy: number;
-    audio_data?: string; // Base64 encoded audio data
+    words: ScoredWord[];
+    errors: SpeechError[];
 }
 
 interface SpeechActivityResponse {
@@ -13,6 +27,9 @@ interface SpeechActivityResponse {
         activity_id: number;
         accuracy: number;
         created_at: string;
+        audio?: { sha256: string; size: number }; // Only when a recording was saved
+        words?: ScoredWord[]; // Only when the server scored the reading
+        errors?: SpeechError[];
     };
     error?: string;
 }
@@ -30,12 +47,18 @@ interface SpeechError {
     spoken_word: string;
     error_type: 'minor' | 'severe';
     error_category?: string;
+    similarity_score?: number; // 0-100, stored by the server when the error is saved
 }
 
 interface SpeechErrorsData {
     user_id: number;
-    activity_id: number;
-    errors: SpeechError[];
+    activity_id?: number;
+    errors?: SpeechError[];
+    // Errors of several activities in one request (e.g. after an offline session)
+    activities?: Array<{
+        activity_id: number;
+        errors: SpeechError[];
+    }>;
 }
 
 interface PersonalizedExercise {
@@ -49,7 +72,9 @@ interface SpeechAnalytics {
     accuracy_trend: Array<{
         date: string;
         accuracy: number;
-        story_id: string;
+        count: number;
+        min_accuracy: number;
+        max_accuracy: number;
     }>;
     challenging_words: Array<{
         word: string;
@@ -74,12 +99,27 @@ export class SpeechService {
      */
     async saveSpeechActivity(data: SpeechActivityData): Promise<SpeechActivityResponse> {
         try {
+            const { audio, ...fields } = data;
+            let body: BodyInit = JSON.stringify(fields);
+            const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+
+            // With a recording, send multipart so the audio is not base64 encoded in JSON
+            if (audio) {
+                const form = new FormData();
+                for (const [key, value] of Object.entries(fields)) {
+                    if (value !== undefined) {
+                        form.append(key, String(value));
+                    }
+                }
+                form.append('audio', audio, 'recording');
+                body = form;
+                delete headers['Content-Type']; // The browser sets the multipart boundary
+            }
+
             const response = await fetch(`${this.apiBaseUrl}/save`, {
                 method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(data),
+                headers,
+                body,
             });
 
             if (!response.ok) {
@@ -97,6 +137,35 @@ export class SpeechService {
         }
     }
 
+    /**
+     * Score a reading on the server without saving it
+     * @param originalText Text the user was asked to read
+     * @param recognizedText Text returned by speech recognition
+     * @returns Promise with accuracy and word alignment
+     */
+    async scoreSpeech(originalText: string, recognizedText: string): Promise<SpeechScore | null> {
+        try {
+            const response = await fetch(`${this.apiBaseUrl}/score`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ original_text: originalText, recognized_text: recognizedText }),
+            });
+
+            if (!response.ok) {
+                const errorData = await response.json();
+                throw new Error(errorData.error || 'Failed to score speech');
+            }
+
+            const result = await response.json();
+            return result.data;
+        } catch (error) {
+            console.error('Error scoring speech:', error);
+            return null;
+        }
+    }
+
     /**
      * Save speech errors from a recognition activity
      * @param data Speech errors data
@@ -246,11 +315,18 @@ export class SpeechService {
      * @param userId User ID
      * @param fromDate Optional start date filter (ISO format)
      * @param toDate Optional end date filter (ISO format)
+     * @param bucket Trend point granularity (day, week or month)
      * @returns Promise with analytics data
      */
-    async getSpeechAnalytics(userId: number, fromDate?: string, toDate?: string): Promise<SpeechAnalytics> {
+    async getSpeechAnalytics(
+        userId: number,
+        fromDate?: string,
+        toDate?: string,
+        bucket: 'day' | 'week' | 'month' = 'day'
+    ): Promise<SpeechAnalytics> {
         try {
             const url = new URL(`${this.apiBaseUrl}/analytics/user/${userId}`);
+            url.searchParams.append('bucket', bucket);
             if (fromDate) {
                 url.searchParams.append('from_date', fromDate);
             }
@@ -298,42 +374,4 @@ export class SpeechService {
             reader.readAsDataURL(blob);
         });
     }
-
-    /**
-     * Classify Arabic pronunciation errors
-     * @param original Original word
-     * @param spoken Spoken word
-     * @returns Error category
-     */
-    classifyArabicError(original: string, spoken: string): string {
-        // This implementation mirrors the backend classification logic
-
-        // Check for length differences
-        if (original.length !== spoken.length) {
-            return 'length_mismatch';
-        }
-
-        // Check for common substitution patterns
-        const commonSubstitutions: Record<string, string[]> = {
-            'ث': ['س', 'ت'],
-            'ذ': ['د', 'ز'],
-            'ظ': ['ض', 'ز'],
-            'ط': ['ت'],
-            'ض': ['د'],
-            'ص': ['س'],
-            'ق': ['ك', 'ء']
-        };
-
-        for (const [correct, substitutes] of Object.entries(commonSubstitutions)) {
-            if (original.includes(correct) && !spoken.includes(correct)) {
-                for (const sub of substitutes) {
-                    if (spoken.includes(sub)) {
-                        return `substitution_${correct}_${sub}`;
-                    }
-                }
-            }
-        }
-
-        return 'general_pronunciation';
-    }
 } 
\ No newline at end of file